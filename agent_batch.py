@@ -0,0 +1,147 @@
+import os
+import sys
+import json
+import time
+import hashlib
+import argparse
+
+from agent_graph_main import build_agent, agent_messages, tools_called, QUESTIONS_TEST
+from extraction_scheduler import ExtractionScheduler, DEFAULT_MAX_RETRIES
+from tracing import span
+
+# ==========================================
+# 👇 LOTS DE QUESTIONS POUR L'AGENT (PARALLÈLE + REPRISE) 👇
+# ==========================================
+# Évaluation de l'agent sur des centaines de questions :
+#   - questions lues depuis un fichier (.txt : une par ligne, .jsonl : {"id", "question"}),
+#   - exécutions ReAct concurrentes (ainvoke) avec concurrence et débit bornés, retries
+#     sur 429 / Retry-After (même ordonnanceur que l'extraction d'entités),
+#   - chaque résultat est ajouté au fichier JSONL dès qu'il est prêt (ordre d'arrivée),
+#   - reprise : les questions déjà répondues dans le fichier de sortie sont sautées,
+#     celles en erreur sont retentées.
+#
+# Usage : python agent_batch.py questions.txt [--output resultats.jsonl] [--concurrency 4] [--rpm 10]
+
+DEFAULT_OUTPUT = "agent_batch_results.jsonl"
+DEFAULT_CONCURRENCY = 4
+# Une exécution ReAct = 2 à 4 appels LLM : 10 questions/min restent sous le quota Groq (30 req/min)
+DEFAULT_RUNS_PER_MINUTE = 10
+
+
+def question_id(question):
+    return hashlib.sha256(question.strip().encode("utf-8")).hexdigest()[:12]
+
+
+def load_questions(path=None):
+    """ [{id, question}] sans doublons ; sans fichier : QUESTIONS_TEST de agent_graph_main """
+    if path is None:
+        items = [{"question": q} for q in QUESTIONS_TEST]
+    elif path.endswith(".jsonl"):
+        with open(path, encoding="utf-8") as f:
+            items = [json.loads(line) for line in f if line.strip()]
+    else:
+        with open(path, encoding="utf-8") as f:
+            items = [{"question": line.strip()} for line in f
+                     if line.strip() and not line.lstrip().startswith("#")]
+    questions, seen = [], set()
+    for item in items:
+        qid = str(item.get("id") or question_id(item["question"]))
+        if qid not in seen:
+            seen.add(qid)
+            questions.append({"id": qid, "question": item["question"]})
+    return questions
+
+
+def completed_ids(output):
+    """ Identifiants déjà répondus (sans erreur) dans un fichier de résultats existant """
+    done = set()
+    if not os.path.exists(output):
+        return done
+    with open(output, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue  # Dernière ligne tronquée par une interruption
+            if "answer" in record and not record.get("error"):
+                done.add(record["id"])
+    return done
+
+
+async def ask_agent(agent_app, item):
+    start = time.perf_counter()
+    with span("agent.question", id=item["id"]):
+        result = await agent_app.ainvoke({"messages": agent_messages(item["question"])})
+    return {
+        "answer": result["messages"][-1].content,
+        "tools": tools_called(result),
+        "seconds": round(time.perf_counter() - start, 3),
+    }
+
+
+def run_batch(questions_file=None, output=DEFAULT_OUTPUT, concurrency=DEFAULT_CONCURRENCY,
+              rpm=DEFAULT_RUNS_PER_MINUTE, max_retries=DEFAULT_MAX_RETRIES, resume=True, agent_app=None):
+    questions = load_questions(questions_file)
+    if not resume and os.path.exists(output):
+        os.remove(output)
+    done = completed_ids(output)
+    todo = [q for q in questions if q["id"] not in done]
+    print(f"\n🚀 Lot de {len(questions)} question(s) : {len(todo)} à traiter, {len(done & {q['id'] for q in questions})} "
+          f"déjà faite(s) (concurrence {concurrency}, {rpm} exécutions/min).")
+    if not todo:
+        return {"total": len(questions), "answered": 0, "errors": 0}
+
+    agent_app = agent_app or build_agent()
+    counts = {"answered": 0, "errors": 0}
+    with open(output, "a", encoding="utf-8") as out:
+        def on_result(index, item, result, error):
+            record = {"id": item["id"], "question": item["question"],
+                      "finished_at": time.strftime("%Y-%m-%dT%H:%M:%S")}
+            if error is None:
+                record.update(result)
+                counts["answered"] += 1
+            else:
+                record["error"] = error
+                counts["errors"] += 1
+            out.write(json.dumps(record, ensure_ascii=False) + "\n")
+            out.flush()  # Une interruption ne perd que les questions en cours
+            finished = counts["answered"] + counts["errors"]
+            status = "✅" if error is None else "❌"
+            print(f"   {status} [{finished}/{len(todo)}] {item['question'][:70]}")
+
+        scheduler = ExtractionScheduler(
+            lambda item: ask_agent(agent_app, item),
+            concurrency=concurrency,
+            rpm=rpm,
+            tpm=None,
+            max_retries=max_retries,
+            token_estimator=lambda item: 0,
+            label=lambda item: item["id"],
+            on_result=on_result,
+        )
+        scheduler.run_sync(todo)
+
+    print(f"\n✅ Lot terminé : {counts['answered']} réponse(s), {counts['errors']} erreur(s) -> {output}")
+    return dict(counts, total=len(questions))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Exécute l'agent médical sur un fichier de questions")
+    parser.add_argument("questions", nargs="?", default=None,
+                        help="Fichier .txt (une question par ligne) ou .jsonl ; défaut : QUESTIONS_TEST")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT)
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY)
+    parser.add_argument("--rpm", type=float, default=DEFAULT_RUNS_PER_MINUTE, help="Exécutions d'agent par minute")
+    parser.add_argument("--max-retries", type=int, default=DEFAULT_MAX_RETRIES)
+    parser.add_argument("--no-resume", action="store_true", help="Repart de zéro (écrase le fichier de sortie)")
+    args = parser.parse_args()
+
+    if args.questions and not os.path.exists(args.questions):
+        sys.exit(f"❌ Fichier de questions introuvable : {args.questions}")
+    print("🤖 Initialisation de l'Agent Médical...")
+    run_batch(args.questions, args.output, args.concurrency, args.rpm, args.max_retries,
+              resume=not args.no_resume)
+
+
+if __name__ == "__main__":
+    main()
@@ -4,19 +4,12 @@ import sys
 import time
 
 # --- IMPORTS ---
-from langchain_groq import ChatGroq
-from langchain_community.graphs import Neo4jGraph
-from langchain_huggingface import HuggingFaceEmbeddings
-from langchain_community.chains.graph_qa.cypher import GraphCypherQAChain
-from langchain_core.prompts import PromptTemplate
-from langchain_core.tools import tool
-from langchain_community.tools import DuckDuckGoSearchRun
-from langchain_core.messages import HumanMessage, SystemMessage
-
-try:
-    from langgraph.prebuilt import create_react_agent
-except ImportError:
-    sys.exit("❌ Veuillez faire : pip install langgraph")
+# langchain / langgraph sont importés au premier usage (démarrage instantané)
+import runtime
+from retrieval import search_passages, search_passages_many, keyword_shortcut
+from context_builder import ContextBuilder
+from vector_index import INDEX_DIR, CHUNK_INDEX_DIR
+from tracing import span
 
 warnings.filterwarnings("ignore")
 
@@ -33,74 +26,127 @@ os.environ["NEO4J_URI"] = MY_NEO4J_URI
 os.environ["NEO4J_USERNAME"] = MY_NEO4J_USER
 os.environ["NEO4J_PASSWORD"] = MY_NEO4J_PASS
 
-# Initialisation
-print("🤖 Initialisation de l'Agent Médical...")
-try:
-    graph = Neo4jGraph()
-    # On garde le modèle 70B pour la performance
-    llm = ChatGroq(model_name="llama-3.3-70b-versatile", temperature=0)
-    embedding_model = HuggingFaceEmbeddings(model_name="all-MiniLM-L6-v2")
-except Exception as e:
-    print(f"❌ Erreur d'initialisation : {e}")
-    sys.exit(1)
+# Initialisation : graphe, LLM et embeddings sont des singletons paresseux (runtime.py)
+EMBEDDING_MODEL_NAME = "all-MiniLM-L6-v2"
+# On garde le modèle 70B pour la performance
+LLM_MODEL_NAME = "llama-3.3-70b-versatile"
+context_builder = ContextBuilder()
 
 # ==========================================
 # 🛠️ OUTILS
 # ==========================================
-@tool
+def recherches_groupees(queries):
+    """ Plusieurs recherches dans le même appel d'outil : un embedding et une requête UNWIND """
+    print(f"   ⚙️ [Outil: GraphRAG] {len(queries)} recherches groupées : {queries}")
+    try:
+        with span("tool.recherche_cas_similaires", questions=len(queries)):
+            embeddings = runtime.get_embeddings(EMBEDDING_MODEL_NAME)
+            with span("embed_queries", questions=len(queries)):
+                vectors = getattr(embeddings, "embed_queries", embeddings.embed_documents)(queries)
+            all_results = search_passages_many(runtime.get_graph(), vectors,
+                                               local_chunk_index=runtime.get_local_index(CHUNK_INDEX_DIR, EMBEDDING_MODEL_NAME),
+                                               local_index=runtime.get_local_index(INDEX_DIR, EMBEDDING_MODEL_NAME))
+            sections = []
+            for q, results in zip(queries, all_results):
+                if not results:
+                    sections.append(f"### {q}\nAucun dossier trouvé.")
+                    continue
+                context, stats = context_builder.build_with_stats(q, results)
+                context_builder.report(stats)
+                sections.append(f"### {q}\n" + context)
+        return "\n\n".join(sections)
+    except Exception as e:
+        return f"Erreur GraphRAG: {e}"
+
 def recherche_cas_similaires(query: str) -> str:
-    """Recherche dans Neo4j des cas patients, symptômes ou maladies similaires (Base Interne)."""
+    """Recherche dans Neo4j des cas patients, symptômes ou maladies similaires (Base Interne). Pour plusieurs recherches, les grouper dans un seul appel en les séparant par ' ; '."""
+    queries = [q.strip() for q in query.split(";") if q.strip()]
+    if len(queries) > 1:
+        return recherches_groupees(queries)
     print(f"   ⚙️ [Outil: GraphRAG] Recherche : '{query}'")
     try:
-        vector = embedding_model.embed_query(query)
-        cypher = """
-        CALL db.index.vector.queryNodes('consultation_vector', 3, $embedding)
-        YIELD node AS c, score
-        OPTIONAL MATCH (c)-[:MENTIONNE_SYMPTOME]->(s:Symptome)
-        OPTIONAL MATCH (c)-[:MENTIONNE_MALADIE]->(m:Maladie)
-        RETURN c.content as content, collect(distinct s.name) as sym, collect(distinct m.name) as mal
-        """
-        results = graph.query(cypher, params={"embedding": vector})
-        if not results: return "Aucun dossier trouvé."
-        return "\n".join([f"Dossier: {r['content'][:5000]}... | Sym: {r['sym']} | Mal: {r['mal']}" for r in results])
+        with span("tool.recherche_cas_similaires"):
+            lexical_index = runtime.get_lexical_index()
+            results = keyword_shortcut(runtime.get_graph(), query, lexical_index)
+            if not results:
+                with span("embed_query"):
+                    vector = runtime.get_embeddings(EMBEDDING_MODEL_NAME).embed_query(query)
+                results = search_passages(runtime.get_graph(), vector,
+                                          local_chunk_index=runtime.get_local_index(CHUNK_INDEX_DIR, EMBEDDING_MODEL_NAME),
+                                          local_index=runtime.get_local_index(INDEX_DIR, EMBEDDING_MODEL_NAME),
+                                          graph_snapshot=runtime.get_graph_snapshot(),
+                                          question=query, lexical_index=lexical_index)
+            if not results: return "Aucun dossier trouvé."
+            context, stats = context_builder.build_with_stats(query, results)
+        context_builder.report(stats)
+        return context
     except Exception as e:
         return f"Erreur GraphRAG: {e}"
 
-@tool
+_cypher_qa = None
+
+def get_cypher_qa():
+    """ Chaîne Cypher + schéma construits une seule fois, caches partagés entre les appels """
+    global _cypher_qa
+    if _cypher_qa is None:
+        from cypher_qa import CachedCypherQA
+        _cypher_qa = CachedCypherQA(runtime.get_graph(), runtime.get_llm(LLM_MODEL_NAME))
+    return _cypher_qa
+
 def statistiques_base_donnees(query: str) -> str:
     """Compte ou fait des statistiques sur la base de données."""
     print(f"   ⚙️ [Outil: Stats] Calcul : '{query}'")
     try:
-        prompt = PromptTemplate(
-            input_variables=["schema", "question"], 
-            template="""
-            Generate a Cypher query. Schema: {schema}. Question: {question}.
-            Rules: Use 'toLower(n.name) CONTAINS'. Return ONLY the Cypher query.
-            """
-        )
-        chain = GraphCypherQAChain.from_llm(llm=llm, graph=graph, verbose=False, cypher_prompt=prompt, allow_dangerous_requests=True)
-        return chain.invoke({"query": query})['result']
+        with span("tool.statistiques_base_donnees"):
+            return get_cypher_qa().ask(query)
+    except Exception as e:
+        return f"Erreur Stats: {e}"
+
+_entity_stats = None
+
+def get_entity_stats():
+    """ Statistiques matérialisées à l'ingestion (graph_stats.py), rechargées après chaque ingestion """
+    global _entity_stats
+    if _entity_stats is None:
+        from graph_stats import EntityStats
+        _entity_stats = EntityStats(runtime.get_graph())
+    return _entity_stats
+
+def statistiques_entite(nom: str) -> str:
+    """Nombre de consultations mentionnant un symptôme ou une maladie, et les maladies/symptômes qui lui sont le plus souvent associés. Utilise nom='symptomes' ou nom='maladies' pour le classement des plus fréquents."""
+    print(f"   ⚙️ [Outil: Stats entité] '{nom}'")
+    try:
+        with span("tool.statistiques_entite"):
+            return get_entity_stats().describe(nom)
     except Exception as e:
         return f"Erreur Stats: {e}"
 
-@tool
 def recherche_web_medicale(query: str) -> str:
     """Recherche sur Internet (Infos externes)."""
     print(f"   ⚙️ [Outil: Web] Recherche : '{query}'")
     try:
-        return DuckDuckGoSearchRun().invoke(query)
+        from langchain_community.tools import DuckDuckGoSearchRun
+        with span("tool.recherche_web_medicale"):
+            return DuckDuckGoSearchRun().invoke(query)
     except Exception as e:
         return f"Erreur Web: {e}"
 
 # ==========================================
 # 🧠 FONCTION DE TRAITEMENT
 # ==========================================
-def run_agent_batch():
-    tools = [recherche_cas_similaires, statistiques_base_donnees, recherche_web_medicale]
-    agent_app = create_react_agent(llm, tools)
+def build_tools():
+    """ Outils LangChain construits à la demande (évite d'importer langchain au démarrage) """
+    from langchain_core.tools import tool
+    tools = [tool(recherche_cas_similaires), tool(statistiques_entite)]
+    try:
+        get_cypher_qa()  # Graphe embarqué : refus explicite ici, pas à la première question
+        tools.append(tool(statistiques_base_donnees))
+    except NotImplementedError as e:
+        print(f"⚠️ Outil 'statistiques_base_donnees' non disponible : {e}")
+    return tools + [tool(recherche_web_medicale)]
 
-    # --- PROMPT SYSTÈME AMÉLIORÉ (PRIORITÉ INTERNE) ---
-    system_prompt = """Tu es un analyste de données médicales expert.
+# --- PROMPT SYSTÈME AMÉLIORÉ (PRIORITÉ INTERNE) ---
+SYSTEM_PROMPT = """Tu es un analyste de données médicales expert.
     
     HIÉRARCHIE DES SOURCES (RÈGLE D'OR) :
     1. 🥇 PRIORITÉ : Utilise TOUJOURS 'recherche_cas_similaires' (GraphRAG) en premier.
@@ -109,44 +155,82 @@ def run_agent_batch():
     
     2. 🥈 SECONDAIRE : Utilise 'recherche_web_medicale' SEULEMENT si la base interne est vide ou muette sur le sujet.
     
-    3. Ne dis jamais "Je ne peux pas répondre". Dis "Selon les documents...".
+    3. 📊 COMPTAGES : pour "combien de consultations parlent de X" ou "quels symptômes vont avec Y",
+       utilise 'statistiques_entite' (statistiques précalculées, exactes et instantanées).
+       'statistiques_base_donnees' (Cypher généré) seulement pour les autres statistiques.
+
+    4. Ne dis jamais "Je ne peux pas répondre". Dis "Selon les documents...".
     """
 
-    # --- LISTE DES QUESTIONS A TESTER (BATCH) ---
-    # Ajoutez ici toutes les questions que vous voulez tester sur vos fichiers
-    questions_test = [
-        "Why do I have uncomfortable feeling between the middle of my spine and left shoulder blade?",
-        "Quelle est la cause psychologique de la possessivité selon le médecin ?",
-        "Pourquoi un taux de hCG qui ne double pas est-il un mauvais signe ?",
-        "What is the reason for continuous eye allergy and irritation?",
-        "Combien de consultations parlent de problèmes cardiaques ou de palpitations ?"
+# --- LISTE DES QUESTIONS A TESTER (BATCH) ---
+# Ajoutez ici toutes les questions que vous voulez tester sur vos fichiers
+# (pour des centaines de questions : agent_batch.py lit un fichier et parallélise)
+QUESTIONS_TEST = [
+    "Why do I have uncomfortable feeling between the middle of my spine and left shoulder blade?",
+    "Quelle est la cause psychologique de la possessivité selon le médecin ?",
+    "Pourquoi un taux de hCG qui ne double pas est-il un mauvais signe ?",
+    "What is the reason for continuous eye allergy and irritation?",
+    "Combien de consultations parlent de problèmes cardiaques ou de palpitations ?"
+]
+
+def build_agent():
+    """ Agent ReAct (LLM + outils) ; le graphe compilé peut servir plusieurs questions en parallèle """
+    try:
+        from langgraph.prebuilt import create_react_agent
+    except ImportError:
+        sys.exit("❌ Veuillez faire : pip install langgraph")
+
+    try:
+        llm = runtime.get_llm(LLM_MODEL_NAME)
+    except Exception as e:
+        print(f"❌ Erreur d'initialisation : {e}")
+        sys.exit(1)
+    # Modèle d'embedding, index locaux et connexion Neo4j pendant la création de l'agent
+    runtime.warm_up(EMBEDDING_MODEL_NAME)
+    return create_react_agent(llm, build_tools())
+
+def agent_messages(question):
+    from langchain_core.messages import HumanMessage, SystemMessage
+    return [
+        SystemMessage(content=SYSTEM_PROMPT),
+        HumanMessage(content=question)
     ]
 
-    print(f"\n🚀 Démarrage du traitement par lots ({len(questions_test)} questions)...")
+def tools_called(result):
+    """ Noms des outils appelés pendant une exécution de l'agent (dans l'ordre) """
+    return [call["name"] for message in result["messages"] for call in (getattr(message, "tool_calls", None) or [])]
+
+def run_agent_batch(pause=2):
+    agent_app = build_agent()
+
+    print(f"\n🚀 Démarrage du traitement par lots ({len(QUESTIONS_TEST)} questions)...")
     print("="*60)
 
-    for i, question in enumerate(questions_test):
-        print(f"\n🔹 QUESTION {i+1}/{len(questions_test)} : {question}")
+    results = []  # [{question, answer, seconds}] (utilisé par benchmarks/run_benchmarks.py)
+    for i, question in enumerate(QUESTIONS_TEST):
+        print(f"\n🔹 QUESTION {i+1}/{len(QUESTIONS_TEST)} : {question}")
         print("-" * 30)
         
         try:
-            messages = [
-                SystemMessage(content=system_prompt),
-                HumanMessage(content=question)
-            ]
-            
             # Invocation de l'agent
-            result = agent_app.invoke({"messages": messages})
+            start = time.perf_counter()
+            with span("agent.question", index=i):
+                result = agent_app.invoke({"messages": agent_messages(question)})
             reponse_finale = result['messages'][-1].content
+            results.append({"question": question, "answer": reponse_finale,
+                            "seconds": time.perf_counter() - start})
             
             print(f"\n🤖 RÉPONSE AGENT :\n{reponse_finale}")
             print("="*60)
             
             # Petite pause pour éviter de saturer l'API
-            time.sleep(2)
+            time.sleep(pause)
             
         except Exception as e:
             print(f"❌ Erreur sur la question '{question}': {e}")
+            results.append({"question": question, "error": str(e)})
+    return results
 
 if __name__ == "__main__":
+    print("🤖 Initialisation de l'Agent Médical...")
     run_agent_batch()
\ No newline at end of file
@@ -0,0 +1,265 @@
+import os
+import time
+import sqlite3
+import hashlib
+import threading
+
+import numpy as np
+
+# ==========================================
+# 👇 CACHE SÉMANTIQUE DES RÉPONSES (generate_response) 👇
+# ==========================================
+# Une question reformulée ("j'ai mal à la tête" / "maux de tête, que faire ?") ne
+# repaie pas un appel LLM de plusieurs secondes. Réponse servie depuis le cache si :
+#   - une question déjà répondue est à moins du seuil cosinus (ANSWER_CACHE_THRESHOLD),
+#   - ET la recherche a renvoyé exactement les mêmes consultations sources,
+#   - ET même espace de noms : modèle LLM, modèle d'embedding, gabarit du prompt.
+# Invalidation : l'ingestion supprime les réponses dont une source a été modifiée ou
+# supprimée (toutes en mode complet). Éviction : âge (TTL) puis moins récemment lues.
+# SQLite = référence durable (partagée entre processus) ; la recherche cosinus se fait
+# sur une matrice en mémoire, rechargée quand un autre processus a écrit (data_version).
+
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache")
+DEFAULT_CACHE_PATH = os.path.join(CACHE_DIR, "answers.sqlite")
+DEFAULT_THRESHOLD = float(os.environ.get("ANSWER_CACHE_THRESHOLD", 0.92))
+DEFAULT_TTL_HOURS = 24 * 7
+DEFAULT_MAX_ENTRIES = 10000
+SQL_BATCH = 500  # Noms de fichiers par requête IN (...) (limite de variables SQLite)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS answers (
+    id          INTEGER PRIMARY KEY,
+    namespace   TEXT NOT NULL,
+    question    TEXT NOT NULL,
+    embedding   BLOB NOT NULL,
+    sources_key TEXT NOT NULL,
+    answer      TEXT NOT NULL,
+    llm_seconds REAL NOT NULL DEFAULT 0,
+    hits        INTEGER NOT NULL DEFAULT 0,
+    created_at  REAL NOT NULL,
+    accessed_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS answer_sources (
+    answer_id INTEGER NOT NULL,
+    filename  TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_answers_namespace ON answers (namespace);
+CREATE INDEX IF NOT EXISTS idx_answers_accessed ON answers (accessed_at);
+CREATE INDEX IF NOT EXISTS idx_sources_filename ON answer_sources (filename);
+CREATE INDEX IF NOT EXISTS idx_sources_answer ON answer_sources (answer_id);
+"""
+
+
+def answer_namespace(llm_model_name, embedding_model_name, build_prompt):
+    """
+    Réponses d'un autre LLM, d'un autre espace vectoriel ou d'un autre prompt : jamais servies.
+    `build_prompt(question, context)` est celui qui construit vraiment le prompt : le gabarit
+    haché en est tiré, il ne peut pas diverger d'une copie recopiée à la main.
+    """
+    prompt_template = build_prompt("{question}", "{context}")
+    digest = hashlib.sha256(prompt_template.encode("utf-8")).hexdigest()[:12]
+    return f"{llm_model_name}|{embedding_model_name}|{digest}"
+
+
+def sources_key(filenames):
+    """ Ensemble des consultations sources, indépendant de leur ordre """
+    return hashlib.sha256("\0".join(sorted(set(filenames))).encode("utf-8")).hexdigest()
+
+
+def _unit(vector):
+    v = np.asarray(vector, dtype=np.float32).ravel()
+    norm = np.linalg.norm(v)
+    return v / norm if norm else v
+
+
+class SemanticAnswerCache:
+    """ Réponses du LLM retrouvées par similarité de la question et identité des sources """
+
+    def __init__(self, namespace, path=DEFAULT_CACHE_PATH, threshold=DEFAULT_THRESHOLD,
+                 ttl_hours=DEFAULT_TTL_HOURS, max_entries=DEFAULT_MAX_ENTRIES):
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.namespace = namespace
+        self.path = path
+        self.threshold = threshold
+        self.ttl_seconds = ttl_hours * 3600
+        self.max_entries = max_entries
+        self.lock = threading.Lock()  # Service : recherches et écritures depuis plusieurs threads
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SCHEMA)
+        self.conn.commit()
+        # Statistiques (exposées par /metrics)
+        self.hits = 0
+        self.misses = 0
+        self.source_mismatches = 0  # Question proche, mais autres consultations retrouvées
+        self.expired = 0
+        self.evicted = 0
+        self.invalidated = 0
+        self.llm_seconds_saved = 0.0
+        self.lookup_seconds = 0.0
+        self._data_version = None
+        self.evict()
+        self._load()
+
+    # ---------- Index en mémoire ----------
+    def _load(self):
+        """ Matrice des questions de l'espace de noms, regroupées par ensemble de sources """
+        rows = self.conn.execute(
+            "SELECT id, embedding, sources_key FROM answers WHERE namespace=? ORDER BY id", (self.namespace,)
+        ).fetchall()
+        self.ids = [row[0] for row in rows]
+        self.matrix = (np.stack([np.frombuffer(row[1], dtype=np.float32) for row in rows])
+                       if rows else np.zeros((0, 0), dtype=np.float32))
+        self.by_sources = {}
+        for position, row in enumerate(rows):
+            self.by_sources.setdefault(row[2], []).append(position)
+        self._data_version = self.conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def _refresh(self):
+        """ Autre processus (ingestion, autre service) a écrit dans la base : index rechargé """
+        if self.conn.execute("PRAGMA data_version").fetchone()[0] != self._data_version:
+            self._load()
+
+    def __len__(self):
+        return len(self.ids)
+
+    # ---------- Lecture / écriture ----------
+    def lookup(self, embedding, filenames):
+        """ Réponse en cache pour cette question et ces sources, ou None """
+        start = time.perf_counter()
+        with self.lock:
+            try:
+                return self._lookup(_unit(embedding), sources_key(filenames))
+            finally:
+                self.lookup_seconds += time.perf_counter() - start
+
+    def _lookup(self, query, key):
+        self._refresh()
+        if not self.ids:
+            self.misses += 1
+            return None
+        scores = self.matrix @ query
+        candidates = self.by_sources.get(key, [])
+        if not candidates:
+            if scores.max() >= self.threshold:
+                self.source_mismatches += 1
+            self.misses += 1
+            return None
+        now = time.time()
+        for position in sorted(candidates, key=lambda p: -scores[p]):
+            if scores[position] < self.threshold:
+                break
+            row = self.conn.execute("SELECT answer, llm_seconds, created_at FROM answers WHERE id=?",
+                                    (self.ids[position],)).fetchone()
+            if row is None:
+                continue  # Invalidée entre-temps
+            if now - row[2] > self.ttl_seconds:
+                self.expired += 1
+                continue
+            self.conn.execute("UPDATE answers SET accessed_at=?, hits=hits + 1 WHERE id=?",
+                              (now, self.ids[position]))
+            self.conn.commit()
+            self.hits += 1
+            self.llm_seconds_saved += row[1]
+            return row[0]
+        self.misses += 1
+        return None
+
+    def put(self, question, embedding, filenames, answer, llm_seconds=0.0):
+        vector = _unit(embedding)
+        key = sources_key(filenames)
+        now = time.time()
+        with self.lock:
+            cur = self.conn.execute(
+                "INSERT INTO answers (namespace, question, embedding, sources_key, answer, llm_seconds, "
+                "created_at, accessed_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (self.namespace, question, vector.tobytes(), key, answer, llm_seconds, now, now)
+            )
+            self.conn.executemany("INSERT INTO answer_sources (answer_id, filename) VALUES (?, ?)",
+                                  [(cur.lastrowid, f) for f in sorted(set(filenames))])
+            self.conn.commit()
+            if len(self.ids) + 1 > self.max_entries:
+                self.evict()
+            self._load()
+
+    # ---------- Éviction / invalidation ----------
+    def _delete(self, ids):
+        for i in range(0, len(ids), SQL_BATCH):
+            batch = [(answer_id,) for answer_id in ids[i:i + SQL_BATCH]]
+            self.conn.executemany("DELETE FROM answers WHERE id=?", batch)
+            self.conn.executemany("DELETE FROM answer_sources WHERE answer_id=?", batch)
+        return len(ids)
+
+    def evict(self):
+        """ Supprime les réponses expirées puis les moins récemment lues au-delà de max_entries """
+        expired = [row[0] for row in self.conn.execute(
+            "SELECT id FROM answers WHERE created_at < ?", (time.time() - self.ttl_seconds,))]
+        overflow = [row[0] for row in self.conn.execute(
+            "SELECT id FROM answers WHERE created_at >= ? ORDER BY accessed_at DESC LIMIT -1 OFFSET ?",
+            (time.time() - self.ttl_seconds, self.max_entries))]
+        self.expired += self._delete(expired)
+        self.evicted += self._delete(overflow)
+        self.conn.commit()
+        return len(expired) + len(overflow)
+
+    def invalidate(self, filenames=None):
+        """ Réponses appuyées sur l'une de ces consultations (toutes si filenames est None) """
+        with self.lock:
+            if filenames is None:
+                ids = [row[0] for row in self.conn.execute("SELECT id FROM answers")]
+            else:
+                filenames, ids = sorted(set(filenames)), set()
+                for i in range(0, len(filenames), SQL_BATCH):
+                    batch = filenames[i:i + SQL_BATCH]
+                    ids.update(row[0] for row in self.conn.execute(
+                        "SELECT answer_id FROM answer_sources WHERE filename IN ({})".format(
+                            ",".join("?" * len(batch))), batch))
+                ids = sorted(ids)
+            removed = self._delete(ids)
+            self.conn.commit()
+            self.invalidated += removed
+            self._load()
+        return removed
+
+    # ---------- Métriques ----------
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "source_mismatches": self.source_mismatches,
+            "entries": len(self.ids),
+            "expired": self.expired,
+            "evicted": self.evicted,
+            "invalidated": self.invalidated,
+            "llm_seconds_saved": round(self.llm_seconds_saved, 2),
+            "mean_lookup_ms": round(self.lookup_seconds / lookups * 1000, 3) if lookups else 0.0,
+            "threshold": self.threshold,
+        }
+
+    def report(self):
+        s = self.stats()
+        print(f"   📊 Cache de réponses : {s['hits']} hit(s), {s['misses']} miss ({s['hit_rate']:.0%} de hits, "
+              f"{s['source_mismatches']} question(s) proche(s) aux sources différentes), {s['entries']} entrées, "
+              f"{s['llm_seconds_saved']:.1f}s de LLM économisées, {s['mean_lookup_ms']:.2f} ms par recherche")
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+
+def invalidate_answers(filenames=None, path=DEFAULT_CACHE_PATH):
+    """
+    Appelé par l'ingestion : réponses dont une source a changé (toutes si filenames
+    est None). Tous les espaces de noms sont concernés ; sans cache sur disque, rien à faire.
+    """
+    if not os.path.exists(path):
+        return 0
+    cache = SemanticAnswerCache(namespace="", path=path)
+    removed = cache.invalidate(filenames)
+    cache.close()
+    if removed:
+        print(f"   🧹 {removed} réponse(s) en cache invalidée(s) (sources modifiées).")
+    return removed
@@ -0,0 +1,89 @@
+import os
+import sys
+import time
+import argparse
+
+import numpy as np
+
+# Permet d'importer les modules du projet depuis benchmarks/
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from embedding_backends import load_embeddings, cosine_agreement, BACKENDS, DEFAULT_THREADS
+from embedding_engine import DEFAULT_MODEL_NAME
+from document_loader import find_files, iter_documents
+from chunking import chunk_document
+
+# ==========================================
+# 👇 BENCHMARK : BACKENDS D'INFÉRENCE (TORCH / ONNX / ONNX-INT8) 👇
+# ==========================================
+# Pour chaque backend : temps de chargement, latence d'une question (embed_query,
+# p50 / p95), débit sur les chunks du corpus (embed_documents) et accord cosinus
+# avec le modèle de référence (torch) sur les mêmes chunks.
+# Usage : python benchmarks/bench_backends.py [--threads 4] [--backends torch,onnx-int8]
+
+QUESTIONS = [
+    "Quels sont les symptômes d'une migraine ?",
+    "J'ai de la fièvre et mal à la gorge depuis trois jours",
+    "What should I do about my back pain after lifting?",
+    "Mon test de grossesse est positif mais le taux d'hCG ne double pas",
+    "Douleur thoracique à l'effort, est-ce grave ?",
+]
+AGREEMENT_THRESHOLD = 0.99  # Cosinus moyen minimal pour remplacer la référence
+
+
+def corpus_chunks(folder, limit):
+    texts = []
+    for document in iter_documents(find_files(folder)):
+        texts.extend(chunk["text"] for chunk in chunk_document(document["text"]))
+        if len(texts) >= limit:
+            break
+    return texts[:limit]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark des backends d'embedding (CPU)")
+    parser.add_argument("--model", default=DEFAULT_MODEL_NAME)
+    parser.add_argument("--backends", default=",".join(BACKENDS))
+    parser.add_argument("--threads", type=int, default=DEFAULT_THREADS)
+    parser.add_argument("--corpus", default="Data")
+    parser.add_argument("--chunks", type=int, default=512)
+    parser.add_argument("--repeat", type=int, default=20, help="Répétitions des questions (latence)")
+    args = parser.parse_args()
+
+    texts = corpus_chunks(args.corpus, args.chunks)
+    if not texts:
+        print(f"⚠️ Corpus vide : {args.corpus}")
+        return
+    print(f"📂 {len(texts)} chunks, modèle {args.model}, {args.threads} thread(s)\n")
+
+    reference = None
+    print(f"{'backend':<12}{'chargement s':>14}{'p50 ms':>9}{'p95 ms':>9}{'chunks/s':>11}{'cos moyen':>11}{'cos min':>9}")
+    for backend in args.backends.split(","):
+        start = time.perf_counter()
+        model = load_embeddings(args.model, backend, threads=args.threads)
+        model.embed_query("warm-up")
+        load = time.perf_counter() - start
+
+        latencies = []
+        for _ in range(args.repeat):
+            for question in QUESTIONS:
+                start = time.perf_counter()
+                model.embed_query(question)
+                latencies.append(time.perf_counter() - start)
+        p50, p95 = np.percentile(np.asarray(latencies) * 1000, [50, 95])
+
+        start = time.perf_counter()
+        model.embed_documents(texts)
+        throughput = len(texts) / (time.perf_counter() - start)
+
+        if reference is None:
+            reference = model if backend == "torch" else load_embeddings(args.model, "torch", threads=args.threads)
+        agreement = cosine_agreement(reference, model, texts)
+        flag = "" if agreement["mean"] >= AGREEMENT_THRESHOLD else "  ⚠️ sous le seuil"
+        print(f"{backend:<12}{load:>14.2f}{p50:>9.2f}{p95:>9.2f}{throughput:>11.1f}"
+              f"{agreement['mean']:>11.4f}{agreement['min']:>9.4f}{flag}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+import os
+import sys
+import time
+import argparse
+
+# Permet d'importer les modules du projet depuis benchmarks/
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from document_loader import find_files, iter_documents
+from embedding_engine import EmbeddingEngine, DEFAULT_MODEL_NAME, DEFAULT_WORKERS, DEFAULT_BATCH_SIZE
+
+CORPORA = {
+    "Data": os.path.join(ROOT, "Data"),
+    "medical_dialogues_50": os.path.join(ROOT, "medical_dialogues_50", "medical_dialogues_50"),
+}
+
+
+def load_documents(folder):
+    """ Documents du corpus lus comme à l'ingestion (même détection d'encodage, mêmes noms) """
+    return list(iter_documents(find_files(folder)))
+
+
+def load_corpus(folder):
+    return [document["text"] for document in load_documents(folder)]
+
+
+def bench_per_file(model, texts):
+    """ Chemin actuel : un embed_query par fichier """
+    start = time.perf_counter()
+    for text in texts:
+        model.embed_query(text)
+    return time.perf_counter() - start
+
+
+def bench_engine(texts, workers, batch_size, model):
+    engine = EmbeddingEngine(workers=workers, batch_size=batch_size, embedding_model=model)
+    start = time.perf_counter()
+    engine.embed_documents(texts)
+    elapsed = time.perf_counter() - start
+    engine.close()
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark embed_query vs EmbeddingEngine")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS)
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    args = parser.parse_args()
+
+    from langchain_huggingface import HuggingFaceEmbeddings
+    model = HuggingFaceEmbeddings(model_name=DEFAULT_MODEL_NAME)
+    model.embed_query("warm-up")
+
+    print(f"{'corpus':<22}{'docs':>6}{'par fichier':>14}{'moteur':>12}{'accélération':>14}")
+    for name, folder in CORPORA.items():
+        texts = load_corpus(folder)
+        if not texts:
+            print(f"⚠️ Corpus vide : {folder}")
+            continue
+        t_file = bench_per_file(model, texts)
+        t_engine = bench_engine(texts, args.workers, args.batch_size, model)
+        print(f"{name:<22}{len(texts):>6}{len(texts) / t_file:>10.1f} d/s"
+              f"{len(texts) / t_engine:>8.1f} d/s{t_file / t_engine:>13.2f}x")
+
+
+if __name__ == "__main__":
+    main()
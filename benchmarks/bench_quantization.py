@@ -0,0 +1,63 @@
+import os
+import sys
+import time
+import argparse
+import tempfile
+
+import numpy as np
+
+# Permet d'importer les modules du projet depuis benchmarks/
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from vector_index import LocalVectorIndex, measure_recall, QUANTIZATIONS
+
+# ==========================================
+# 👇 BENCHMARK : INDEX LOCAL FLOAT32 vs INT8 vs BINAIRE 👇
+# ==========================================
+# Vecteurs synthétiques regroupés en thèmes (comme des consultations proches),
+# même index construit sans / avec quantification. Rappel@k mesuré contre le
+# parcours float32 exact, octets parcourus par recherche et latence moyenne.
+
+
+def synthetic_vectors(size, dim, topics, noise, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(topics, dim)).astype(np.float32)
+    vectors = centers[rng.integers(0, topics, size)] + noise * rng.normal(size=(size, dim)).astype(np.float32)
+    return centers, vectors
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark quantification de l'index vectoriel local")
+    parser.add_argument("--size", type=int, default=100000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--topics", type=int, default=500)
+    parser.add_argument("--noise", type=float, default=0.6)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--k", type=int, default=10)
+    args = parser.parse_args()
+
+    centers, vectors = synthetic_vectors(args.size, args.dim, args.topics, args.noise)
+    rng = np.random.default_rng(1)
+    queries = centers[rng.integers(0, args.topics, args.queries)] \
+        + args.noise * rng.normal(size=(args.queries, args.dim)).astype(np.float32)
+    ids = [f"doc_{i}" for i in range(args.size)]
+
+    print(f"{'quantification':<16}{'Mo parcourus':>14}{'gain':>8}{'rappel@' + str(args.k):>12}{'ms/requête':>13}")
+    with tempfile.TemporaryDirectory() as workdir:
+        for quantization in (None,) + QUANTIZATIONS:
+            index = LocalVectorIndex(os.path.join(workdir, str(quantization)))
+            index.build(ids, vectors, ivf_clusters=0, quantization=quantization)
+            index.search(queries[0], k=args.k)  # Pages du memmap chargées
+            start = time.perf_counter()
+            for query in queries:
+                index.search(query, k=args.k)
+            latency = (time.perf_counter() - start) / len(queries) * 1000
+            recall = measure_recall(index, queries, k=args.k)
+            footprint = index.footprint()
+            print(f"{str(quantization or 'float32'):<16}{footprint['search_bytes'] / 1e6:>14.1f}"
+                  f"{footprint['ratio']:>7.1f}x{recall:>12.3f}{latency:>13.2f}")
+
+
+if __name__ == "__main__":
+    main()
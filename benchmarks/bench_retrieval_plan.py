@@ -0,0 +1,109 @@
+import os
+import sys
+import time
+import argparse
+
+# Permet d'importer les modules du projet depuis benchmarks/
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import runtime
+from retrieval import (
+    search_passages, search_passages_many, search_consultations, search_consultations_many, profile_query,
+    CHUNK_SEARCH_QUERY, CHUNK_AGGREGATE_QUERY, TOP_K, CHUNK_TOP_K
+)
+
+# ==========================================
+# 👇 BENCHMARK : PLAN DE LA REQUÊTE DE RECHERCHE (PROFILE) 👇
+# ==========================================
+# 1. db hits par question : agrégation avec deux OPTIONAL MATCH (ancienne requête,
+#    symptômes x maladies lignes par consultation) vs compréhensions de motifs.
+# 2. N questions : N x search_passages (un aller-retour chacune) vs search_passages_many
+#    (UNE requête UNWIND) : allers-retours, durée, db hits.
+# 3. Repli des questions sans chunk (graphe ingéré avant le découpage en chunks) :
+#    N x search_consultations vs search_consultations_many (UNE requête pour toutes).
+# Les db hits ne sont disponibles qu'avec Neo4j (GRAPH_BACKEND=neo4j) ; sur le graphe
+# embarqué, seules les durées sont mesurées.
+# Usage : python benchmarks/bench_retrieval_plan.py [--questions 20]
+
+QUESTIONS = [
+    "Quels sont les symptômes d'une migraine ?",
+    "J'ai de la fièvre et mal à la gorge depuis trois jours",
+    "What should I do about my back pain after lifting?",
+    "Mon test de grossesse est positif mais le taux d'hCG ne double pas",
+    "Douleur thoracique à l'effort, est-ce grave ?",
+    "Why do I have uncomfortable feeling between the middle of my spine and left shoulder blade?",
+    "Quelle est la cause psychologique de la possessivité selon le médecin ?",
+    "What is the reason for continuous eye allergy and irritation?",
+]
+
+# Requête d'agrégation d'origine, gardée ici comme référence de plan
+LEGACY_CHUNK_AGGREGATE_QUERY = """
+MATCH (k)-[:PARTIE_DE]->(c:Consultation)
+WITH c, max(score) AS score,
+     collect({text: k.text, score: score, position: k.position}) AS passages
+ORDER BY score DESC
+LIMIT $k
+OPTIONAL MATCH (c)-[:MENTIONNE_SYMPTOME]->(s:Symptome)
+OPTIONAL MATCH (c)-[:MENTIONNE_MALADIE]->(m:Maladie)
+RETURN c.filename AS filename,
+       passages,
+       collect(distinct s.name) AS symptomes,
+       collect(distinct m.name) AS maladies,
+       score
+"""
+
+
+def db_hits(plan):
+    return "n/a" if plan is None else plan["db_hits"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="db hits et allers-retours de la requête de recherche")
+    parser.add_argument("--questions", type=int, default=20)
+    parser.add_argument("--k", type=int, default=TOP_K)
+    parser.add_argument("--chunk-k", type=int, default=CHUNK_TOP_K)
+    args = parser.parse_args()
+
+    questions = [QUESTIONS[i % len(QUESTIONS)] for i in range(args.questions)]
+    graph = runtime.get_graph()
+    vectors = runtime.get_embeddings().embed_documents(questions)
+
+    print(f"{'agrégation':<24}{'db hits / question':>20}{'ms / question':>15}")
+    for label, aggregate in (("OPTIONAL MATCH x 2", LEGACY_CHUNK_AGGREGATE_QUERY),
+                             ("compréhension de motifs", CHUNK_AGGREGATE_QUERY)):
+        hits, start = [], time.perf_counter()
+        try:
+            for vector in vectors:
+                _, plan = profile_query(graph, CHUNK_SEARCH_QUERY + aggregate,
+                                        {"chunk_k": args.chunk_k, "k": args.k, "embedding": vector})
+                hits.append(plan["db_hits"] if plan else None)
+        except NotImplementedError:
+            print(f"{label:<24}{'(graphe embarqué : requête Neo4j seulement)':>35}")
+            continue
+        ms = (time.perf_counter() - start) / len(vectors) * 1000
+        mean = "n/a" if None in hits else f"{sum(hits) / len(hits):.0f}"
+        print(f"{label:<24}{mean:>20}{ms:>15.2f}")
+
+    print(f"\n{'{} questions'.format(len(questions)):<24}{'allers-retours':>16}{'durée ms':>12}{'db hits':>10}")
+    start = time.perf_counter()
+    for vector in vectors:
+        search_passages(graph, vector, k=args.k, chunk_k=args.chunk_k)
+    print(f"{'search_passages x N':<24}{len(vectors):>16}{(time.perf_counter() - start) * 1000:>12.1f}{'':>10}")
+    start = time.perf_counter()
+    _, plan = search_passages_many(graph, vectors, k=args.k, chunk_k=args.chunk_k, profile=True)
+    print(f"{'search_passages_many':<24}{1:>16}{(time.perf_counter() - start) * 1000:>12.1f}{db_hits(plan):>10}")
+
+    print(f"\n{'repli sans chunk':<28}{'allers-retours':>16}{'durée ms':>12}{'identique':>10}")
+    start = time.perf_counter()
+    expected = [search_consultations(graph, vector, k=args.k) for vector in vectors]
+    print(f"{'search_consultations x N':<28}{len(vectors):>16}{(time.perf_counter() - start) * 1000:>12.1f}{'':>10}")
+    start = time.perf_counter()
+    found = search_consultations_many(graph, vectors, k=args.k)
+    same = [[r["filename"] for r in rows] for rows in expected] == [[r["filename"] for r in rows] for rows in found]
+    print(f"{'search_consultations_many':<28}{1:>16}{(time.perf_counter() - start) * 1000:>12.1f}"
+          f"{'oui' if same else 'NON':>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+import os
+import sys
+import json
+import time
+import argparse
+import subprocess
+
+# Racine du projet : répertoire courant des processus mesurés
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# ==========================================
+# 👇 TEMPS DE DÉMARRAGE À FROID (python -X importtime) 👇
+# ==========================================
+# Importe chaque point d'entrée dans un processus neuf avec `-X importtime` et
+# rapporte : durée totale de l'import, modules les plus coûteux (cumulés).
+# Pour comparer avant / après une modification :
+#   git stash && python benchmarks/bench_startup.py --label avant --output avant.json
+#   git stash pop && python benchmarks/bench_startup.py --label apres --output apres.json
+# Remarque : avant les singletons paresseux (runtime.py), importer un script ouvrait
+# aussi la connexion Neo4j : sans accès réseau, la mesure "avant" s'arrête en erreur.
+
+ENTRY_POINTS = ["chat_graphrag", "chat_graph_tout", "agent_graph_main", "ingestion_graphrag"]
+
+
+def measure(module, top):
+    start = time.perf_counter()
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                          cwd=ROOT, capture_output=True, text=True)
+    wall = time.perf_counter() - start
+    imports = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative_us, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip()) - 1) // 2  # 2 espaces par niveau d'imbrication
+        imports.append({"module": name.strip(), "cumulative_ms": int(cumulative_us) / 1000, "depth": depth})
+    # Dépendances directes (profondeur 0) et leurs sous-imports (profondeur 1)
+    top_level = sorted([i for i in imports if i["depth"] <= 1], key=lambda i: -i["cumulative_ms"])
+    return {
+        "module": module,
+        "ok": proc.returncode == 0,
+        "error": proc.stderr.strip().splitlines()[-1] if proc.returncode else None,
+        "wall_seconds": round(wall, 3),
+        "import_ms": round(sum(i["cumulative_ms"] for i in imports if i["depth"] == 0), 1),
+        "slowest": top_level[:top],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Temps de démarrage à froid des points d'entrée")
+    parser.add_argument("--modules", default=",".join(ENTRY_POINTS))
+    parser.add_argument("--top", type=int, default=8, help="Nombre d'imports les plus lents à afficher")
+    parser.add_argument("--label", default="", help="Étiquette de la mesure (ex. avant / apres)")
+    parser.add_argument("--output", default=None, help="Fichier JSON de résultats")
+    args = parser.parse_args()
+
+    results = []
+    for module in args.modules.split(","):
+        r = measure(module, args.top)
+        results.append(r)
+        status = "✅" if r["ok"] else f"❌ {r['error']}"
+        print(f"\n{module:<22}{r['wall_seconds']:>8.2f}s (processus) {r['import_ms']:>10.1f} ms (imports)  {status}")
+        for i in r["slowest"]:
+            print(f"   {i['cumulative_ms']:>10.1f} ms  {i['module']}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"label": args.label, "python": sys.version.split()[0], "results": results},
+                      f, ensure_ascii=False, indent=2)
+        print(f"\n💾 Résultats écrits dans {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+import io
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import tempfile
+import contextlib
+
+# Permet d'importer les modules du projet depuis benchmarks/
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import runtime
+from fakes import FakeChatModel, FakeEmbeddings, InMemoryGraph
+from ingestion_pipeline import run_ingestion
+from query_service import QueryService, BATCH_WINDOW_MS, LLM_CONCURRENCY
+from run_benchmarks import CORPORA, QUESTIONS, UNLIMITED, materialize_corpus, percentiles
+
+# ==========================================
+# 👇 TEST DE CHARGE DU SERVICE (HORS-LIGNE) 👇
+# ==========================================
+# Démarre query_service.QueryService dans ce processus avec les doublures locales
+# (graphe en mémoire ingéré depuis un corpus, faux LLM, faux embeddings), puis
+# lance N clients HTTP concurrents (connexions keep-alive).
+# Rapporte : questions/s, latences p50/p95/p99, taille moyenne des lots d'embedding.
+#
+# Usage : python benchmarks/load_test_service.py [--clients 32] [--requests 20] [--endpoint answer]
+
+
+async def http_post(reader, writer, path, payload):
+    body = json.dumps(payload).encode("utf-8")
+    writer.write(f"POST {path} HTTP/1.1\r\nHost: localhost\r\nContent-Type: application/json\r\n"
+                 f"Content-Length: {len(body)}\r\n\r\n".encode("latin-1") + body)
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        key, _, value = line.decode("latin-1").partition(":")
+        if key.strip().lower() == "content-length":
+            length = int(value)
+    return status, json.loads(await reader.readexactly(length))
+
+
+async def client(address, path, questions, latencies, errors):
+    reader, writer = await asyncio.open_connection(*address)
+    try:
+        for question in questions:
+            start = time.perf_counter()
+            status, _ = await http_post(reader, writer, path, {"question": question})
+            latencies.append(time.perf_counter() - start)
+            if status != 200:
+                errors.append(status)
+    finally:
+        writer.close()
+
+
+async def run(args, graph):
+    service = QueryService(window_ms=args.batch_window_ms, llm_concurrency=args.llm_concurrency)
+    loop = asyncio.get_running_loop()
+    ready = loop.create_future()
+    server = loop.create_task(service.serve("127.0.0.1", 0, ready=ready))
+    address = await ready
+
+    latencies, errors = [], []
+    round_trips = graph.round_trips
+    start = time.perf_counter()
+    await asyncio.gather(*[
+        client(address, f"/{args.endpoint}",
+               [QUESTIONS[(c + i) % len(QUESTIONS)] for i in range(args.requests)], latencies, errors)
+        for c in range(args.clients)
+    ])
+    elapsed = time.perf_counter() - start
+    metrics = service.metrics()
+    server.cancel()
+    with contextlib.suppress(asyncio.CancelledError):
+        await server
+    return {
+        "clients": args.clients,
+        "requests": len(latencies),
+        "errors": len(errors),
+        "seconds": round(elapsed, 3),
+        "questions_per_second": round(len(latencies) / elapsed, 1),
+        "round_trips": graph.round_trips - round_trips,
+        **percentiles(latencies),
+        "service": metrics,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Test de charge de query_service.py (doublures locales)")
+    parser.add_argument("--corpus", default="medical_dialogues_50", choices=list(CORPORA))
+    parser.add_argument("--scale", type=int, default=1)
+    parser.add_argument("--clients", type=int, default=32)
+    parser.add_argument("--requests", type=int, default=20, help="Questions par client")
+    parser.add_argument("--endpoint", default="answer", choices=["answer", "search"])
+    parser.add_argument("--batch-window-ms", type=float, default=BATCH_WINDOW_MS)
+    parser.add_argument("--llm-concurrency", type=int, default=LLM_CONCURRENCY)
+    parser.add_argument("--llm-latency", type=float, default=0.2, help="Latence simulée d'un appel LLM (s)")
+    parser.add_argument("--graph-latency", type=float, default=0.005)
+    parser.add_argument("--embed-latency", type=float, default=0.002, help="Latence simulée par texte (s)")
+    parser.add_argument("--output", default=None, help="Fichier JSON de résultats")
+    args = parser.parse_args()
+
+    graph = InMemoryGraph()
+    llm = FakeChatModel(latency=args.llm_latency)
+    embeddings = FakeEmbeddings()
+    runtime.override(graph=graph, llm=llm, embeddings=embeddings, local_index=None, local_chunk_index=None,
+                     graph_snapshot=None, lexical_index=None, answer_cache=None)  # Concurrence LLM mesurée
+    with tempfile.TemporaryDirectory() as workdir, contextlib.redirect_stdout(io.StringIO()):
+        files = materialize_corpus(CORPORA[args.corpus], args.scale, workdir)
+        run_ingestion(graph, files, embeddings, FakeChatModel(latency=0), "fake", "fake", embed_workers=1,
+                      use_cache=False, sync_local_index=False, concurrency=32, rpm=UNLIMITED, tpm=UNLIMITED)
+    # Latences appliquées seulement pendant le test (l'ingestion n'est pas mesurée ici)
+    graph.latency = args.graph_latency
+    embeddings.latency = args.embed_latency
+    print(f"⏱️ {args.clients} clients x {args.requests} questions sur /{args.endpoint} "
+          f"({len(files)} documents)...")
+
+    result = asyncio.run(run(args, graph))
+    s = result["service"]
+    print(f"   {result['questions_per_second']} questions/s, p50 {result.get('p50_ms')} ms, "
+          f"p95 {result.get('p95_ms')} ms, p99 {result.get('p99_ms')} ms, {result['errors']} erreur(s)")
+    print(f"   Embeddings : {s['embedded_questions']} questions en {s['embed_batches']} lot(s) "
+          f"(moyenne {s['mean_batch_size']}, max {s['largest_batch']}), "
+          f"{llm.max_in_flight} appels LLM simultanés au plus")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"config": vars(args), "result": result}, f, ensure_ascii=False, indent=2)
+        print(f"💾 Résultats écrits dans {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,237 @@
+import io
+import os
+import sys
+import json
+import time
+import argparse
+import resource
+import tempfile
+import importlib
+import contextlib
+
+import numpy as np
+
+# Permet d'importer les modules du projet depuis benchmarks/
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from bench_embeddings import CORPORA, load_documents
+import runtime
+from fakes import FakeChatModel, FakeEmbeddings, InMemoryGraph
+from answer_cache import SemanticAnswerCache
+
+# ==========================================
+# 👇 BENCHMARKS DE BOUT EN BOUT HORS-LIGNE 👇
+# ==========================================
+# Exécute les vrais chemins du projet (build_graph_rag, graph_rag_search,
+# generate_response de chat_graph_tout.py, run_agent_batch de agent_graph_main.py)
+# avec des doublures locales à la place de Groq, AuraDB et HuggingFace (fakes.py,
+# injectées par runtime.override) :
+# résultats reproductibles, sans quota ni réseau. Les latences simulées
+# (--llm-latency, --graph-latency) permettent de reproduire le coût des allers-retours.
+# Mesures : documents/s, latences p50/p95/p99, allers-retours Neo4j, appels LLM
+# et pic de mémoire (RSS) du processus, sur les corpus fournis et leurs copies x10 / x100.
+#
+# Usage : python benchmarks/run_benchmarks.py [--scales 1,10,100] [--output resultats.json]
+
+RESULTS_DIR = os.path.join(ROOT, "benchmarks", "results")
+DEFAULT_SCALES = "1,10,100"
+QUESTIONS = [
+    "Why do I have uncomfortable feeling between the middle of my spine and left shoulder blade?",
+    "Quelle est la cause psychologique de la possessivité selon le médecin ?",
+    "Pourquoi un taux de hCG qui ne double pas est-il un mauvais signe ?",
+    "What is the reason for continuous eye allergy and irritation?",
+    "Combien de consultations parlent de problèmes cardiaques ou de palpitations ?",
+    "Quels sont les symptômes de la grippe ?",
+    "Is chest pain after exercise a sign of heart disease?",
+    "Le client se plaint de quelle facture ?",
+]
+UNLIMITED = 10 ** 9  # Quotas de l'ordonnanceur : le faux LLM n'en a pas
+
+
+def peak_rss_mb():
+    """ Pic de mémoire résidente du processus (ru_maxrss est en Ko sous Linux, en octets sous macOS) """
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def percentiles(samples):
+    if not samples:
+        return {}
+    p50, p95, p99 = np.percentile(np.asarray(samples) * 1000, [50, 95, 99])
+    return {"p50_ms": round(float(p50), 3), "p95_ms": round(float(p95), 3), "p99_ms": round(float(p99), 3)}
+
+
+def materialize_corpus(folder, scale, workdir):
+    """ Copie le corpus (en UTF-8) `scale` fois dans workdir et retourne les chemins """
+    documents = load_documents(folder)
+    os.makedirs(workdir, exist_ok=True)
+    files = []
+    for copy in range(scale):
+        for document in documents:
+            name = document["filename"].replace("/", "__")
+            stem = os.path.splitext(name)[0]
+            path = os.path.join(workdir, f"{stem}__{copy:03d}.txt" if scale > 1 else name)
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(document["text"])
+            files.append(path)
+    return files
+
+
+def load_script(module_name, verbose=False):
+    """ Importe un script du projet (rien n'est construit à l'import, voir runtime.py) """
+    with contextlib.redirect_stdout(sys.stdout if verbose else io.StringIO()):
+        return importlib.import_module(module_name)
+
+
+class Stage:
+    """ Mesure une étape : durée, allers-retours graphe, appels LLM / embeddings, RSS """
+
+    def __init__(self, name, graph, llm, embeddings, verbose=False):
+        self.name = name
+        self.graph = graph
+        self.llm = llm
+        self.embeddings = embeddings
+        self.out = sys.stdout if verbose else io.StringIO()
+        self.latencies = []
+        self.result = {}
+
+    def time(self, fn, *args, **kwargs):
+        """ Appel unitaire chronométré (alimente les percentiles) """
+        start = time.perf_counter()
+        value = fn(*args, **kwargs)
+        self.latencies.append(time.perf_counter() - start)
+        return value
+
+    def __enter__(self):
+        self._stdout = contextlib.redirect_stdout(self.out)
+        self._stdout.__enter__()
+        self._start = time.perf_counter()
+        self._round_trips = self.graph.round_trips
+        self._llm_calls = self.llm.calls
+        self._embedding_calls = self.embeddings.calls
+        return self
+
+    def __exit__(self, *exc):
+        seconds = time.perf_counter() - self._start
+        self._stdout.__exit__(*exc)
+        self.result = {
+            "seconds": round(seconds, 4),
+            "round_trips": self.graph.round_trips - self._round_trips,
+            "llm_calls": self.llm.calls - self._llm_calls,
+            "embedding_calls": self.embeddings.calls - self._embedding_calls,
+            "peak_rss_mb": round(peak_rss_mb(), 1),
+            **percentiles(self.latencies),
+        }
+        return False
+
+
+def run_corpus(chat, agent, files, args):
+    graph = InMemoryGraph(latency=args.graph_latency)
+    llm = FakeChatModel(latency=args.llm_latency)
+    embeddings = FakeEmbeddings(latency=args.embed_latency)
+    runtime.reset()
+    runtime.override(graph=graph, llm=llm, embeddings=embeddings, local_index=None, local_chunk_index=None,
+                     graph_snapshot=None, lexical_index=None, answer_cache=None)
+    options = dict(use_cache=False, sync_local_index=False, embed_workers=1,
+                   concurrency=args.concurrency, rpm=UNLIMITED, tpm=UNLIMITED)
+    stages = {}
+
+    with Stage("ingestion", graph, llm, embeddings, args.verbose) as stage:
+        chat.build_graph_rag(graph, files, incremental=False, **options)
+    stages["ingestion"] = dict(stage.result, docs_per_second=round(len(files) / stage.result["seconds"], 1))
+
+    with Stage("ingestion_incrementale", graph, llm, embeddings, args.verbose) as stage:
+        chat.build_graph_rag(graph, files, incremental=True, **options)
+    stages["ingestion_incrementale"] = dict(
+        stage.result, docs_per_second=round(len(files) / stage.result["seconds"], 1))
+
+    questions = [QUESTIONS[i % len(QUESTIONS)] for i in range(args.queries)]
+    with Stage("graph_rag_search", graph, llm, embeddings, args.verbose) as stage:
+        for question in questions:
+            stage.time(chat.graph_rag_search, question)
+    stages["graph_rag_search"] = stage.result
+
+    # Même lot de questions en une seule requête UNWIND (search_passages_many)
+    with Stage("graph_rag_search_many", graph, llm, embeddings, args.verbose) as stage:
+        stage.time(chat.graph_rag_search_many, questions)
+    stages["graph_rag_search_many"] = stage.result
+
+    with Stage("generate_response", graph, llm, embeddings, args.verbose) as stage:
+        for question in questions:
+            stage.time(chat.generate_response, question)
+    stages["generate_response"] = stage.result
+
+    # Cache sémantique des réponses (en mémoire) : les questions répétées ne rappellent pas le LLM
+    answer_cache = SemanticAnswerCache("benchmark", path=":memory:")
+    runtime.override(answer_cache=answer_cache)
+    with Stage("generate_response_cache", graph, llm, embeddings, args.verbose) as stage:
+        for question in questions:
+            stage.time(chat.generate_response, question)
+    stages["generate_response_cache"] = dict(stage.result, answer_cache_hit_rate=answer_cache.stats()["hit_rate"])
+    runtime.override(answer_cache=None)
+
+    if agent is not None:
+        from fakes import FakeAgentChatModel
+        agent_llm = FakeAgentChatModel(latency=args.llm_latency)
+        runtime.override(llm=agent_llm)
+        with Stage("run_agent_batch", graph, agent_llm, embeddings, args.verbose) as stage:
+            results = agent.run_agent_batch(pause=0)  # Pas de quota à ménager
+        stage.latencies = [r["seconds"] for r in results if "seconds" in r]
+        stages["run_agent_batch"] = dict(stage.result, errors=sum("error" in r for r in results),
+                                         **percentiles(stage.latencies))
+    return stages
+
+
+def print_summary(runs):
+    print(f"\n{'corpus':<24}{'x':>5}{'docs':>7}  {'étape':<24}{'s':>9}{'docs/s':>9}"
+          f"{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'A/R':>7}{'LLM':>7}{'RSS Mo':>9}")
+    for run in runs:
+        for name, s in run["stages"].items():
+            print(f"{run['corpus']:<24}{run['scale']:>5}{run['documents']:>7}  {name:<24}"
+                  f"{s['seconds']:>9.3f}{s.get('docs_per_second', ''):>9}"
+                  f"{s.get('p50_ms', ''):>9}{s.get('p95_ms', ''):>9}{s.get('p99_ms', ''):>9}"
+                  f"{s['round_trips']:>7}{s['llm_calls']:>7}{s['peak_rss_mb']:>9}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks GraphRAG hors-ligne (doublures locales)")
+    parser.add_argument("--scales", default=DEFAULT_SCALES, help="Facteurs de copie des corpus, ex. 1,10,100")
+    parser.add_argument("--corpora", default=",".join(CORPORA), help="Corpus à utiliser")
+    parser.add_argument("--queries", type=int, default=50, help="Questions par étape de recherche")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--llm-latency", type=float, default=0.02, help="Latence simulée d'un appel LLM (s)")
+    parser.add_argument("--graph-latency", type=float, default=0.005, help="Latence simulée d'une requête Neo4j (s)")
+    parser.add_argument("--embed-latency", type=float, default=0.0, help="Latence simulée par texte embarqué (s)")
+    parser.add_argument("--no-agent", action="store_true", help="Ignore run_agent_batch (langgraph absent)")
+    parser.add_argument("--output", default=None, help="Fichier JSON (défaut : benchmarks/results/)")
+    parser.add_argument("--verbose", action="store_true", help="Affiche les sorties des scripts")
+    args = parser.parse_args()
+
+    chat = load_script("chat_graph_tout", args.verbose)
+    agent = None if args.no_agent else load_script("agent_graph_main", args.verbose)
+
+    runs = []
+    with tempfile.TemporaryDirectory() as workdir:
+        for corpus in args.corpora.split(","):
+            for scale in [int(s) for s in args.scales.split(",")]:
+                files = materialize_corpus(CORPORA[corpus], scale, os.path.join(workdir, f"{corpus}_x{scale}"))
+                print(f"⏱️ {corpus} x{scale} ({len(files)} documents)...")
+                runs.append({"corpus": corpus, "scale": scale, "documents": len(files),
+                             "stages": run_corpus(chat, agent, files, args)})
+
+    print_summary(runs)
+    output = args.output or os.path.join(RESULTS_DIR, time.strftime("benchmark-%Y%m%d-%H%M%S.json"))
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump({
+            "generated_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": sys.version.split()[0],
+            "config": {k: v for k, v in vars(args).items() if k != "output"},
+            "runs": runs,
+        }, f, ensure_ascii=False, indent=2)
+    print(f"\n💾 Résultats écrits dans {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,15 @@
 import os
-import glob
-import json
+import time
 import warnings
-from langchain_groq import ChatGroq
-from langchain_community.graphs import Neo4jGraph
-from langchain_huggingface import HuggingFaceEmbeddings
-from langchain_core.prompts import PromptTemplate
+
+import runtime
+from ingestion_pipeline import run_ingestion
+from document_loader import find_files
+from retrieval import search_passages, search_passages_many, keyword_shortcut
+from context_builder import ContextBuilder
+from vector_index import INDEX_DIR, CHUNK_INDEX_DIR
+from answer_cache import answer_namespace
+from tracing import span, traced
 
 warnings.filterwarnings("ignore")
 
@@ -22,131 +26,53 @@ os.environ["NEO4J_URI"] = MY_NEO4J_URI
 os.environ["NEO4J_USERNAME"] = MY_NEO4J_USER
 os.environ["NEO4J_PASSWORD"] = MY_NEO4J_PASS
 
-print("🤖 Initialisation du système GraphRAG...")
-graph = Neo4jGraph()
-llm = ChatGroq(model_name="llama-3.1-8b-instant", temperature=0)
-embedding_model = HuggingFaceEmbeddings(model_name="all-MiniLM-L6-v2")
+# Graphe, LLM et modèle d'embedding : singletons paresseux (voir runtime.py)
+EMBEDDING_MODEL_NAME = "all-MiniLM-L6-v2"
+LLM_MODEL_NAME = "llama-3.1-8b-instant"
+context_builder = ContextBuilder()
 
 # ==========================================
 # 👇 FONCTIONS 👇
 # ==========================================
-def get_files(folder_name):
-    script_dir = os.path.dirname(os.path.abspath(__file__))
-    paths_to_check = [
-        os.path.join(script_dir, folder_name),
-        os.path.join(script_dir, folder_name, folder_name),
-        folder_name
-    ]
-    for path in paths_to_check:
-        if os.path.exists(path):
-            files = glob.glob(os.path.join(path, "*.txt"))
-            if files:
-                return files
-    return []
-
-def extract_entities(text):
-    prompt = PromptTemplate(
-        template="""
-        Analyse ce texte médical. Extrais une liste de SYMPTOMES et une liste de MALADIES.
-        Format JSON STRICT: {{"symptomes": ["fièvre", "toux"], "maladies": ["grippe"]}}
-        Traduis les termes en Français.
-        Texte: {text}
-        """,
-        input_variables=["text"]
-    )
-    try:
-        chain = prompt | llm
-        res = chain.invoke({"text": text})
-        json_str = res.content.replace("```json", "").replace("```", "").strip()
-        start = json_str.find("{")
-        end = json_str.rfind("}") + 1
-        return json.loads(json_str[start:end])
-    except:
-        return {"symptomes": [], "maladies": []}
-
-def build_graph_rag(graph, files):
-    print(f"\n🚀 Ingestion GraphRAG pour {len(files)} fichiers...")
-    
-    # 1. Nettoyage complet
-    graph.query("MATCH (n) DETACH DELETE n")
-    
-    # 2. Création de l'Index Vectoriel
-    try:
-        graph.query("DROP INDEX consultation_vector IF EXISTS")
-        graph.query("""
-            CREATE VECTOR INDEX consultation_vector IF NOT EXISTS
-            FOR (c:Consultation)
-            ON (c.embedding)
-            OPTIONS {indexConfig: {
-              `vector.dimensions`: 384,
-              `vector.similarity_function`: 'cosine'
-            }}
-        """)
-        print("✅ Index Vectoriel créé dans Neo4j.")
-    except Exception as e:
-        print(f"⚠️ Info Index: {e}")
-
-    # 3. Traitement des fichiers
-    for i, file_path in enumerate(files):
-        filename = os.path.basename(file_path)
-        print(f"   📄 [{i+1}/{len(files)}] Traitement de {filename}...")
-        with open(file_path, 'r', encoding='utf-8') as f:
-            content = f.read()
-
-        vector = embedding_model.embed_query(content)
-        graph.query("""
-            MERGE (c:Consultation {filename: $filename})
-            SET c.content = $content,
-                c.embedding = $embedding
-        """, params={"filename": filename, "content": content, "embedding": vector})
-
-        entities = extract_entities(content)
-        for sym in entities.get("symptomes", []):
-            graph.query("""
-                MATCH (c:Consultation {filename: $filename})
-                MERGE (s:Symptome {name: toLower($name)})
-                MERGE (c)-[:MENTIONNE_SYMPTOME]->(s)
-            """, params={"filename": filename, "name": sym})
-        for mal in entities.get("maladies", []):
-            graph.query("""
-                MATCH (c:Consultation {filename: $filename})
-                MERGE (d:Maladie {name: toLower($name)})
-                MERGE (c)-[:MENTIONNE_MALADIE]->(d)
-            """, params={"filename": filename, "name": mal})
+def build_graph_rag(graph, files, incremental=False, **options):
+    run_ingestion(graph, files, runtime.get_embeddings(EMBEDDING_MODEL_NAME), runtime.get_llm(LLM_MODEL_NAME),
+                  EMBEDDING_MODEL_NAME, LLM_MODEL_NAME, incremental=incremental, **options)
+    # Les index locaux ont pu être resynchronisés : ils seront rouverts à la prochaine question
+    runtime.invalidate_local_indexes()
     print("\n✅ Ingestion terminée ! Graph prêt pour interrogation.")
 
+@traced("graph_rag_search")
+def graph_rag_search_with_vector(question):
+    """ (résultats, vecteur de la question) ; vecteur None si le raccourci BM25 a suffi """
+    lexical_index = runtime.get_lexical_index()
+    shortcut = keyword_shortcut(runtime.get_graph(), question, lexical_index)
+    if shortcut:
+        return shortcut, None
+    with span("embed_query"):
+        question_vector = runtime.get_embeddings(EMBEDDING_MODEL_NAME).embed_query(question)
+    return search_passages(runtime.get_graph(), question_vector,
+                           local_chunk_index=runtime.get_local_index(CHUNK_INDEX_DIR, EMBEDDING_MODEL_NAME),
+                           local_index=runtime.get_local_index(INDEX_DIR, EMBEDDING_MODEL_NAME),
+                           graph_snapshot=runtime.get_graph_snapshot(),
+                           question=question, lexical_index=lexical_index), question_vector
+
 def graph_rag_search(question):
-    question_vector = embedding_model.embed_query(question)
-    cypher_query = """
-    CALL db.index.vector.queryNodes('consultation_vector', 3, $embedding)
-    YIELD node AS c, score
-    OPTIONAL MATCH (c)-[:MENTIONNE_SYMPTOME]->(s:Symptome)
-    OPTIONAL MATCH (c)-[:MENTIONNE_MALADIE]->(m:Maladie)
-    RETURN c.filename AS filename, 
-           c.content AS content, 
-           collect(distinct s.name) AS symptomes, 
-           collect(distinct m.name) AS maladies,
-           score
-    """
-    return graph.query(cypher_query, params={"embedding": question_vector})
+    return graph_rag_search_with_vector(question)[0]
 
-def generate_response(question):
-    context_data = graph_rag_search(question)
-    if not context_data:
-        return "Je n'ai rien trouvé de pertinent dans la base."
-    
-    context_text = ""
-    for doc in context_data:
-        context_text += f"""
-        --- DOCUMENT PERTINENT (Score: {doc['score']:.2f}) ---
-        Source: {doc['filename']}
-        Symptômes: {', '.join(doc['symptomes'])}
-        Maladies: {', '.join(doc['maladies'])}
-        Contenu:
-        {doc['content']}
-        ----------------------------------------------------
-        """
-    prompt = f"""
+@traced("graph_rag_search_many")
+def graph_rag_search_many(questions):
+    """ Lot de questions : un embedding et une requête UNWIND pour tout le lot """
+    if not questions:
+        return []
+    embeddings = runtime.get_embeddings(EMBEDDING_MODEL_NAME)
+    with span("embed_queries", questions=len(questions)):
+        vectors = getattr(embeddings, "embed_queries", embeddings.embed_documents)(list(questions))
+    return search_passages_many(runtime.get_graph(), vectors,
+                                local_chunk_index=runtime.get_local_index(CHUNK_INDEX_DIR, EMBEDDING_MODEL_NAME),
+                                local_index=runtime.get_local_index(INDEX_DIR, EMBEDDING_MODEL_NAME))
+
+def build_prompt(question, context_text):
+    return f"""
     Tu es un assistant médical expert. 
     Utilise les informations contextuelles ci-dessous pour répondre à la question.
     Si la réponse n'est pas dans le contexte, dis "Je ne sais pas".
@@ -159,23 +85,46 @@ def generate_response(question):
     
     RÉPONSE:
     """
-    response = llm.invoke(prompt)
+
+@traced("generate_response")
+def generate_response(question):
+    context_data, question_vector = graph_rag_search_with_vector(question)
+    if not context_data:
+        return "Je n'ai rien trouvé de pertinent dans la base."
+    
+    # Question proche déjà répondue avec les mêmes sources : réponse du cache, sans LLM
+    answer_cache = runtime.get_answer_cache(answer_namespace(LLM_MODEL_NAME, EMBEDDING_MODEL_NAME, build_prompt))
+    sources = [r["filename"] for r in context_data]
+    if answer_cache is not None:
+        with span("answer_cache.lookup"):
+            if question_vector is None:  # Raccourci BM25 : la question n'a pas encore été vectorisée
+                question_vector = runtime.get_embeddings(EMBEDDING_MODEL_NAME).embed_query(question)
+            cached = answer_cache.lookup(question_vector, sources)
+        if cached is not None:
+            return cached
+    
+    context_text, context_stats = context_builder.build_with_stats(question, context_data)
+    context_builder.report(context_stats)
+    prompt = build_prompt(question, context_text)
+    start = time.perf_counter()
+    with span("llm.invoke", prompt_chars=len(prompt)):
+        response = runtime.get_llm(LLM_MODEL_NAME).invoke(prompt)
+    if answer_cache is not None:
+        answer_cache.put(question, question_vector, sources, response.content, time.perf_counter() - start)
     return response.content
 
 # ==========================================
 # 👇 MAIN 👇
 # ==========================================
 if __name__ == "__main__":
-    files = get_files("medical_dialogues_50")
+    files = find_files("medical_dialogues_50")
     if not files:
         print("❌ Fichiers introuvables. Vérifiez le dossier 'medical_dialogues_50'.")
     else:
-        # Vérifie si la base est déjà remplie
-        check = graph.query("MATCH (c:Consultation) RETURN count(c) AS cnt")
-        if check[0]['cnt'] == 0:
-            build_graph_rag(graph, files)
-        else:
-            print("ℹ️ Graph Neo4j déjà rempli, passage direct au mode interrogation.")
+        # Ingestion incrémentale : seuls les fichiers nouveaux / modifiés / supprimés
+        # coûtent quelque chose, une base à jour passe directement à l'interrogation.
+        print("🤖 Initialisation du système GraphRAG...")
+        build_graph_rag(runtime.get_graph(), files, incremental=True)
         
         print("\n✅ Système prêt ! Posez vos questions (tapez 'q' pour quitter).")
         while True:
@@ -1,8 +1,13 @@
 import os
+import time
 import warnings
-from langchain_groq import ChatGroq
-from langchain_community.graphs import Neo4jGraph
-from langchain_huggingface import HuggingFaceEmbeddings
+
+import runtime
+from retrieval import search_passages, search_passages_many, keyword_shortcut
+from context_builder import ContextBuilder
+from vector_index import INDEX_DIR, CHUNK_INDEX_DIR
+from answer_cache import answer_namespace
+from tracing import span, traced
 
 warnings.filterwarnings("ignore")
 
@@ -19,63 +24,64 @@ os.environ["NEO4J_URI"] = MY_NEO4J_URI
 os.environ["NEO4J_USERNAME"] = MY_NEO4J_USER
 os.environ["NEO4J_PASSWORD"] = MY_NEO4J_PASS
 
-# Initialisation des modèles
-print("🤖 Initialisation du système GraphRAG...")
-graph = Neo4jGraph()
-llm = ChatGroq(model_name="llama-3.1-8b-instant", temperature=0)
-embedding_model = HuggingFaceEmbeddings(model_name="all-MiniLM-L6-v2")
+# Modèles et connexion Neo4j : construits au premier usage (voir runtime.py),
+# l'import de ce module est donc instantané.
+EMBEDDING_MODEL_NAME = "all-MiniLM-L6-v2"
+LLM_MODEL_NAME = "llama-3.1-8b-instant"
+# Contexte borné en tokens (latence et coût du LLM maîtrisés)
+context_builder = ContextBuilder()
 
-def graph_rag_search(question):
+@traced("graph_rag_search")
+def graph_rag_search_with_vector(question):
     """
     C'est ici que la magie de l'architecture opère.
+    Retourne (résultats, vecteur de la question), réutilisé par le cache de réponses ;
+    vecteur None si le raccourci BM25 a suffi.
     """
     
+    # 0. Requête par mots-clés évidente ("hCG") : l'index BM25 suffit, pas d'embedding
+    lexical_index = runtime.get_lexical_index()
+    shortcut = keyword_shortcut(runtime.get_graph(), question, lexical_index)
+    if shortcut:
+        return shortcut, None
+
     # 1. Vectorisation de la question utilisateur
-    question_vector = embedding_model.embed_query(question)
+    with span("embed_query"):
+        question_vector = runtime.get_embeddings(EMBEDDING_MODEL_NAME).embed_query(question)
     
     # 2. Requête Hybride (Vecteur + Graphe)
-    # On cherche les 3 consultations les plus proches (vector search)
+    # On cherche les 3 consultations les plus proches via leurs tours de parole
+    # (vector search sur les chunks, en local si possible)
     # ET on récupère les symptômes/maladies connectés (graph traversal)
-    cypher_query = """
-    CALL db.index.vector.queryNodes('consultation_vector', 3, $embedding)
-    YIELD node AS c, score
-    
-    // Traversée du graphe pour enrichir le contexte
-    OPTIONAL MATCH (c)-[:MENTIONNE_SYMPTOME]->(s:Symptome)
-    OPTIONAL MATCH (c)-[:MENTIONNE_MALADIE]->(m:Maladie)
-    
-    RETURN c.filename AS filename, 
-           c.content AS content, 
-           collect(distinct s.name) AS symptomes, 
-           collect(distinct m.name) AS maladies,
-           score
+    # Index vectoriels locaux (memmap) s'ils ont été synchronisés par l'ingestion, sinon AuraDB
+    results = search_passages(runtime.get_graph(), question_vector,
+                              local_chunk_index=runtime.get_local_index(CHUNK_INDEX_DIR, EMBEDDING_MODEL_NAME),
+                              local_index=runtime.get_local_index(INDEX_DIR, EMBEDDING_MODEL_NAME),
+                              graph_snapshot=runtime.get_graph_snapshot(),
+                              question=question, lexical_index=lexical_index)
+    return results, question_vector
+
+def graph_rag_search(question):
+    return graph_rag_search_with_vector(question)[0]
+
+@traced("graph_rag_search_many")
+def graph_rag_search_many(questions):
     """
-    
-    results = graph.query(cypher_query, params={"embedding": question_vector})
-    return results
+    Lot de questions (évaluation) : UN appel d'embedding et UNE requête UNWIND pour
+    tout le lot, au lieu d'un aller-retour par question (sans fusion BM25 ni expansion)
+    """
+    if not questions:
+        return []
+    embeddings = runtime.get_embeddings(EMBEDDING_MODEL_NAME)
+    with span("embed_queries", questions=len(questions)):
+        vectors = getattr(embeddings, "embed_queries", embeddings.embed_documents)(list(questions))
+    return search_passages_many(runtime.get_graph(), vectors,
+                                local_chunk_index=runtime.get_local_index(CHUNK_INDEX_DIR, EMBEDDING_MODEL_NAME),
+                                local_index=runtime.get_local_index(INDEX_DIR, EMBEDDING_MODEL_NAME))
 
-def generate_response(question):
-    # Etape de Récupération (Retrieval)
-    context_data = graph_rag_search(question)
-    
-    if not context_data:
-        return "Je n'ai rien trouvé de pertinent dans la base."
-    
-    # Construction du Contexte pour le LLM
-    context_text = ""
-    for doc in context_data:
-        context_text += f"""
-        --- DOCUMENT PERTINENT (Score: {doc['score']:.2f}) ---
-        Source: {doc['filename']}
-        Symptômes Identifiés (Graph): {', '.join(doc['symptomes'])}
-        Maladies Identifiées (Graph): {', '.join(doc['maladies'])}
-        Contenu du dialogue:
-        {doc['content']}
-        ----------------------------------------------------
-        """
-    
-    # Prompt Augmenté (RAG)
-    prompt = f"""
+def build_prompt(question, context_text):
+    """ Prompt Augmenté (RAG), partagé avec query_service.py """
+    return f"""
     Tu es un assistant médical expert. 
     Utilise les informations contextuelles ci-dessous (issues d'une recherche vectorielle et graphique) pour répondre à la question.
     
@@ -89,12 +95,47 @@ def generate_response(question):
     
     RÉPONSE:
     """
+
+def answer_cache_namespace(llm_model_name=LLM_MODEL_NAME, embedding_model_name=EMBEDDING_MODEL_NAME):
+    """ Espace de noms du cache de réponses : change avec les modèles ou le gabarit du prompt """
+    return answer_namespace(llm_model_name, embedding_model_name, build_prompt)
+
+@traced("generate_response")
+def generate_response(question):
+    # Etape de Récupération (Retrieval)
+    context_data, question_vector = graph_rag_search_with_vector(question)
+    
+    if not context_data:
+        return "Je n'ai rien trouvé de pertinent dans la base."
+    
+    # Question déjà répondue (même formulation ou proche) avec les mêmes sources : pas d'appel LLM
+    answer_cache = runtime.get_answer_cache(answer_cache_namespace())
+    sources = [r["filename"] for r in context_data]
+    if answer_cache is not None:
+        with span("answer_cache.lookup"):
+            if question_vector is None:  # Raccourci BM25 : la question n'a pas encore été vectorisée
+                question_vector = runtime.get_embeddings(EMBEDDING_MODEL_NAME).embed_query(question)
+            cached = answer_cache.lookup(question_vector, sources)
+        if cached is not None:
+            return cached
+    
+    # Construction du Contexte pour le LLM (budget de tokens, passages les plus pertinents)
+    context_text, context_stats = context_builder.build_with_stats(question, context_data)
+    context_builder.report(context_stats)
+    prompt = build_prompt(question, context_text)
     
     # Génération
-    response = llm.invoke(prompt)
+    start = time.perf_counter()
+    with span("llm.invoke", prompt_chars=len(prompt)):
+        response = runtime.get_llm(LLM_MODEL_NAME).invoke(prompt)
+    if answer_cache is not None:
+        answer_cache.put(question, question_vector, sources, response.content, time.perf_counter() - start)
     return response.content
 
 def main():
+    print("🤖 Initialisation du système GraphRAG...")
+    # Modèle, index locaux et connexion chargés en arrière-plan pendant la saisie
+    runtime.warm_up(EMBEDDING_MODEL_NAME, LLM_MODEL_NAME)
     print("✅ Système prêt ! Architecture : Vector Search + Graph Traversal.")
     print("   Posez des questions floues ou précises (ex: 'problèmes de comportement', 'hCG').")
     
@@ -0,0 +1,93 @@
+import re
+
+# ==========================================
+# 👇 DÉCOUPAGE PAR TOURS DE PAROLE (CHUNKS) 👇
+# ==========================================
+# Les deux corpus balisent chaque tour de parole par <NN> :
+#   Data/*.txt               : "<03> hotesse+client" puis "     h: ..." / "     c: ..."
+#   medical_dialogues_50/    : "<02> patient : Hi doctor, ..."
+# On regroupe des tours consécutifs en chunks de taille bornée (MiniLM tronque
+# au-delà de ~256 tokens) avec un tour de recouvrement, pour que la fin des longues
+# consultations reste cherchable et que seuls les tours utiles partent au LLM.
+
+MAX_CHUNK_CHARS = 800
+OVERLAP_TURNS = 1
+# À incrémenter si la logique de découpage change : force le re-découpage incrémental
+CHUNKER_VERSION = f"turns-v1-{MAX_CHUNK_CHARS}-{OVERLAP_TURNS}"
+
+TURN_PATTERN = re.compile(r"^<(\d+)>[ \t]*(.*)$", re.M)
+SENTENCE_PATTERN = re.compile(r"(?<=[.!?])\s+")
+
+
+def split_turns(text):
+    """ [{turn, speaker, text}] ; un seul tour si le texte n'est pas balisé """
+    matches = list(TURN_PATTERN.finditer(text))
+    if not matches:
+        return [{"turn": 0, "speaker": "", "text": text.strip()}] if text.strip() else []
+    turns = []
+    for i, m in enumerate(matches):
+        end = matches[i + 1].start() if i + 1 < len(matches) else len(text)
+        header = m.group(2)
+        speaker = header.split(":", 1)[0].strip() if ":" in header else header.strip()
+        turns.append({
+            "turn": int(m.group(1)),
+            "speaker": speaker,
+            "text": text[m.start():end].strip(),
+        })
+    return turns
+
+
+def _split_long(turn, max_chars):
+    """ Coupe un tour trop long sur les fins de phrase """
+    pieces, current = [], ""
+    for sentence in SENTENCE_PATTERN.split(turn["text"]):
+        if current and len(current) + len(sentence) + 1 > max_chars:
+            pieces.append(current)
+            current = ""
+        current = f"{current} {sentence}".strip()
+        while len(current) > max_chars:
+            pieces.append(current[:max_chars])
+            current = current[max_chars:]
+    if current:
+        pieces.append(current)
+    return [dict(turn, text=p) for p in pieces]
+
+
+def chunk_document(text, max_chars=MAX_CHUNK_CHARS, overlap_turns=OVERLAP_TURNS):
+    """ [{index, text, turn_start, turn_end, speakers}] dans l'ordre du dialogue """
+    turns = []
+    for turn in split_turns(text):
+        turns.extend(_split_long(turn, max_chars) if len(turn["text"]) > max_chars else [turn])
+
+    chunks, window = [], []
+
+    def emit():
+        chunks.append({
+            "index": len(chunks),
+            "text": "\n".join(t["text"] for t in window),
+            "turn_start": window[0]["turn"],
+            "turn_end": window[-1]["turn"],
+            "speakers": sorted({t["speaker"] for t in window if t["speaker"]}),
+        })
+
+    for turn in turns:
+        size = sum(len(t["text"]) + 1 for t in window)
+        if window and size + len(turn["text"]) > max_chars:
+            emit()
+            # Recouvrement : on garde les derniers tours s'ils laissent de la place
+            window = window[-overlap_turns:] if overlap_turns else []
+            while window and sum(len(t["text"]) + 1 for t in window) + len(turn["text"]) > max_chars:
+                window.pop(0)
+        window.append(turn)
+    if window:
+        emit()
+    return chunks
+
+
+def chunk_id(filename, index):
+    return f"{filename}#{index}"
+
+
+def chunk_owner(identifier):
+    """ chunk_id -> filename de la consultation """
+    return identifier.rsplit("#", 1)[0]
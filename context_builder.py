@@ -0,0 +1,168 @@
+import re
+import unicodedata
+
+from tracing import span
+
+# ==========================================
+# 👇 CONSTRUCTION DU CONTEXTE SOUS BUDGET DE TOKENS 👇
+# ==========================================
+# Partagé par chat_graphrag.py, chat_graph_tout.py et agent_graph_main.py.
+#   1. les passages récupérés sont classés par score,
+#   2. les phrases déjà vues (recouvrement des chunks, doublons) sont retirées,
+#   3. chaque passage est réduit aux phrases qui contiennent des termes de la
+#      question (+ une phrase de contexte de chaque côté),
+#   4. on remplit le budget de tokens dans l'ordre de pertinence.
+# La taille du prompt (donc la latence et le coût du LLM) devient bornée.
+
+DEFAULT_MAX_TOKENS = 1500
+TOKENIZER_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+SENTENCE_WINDOW = 1
+
+SENTENCE_PATTERN = re.compile(r"(?<=[.!?])\s+|\n+")
+WORD_PATTERN = re.compile(r"\w+", re.U)
+STOPWORDS = {
+    # Français
+    "les", "des", "une", "est", "que", "qui", "quoi", "quel", "quelle", "quels", "quelles",
+    "dans", "pour", "par", "sur", "avec", "sans", "pas", "plus", "son", "ses", "leur", "mon",
+    "mes", "ton", "tes", "aux", "ces", "cet", "cette", "elle", "ils", "nous", "vous", "lui",
+    "selon", "comment", "pourquoi", "combien", "entre", "sont", "ont", "fait", "etre", "avoir",
+    # Anglais
+    "the", "and", "for", "are", "was", "what", "why", "how", "which", "with", "that", "this",
+    "have", "has", "from", "you", "your", "does", "between", "there",
+}
+
+_tokenizer = None
+
+
+def _load_tokenizer():
+    """ Tokenizer local du modèle d'embedding (déjà en cache), sinon approximation """
+    global _tokenizer
+    if _tokenizer is None:
+        try:
+            from transformers import AutoTokenizer
+            _tokenizer = AutoTokenizer.from_pretrained(TOKENIZER_MODEL)
+        except Exception:
+            _tokenizer = False
+    return _tokenizer
+
+
+def count_tokens(text):
+    tokenizer = _load_tokenizer()
+    if tokenizer:
+        return len(tokenizer.encode(text, add_special_tokens=False))
+    # Approximation : ~1.3 token par mot / signe de ponctuation
+    return int(len(re.findall(r"\w+|[^\w\s]", text)) * 1.3) + 1
+
+
+def normalize_term(word):
+    word = unicodedata.normalize("NFKD", word.lower())
+    return "".join(ch for ch in word if not unicodedata.combining(ch))
+
+
+def query_terms(question):
+    return {normalize_term(w) for w in WORD_PATTERN.findall(question)
+            if len(w) > 2 and normalize_term(w) not in STOPWORDS}
+
+
+def split_sentences(text):
+    return [s.strip() for s in SENTENCE_PATTERN.split(text) if s and s.strip()]
+
+
+def select_sentences(sentences, terms, window=SENTENCE_WINDOW):
+    """ Phrases contenant un terme de la question, avec `window` phrases autour """
+    hits = [i for i, s in enumerate(sentences)
+            if terms & {normalize_term(w) for w in WORD_PATTERN.findall(s)}]
+    if not hits:
+        return sentences  # Pertinent sémantiquement mais sans terme commun : on garde l'ordre
+    keep = sorted({j for i in hits for j in range(max(0, i - window), min(len(sentences), i + window + 1))})
+    return [sentences[j] for j in keep]
+
+
+class ContextBuilder:
+    """ Assemble le contexte RAG dans un budget de tokens et mesure l'économie réalisée """
+
+    def __init__(self, max_tokens=DEFAULT_MAX_TOKENS, window=SENTENCE_WINDOW, tokenizer=count_tokens):
+        self.max_tokens = max_tokens
+        self.window = window
+        self.count = tokenizer
+
+    def _passages(self, results):
+        """ (score, doc, texte) pour chaque passage récupéré """
+        for doc in results:
+            if doc.get("passages"):
+                for p in doc["passages"]:
+                    yield p.get("score", doc.get("score", 0.0)), doc, p["text"]
+            else:
+                yield doc.get("score", 0.0), doc, doc.get("content") or ""
+
+    def build(self, question, results):
+        return self.build_with_stats(question, results)[0]
+
+    def build_with_stats(self, question, results):
+        """
+        (contexte, statistiques de cet appel) : rien n'est gardé sur l'instance, partagée
+        entre les threads du service (query_service.py) et du mode batch (agent_batch.py)
+        """
+        with span("context.build", documents=len(results)) as s:
+            context_text, stats = self._build(question, results)
+            s.set(context_tokens=stats["context_tokens"], saved_tokens=stats["saved_tokens"])
+        return context_text, stats
+
+    def _build(self, question, results):
+        terms = query_terms(question)
+        original_tokens = sum(self.count(doc.get("content") or "") for doc in results)
+
+        seen = set()
+        sections = {}  # filename -> phrases retenues (dans l'ordre d'arrivée)
+        order = []
+        used = 0
+        for score, doc, text in sorted(self._passages(results), key=lambda x: -x[0]):
+            filename = doc.get("filename", "inconnu")
+            if filename not in sections:
+                header = self._header(doc)
+                header_tokens = self.count(header)
+                if used + header_tokens > self.max_tokens:
+                    continue
+                sections[filename] = {"header": header, "header_tokens": header_tokens, "sentences": []}
+                order.append(filename)
+                used += header_tokens
+            sentences = [s for s in split_sentences(text) if normalize_term(s) not in seen]
+            for sentence in select_sentences(sentences, terms, self.window):
+                cost = self.count(sentence)
+                if used + cost > self.max_tokens:
+                    break
+                seen.add(normalize_term(sentence))
+                sections[filename]["sentences"].append(sentence)
+                used += cost
+
+        # Un document dont toutes les phrases étaient des doublons n'apporte rien
+        for f in [f for f in order if not sections[f]["sentences"]]:
+            used -= sections[f]["header_tokens"]
+            order.remove(f)
+
+        context_text = "".join(
+            sections[f]["header"] + "\n".join(sections[f]["sentences"]) + "\n" + "-" * 52 + "\n"
+            for f in order
+        )
+        stats = {
+            "original_tokens": original_tokens,
+            "context_tokens": used,
+            "saved_tokens": max(0, original_tokens - used),
+            "budget": self.max_tokens,
+            "documents": len(order),
+        }
+        return context_text, stats
+
+    def _header(self, doc):
+        return (
+            f"\n--- DOCUMENT PERTINENT (Score: {doc.get('score', 0.0):.2f}) ---\n"
+            f"Source: {doc.get('filename', 'inconnu')}\n"
+            f"Symptômes Identifiés (Graph): {', '.join(doc.get('symptomes') or [])}\n"
+            f"Maladies Identifiées (Graph): {', '.join(doc.get('maladies') or [])}\n"
+            f"Contenu du dialogue:\n"
+        )
+
+    def report(self, s):
+        if s:
+            print(f"   ✂️ Contexte : {s['context_tokens']}/{s['budget']} tokens "
+                  f"({s['saved_tokens']} tokens économisés sur {s['original_tokens']}).")
@@ -0,0 +1,247 @@
+import re
+import time
+from collections import OrderedDict
+
+from context_builder import normalize_term
+import ingestion_manifest
+from ingestion_manifest import graph_version
+from tracing import span
+
+# ==========================================
+# 👇 QUESTIONS STATISTIQUES EN CYPHER (AVEC CACHES) 👇
+# ==========================================
+# Remplace le GraphCypherQAChain reconstruit à chaque appel de statistiques_base_donnees :
+#   - chaîne (prompt | LLM) et schéma du graphe construits une seule fois,
+#     puis rafraîchis seulement quand une ingestion a changé le graphe (GraphMeta.version),
+#   - cache LRU : question normalisée -> Cypher généré (+ résultat pour la version courante),
+#   - tout Cypher (généré ou en cache) est exécuté dans une transaction en LECTURE
+#     (le serveur refuse toute écriture, procédures comprises) ; la liste de mots-clés
+#     d'écriture n'est qu'un refus rapide avant l'aller-retour,
+#   - option : pas de second appel LLM pour mettre en forme un résultat purement numérique.
+# Une question de comptage répétée est servie depuis le cache, sans LLM ni requête Neo4j.
+# Fraîcheur : une ingestion du même processus est vue dès la question suivante ;
+# celle d'un autre processus, au plus VERSION_CHECK_SECONDS plus tard (GraphMeta.version).
+
+CACHE_SIZE = 256
+TOP_K = 10               # Lignes transmises au LLM de mise en forme (comme GraphCypherQAChain)
+VERSION_CHECK_SECONDS = 30
+EXCLUDED_TYPES = ["Chunk", "GraphMeta"]  # Hors schéma : textes/embeddings et métadonnées internes
+HIDDEN_PROPERTIES = {"embedding"}        # Jamais montrées au LLM ni gardées dans les résultats
+
+CYPHER_PROMPT = """
+            Generate a Cypher query. Schema: {schema}. Question: {question}.
+            Rules: Use 'toLower(n.name) CONTAINS'. Return ONLY the Cypher query.
+            """
+
+# Pré-contrôle seulement : la garantie vient de la transaction en lecture (READ_ACCESS)
+WRITE_CLAUSES = re.compile(
+    r"\b(CREATE|MERGE|DELETE|DETACH|SET|REMOVE|DROP|FOREACH|LOAD\s+CSV|USING\s+PERIODIC\s+COMMIT"
+    r"|IN\s+TRANSACTIONS)\b"
+    r"|\bCALL\s+(dbms|apoc\.(create|merge|refactor|periodic|nodes\.delete|do\.|cypher\.(run(write|schema|many|files?)|doit))"
+    r"|db\.(create|drop))",
+    re.I,
+)
+READ_ACCESS = "READ"  # neo4j.READ_ACCESS : session en lecture, écritures refusées par le serveur
+STRING_LITERALS = re.compile(r"'(?:[^'\\]|\\.)*'|\"(?:[^\"\\]|\\.)*\"")
+COMMENTS = re.compile(r"//[^\n]*|/\*.*?\*/", re.S)
+PUNCTUATION = re.compile(r"[^\w\s]", re.U)
+
+
+class UnsafeCypherError(ValueError):
+    """ Le Cypher généré écrit dans la base (ou n'est pas une requête de lecture) """
+
+
+def is_access_mode_error(exc):
+    """ Écriture refusée par une transaction en lecture (Neo.ClientError.Statement.AccessMode) """
+    return "AccessMode" in str(getattr(exc, "code", "") or "") or "read access mode" in str(exc).lower()
+
+
+def normalize_question(question):
+    """ Clé de cache : minuscules, sans accents, sans ponctuation, espaces réduits """
+    return " ".join(normalize_term(PUNCTUATION.sub(" ", question)).split())
+
+
+def is_read_only(cypher):
+    stripped = COMMENTS.sub(" ", STRING_LITERALS.sub("''", cypher or ""))
+    if not re.search(r"\b(MATCH|RETURN)\b", stripped, re.I):
+        return False
+    return WRITE_CLAUSES.search(stripped) is None
+
+
+def without_hidden(value):
+    """ Retire les propriétés cachées (vecteurs) des lignes, y compris dans les nœuds renvoyés """
+    if isinstance(value, dict):
+        return {k: without_hidden(v) for k, v in value.items() if k not in HIDDEN_PROPERTIES}
+    if isinstance(value, list):
+        return [without_hidden(v) for v in value]
+    return value
+
+
+def numeric_result(rows):
+    """ (colonne, valeur) si le résultat est un seul nombre, sinon None """
+    if len(rows) == 1 and len(rows[0]) == 1:
+        key, value = next(iter(rows[0].items()))
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            return key, value
+    return None
+
+
+class CypherCache:
+    """ LRU : question normalisée -> {cypher, rows, version} """
+
+    def __init__(self, max_entries=CACHE_SIZE):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return entry
+
+    def put(self, key, entry):
+        self.entries[key] = entry
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def discard(self, key):
+        self.entries.pop(key, None)
+
+    def clear(self):
+        self.entries.clear()
+
+
+class CachedCypherQA:
+    """ Question en langage naturel -> Cypher (LLM, en cache) -> résultat (-> phrase, optionnel) """
+
+    def __init__(self, graph, llm, cypher_prompt=CYPHER_PROMPT, cache_size=CACHE_SIZE, top_k=TOP_K,
+                 phrase_numeric=False, version_check_seconds=VERSION_CHECK_SECONDS):
+        from graph_store import supports_cypher
+        if not supports_cypher(graph):
+            # Refus à la construction (création de l'agent), pas à la première question
+            raise NotImplementedError(
+                "Cypher libre non pris en charge par le graphe embarqué (GRAPH_BACKEND=embedded/replica) : "
+                "utiliser statistiques_entite, ou GRAPH_BACKEND=neo4j.")
+        self.graph = graph
+        self.llm = llm
+        self.cypher_prompt = cypher_prompt
+        self.top_k = top_k
+        self.phrase_numeric = phrase_numeric
+        self.version_check_seconds = version_check_seconds
+        self.cache = CypherCache(cache_size)
+        self.schema = None
+        self.version = None
+        self.version_checked_at = 0.0
+        self.local_bumps = ingestion_manifest.local_bumps  # Ingestions de ce processus déjà vues
+        self._cypher_chain = None
+        self._qa_chain = None
+        self.llm_calls = 0
+
+    # ---------- Construction unique ----------
+    def _chains(self):
+        if self._cypher_chain is None:
+            from langchain_core.prompts import PromptTemplate
+            from langchain_core.output_parsers import StrOutputParser
+            from langchain_community.chains.graph_qa.prompts import CYPHER_QA_PROMPT
+            prompt = PromptTemplate(input_variables=["schema", "question"], template=self.cypher_prompt)
+            self._cypher_chain = prompt | self.llm | StrOutputParser()
+            self._qa_chain = CYPHER_QA_PROMPT | self.llm | StrOutputParser()
+        return self._cypher_chain, self._qa_chain
+
+    def _schema(self):
+        if self.schema is None:
+            with span("neo4j.schema"):
+                from langchain_community.chains.graph_qa.cypher import construct_schema
+                self.graph.refresh_schema()
+                structured = dict(self.graph.get_structured_schema)
+                structured["node_props"] = {
+                    label: [p for p in props if p["property"] not in HIDDEN_PROPERTIES]
+                    for label, props in structured.get("node_props", {}).items()
+                }
+                self.schema = construct_schema(structured, [], EXCLUDED_TYPES)
+        return self.schema
+
+    def check_version(self, force=False):
+        """ Après une ingestion : schéma réintrospecté, résultats en cache périmés (le Cypher est gardé) """
+        now = time.monotonic()
+        # Ingestion faite dans ce processus depuis la dernière question : contrôle immédiat
+        force = force or ingestion_manifest.local_bumps != self.local_bumps
+        if not force and now - self.version_checked_at < self.version_check_seconds:
+            return
+        self.version_checked_at = now
+        self.local_bumps = ingestion_manifest.local_bumps
+        current = graph_version(self.graph)
+        if current != self.version:
+            if self.version is not None or self.cache.entries:
+                print("   🔄 Graphe modifié depuis la dernière question : schéma et résultats rafraîchis.")
+            self.schema = None
+            self.version = current
+
+    # ---------- Requête ----------
+    def _generate(self, question):
+        cypher_chain, _ = self._chains()
+        from langchain_community.chains.graph_qa.cypher import extract_cypher
+        with span("llm.generate_cypher"):
+            self.llm_calls += 1
+            cypher = extract_cypher(cypher_chain.invoke({"question": question, "schema": self._schema()}))
+        if not is_read_only(cypher):
+            raise UnsafeCypherError(f"Cypher refusé (écriture ou requête invalide) : {cypher}")
+        return cypher
+
+    def query(self, question):
+        """ (cypher, lignes) ; le Cypher en cache est revalidé et régénéré s'il échoue """
+        self.check_version()
+        key = normalize_question(question)
+        entry = self.cache.get(key)
+        if entry is not None and entry.get("version") == self.version and entry.get("rows") is not None:
+            return entry["cypher"], entry["rows"]
+        cypher = entry["cypher"] if entry is not None and is_read_only(entry["cypher"]) else None
+        for attempt in range(2):
+            if cypher is None:
+                cypher = self._generate(question)
+            try:
+                with span("neo4j.cypher_query", cached=attempt == 0 and entry is not None):
+                    rows = without_hidden(self._run(cypher)[:self.top_k])
+                break
+            except Exception as e:
+                if is_access_mode_error(e):
+                    self.cache.discard(key)
+                    raise UnsafeCypherError(f"Cypher refusé par la transaction en lecture : {cypher}") from e
+                if entry is None or attempt == 1:
+                    raise
+                # Cypher en cache devenu invalide (schéma changé) : on le régénère une fois
+                self.cache.discard(key)
+                cypher, entry = None, None
+        self.cache.put(key, {"cypher": cypher, "rows": rows, "version": self.version})
+        return cypher, rows
+
+    def _run(self, cypher):
+        """
+        Session en lecture (Neo4jGraph.query, session_params) : une écriture cachée dans une
+        procédure (apoc.cypher.runWrite, apoc.do.*) ou un CALL {...} IN TRANSACTIONS est
+        refusée par le serveur, même si elle a échappé à WRITE_CLAUSES.
+        """
+        return self.graph.query(cypher, params={}, session_params={"default_access_mode": READ_ACCESS})
+
+    def ask(self, question):
+        with span("cypher_qa.ask"):
+            cypher, rows = self.query(question)
+            number = numeric_result(rows)
+            if number is not None and not self.phrase_numeric:
+                return f"Résultat : {number[1]} ({number[0]})"
+            _, qa_chain = self._chains()
+            with span("llm.phrase_answer"):
+                self.llm_calls += 1
+                return qa_chain.invoke({"question": question, "context": rows})
+
+    def report(self):
+        total = self.cache.hits + self.cache.misses
+        rate = self.cache.hits / total * 100 if total else 0.0
+        print(f"   📊 Cache Cypher : {self.cache.hits}/{total} succès ({rate:.0f}%), "
+              f"{len(self.cache.entries)} entrée(s), {self.llm_calls} appel(s) LLM.")
@@ -0,0 +1,147 @@
+import os
+import codecs
+import fnmatch
+import unicodedata
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+# ==========================================
+# 👇 CHARGEUR DE DOCUMENTS UNIFIÉ (FLUX + THREADS) 👇
+# ==========================================
+# Remplace main.read_data et get_files / read_files (ingestion_graphrag.py,
+# chat_graph_tout.py, ingestion_pipeline.py) :
+#   1. find_files : découverte récursive des .txt (dossiers cachés ignorés),
+#   2. decode : encodage détecté sur les octets lus UNE fois (BOM, UTF-8, sinon
+#      cp1252 / latin-1 pour les fichiers de Data/),
+#   3. iter_documents : lectures dans un pool de threads, au plus `prefetch`
+#      fichiers en mémoire, documents rendus un par un dans l'ordre des fichiers,
+#   4. batched : lots de documents pour les étapes en aval (découpage, embeddings,
+#      extraction) ; la lecture du lot suivant avance pendant leur traitement.
+# Texte normalisé : fins de ligne '\n' et Unicode NFC (même empreinte de contenu
+# quel que soit l'éditeur qui a produit le fichier).
+# Nom d'un document : chemin relatif au dossier commun des fichiers, avec '/'
+# ("a.txt" pour un dossier plat, "cardio/a.txt" dans un sous-dossier).
+
+DEFAULT_READ_WORKERS = 8    # Lectures disque : limitées par les I/O, pas par le CPU
+DEFAULT_PREFETCH = 64       # Fichiers lus d'avance au plus (mémoire constante)
+DEFAULT_BATCH = 64          # Documents par lot en aval (<= DEFAULT_PREFETCH : lecture du lot suivant en parallèle)
+DEFAULT_PATTERN = "*.txt"
+
+# Octets non définis en cp1252 : leur présence désigne du latin-1
+CP1252_UNDEFINED = {0x81, 0x8D, 0x8F, 0x90, 0x9D}
+
+
+def find_files(folder_name, pattern=DEFAULT_PATTERN):
+    """
+    Fichiers `pattern` sous `folder_name`, récursivement et triés. Le dossier est
+    cherché à côté des scripts, dans un sous-dossier du même nom, puis depuis le
+    répertoire courant.
+    """
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    paths_to_check = [
+        os.path.join(script_dir, folder_name),
+        os.path.join(script_dir, folder_name, folder_name),
+        folder_name
+    ]
+    for path in paths_to_check:
+        if not os.path.isdir(path):
+            continue
+        files = []
+        for root, dirs, names in os.walk(path):
+            dirs[:] = sorted(d for d in dirs if not d.startswith("."))
+            files.extend(os.path.join(root, n) for n in sorted(names) if fnmatch.fnmatch(n, pattern))
+        if files:
+            return files
+    return []
+
+
+def decode(raw):
+    """ octets -> (texte, encodage) ; le fichier n'est lu qu'une fois """
+    if raw.startswith(codecs.BOM_UTF8):
+        return raw[len(codecs.BOM_UTF8):].decode("utf-8"), "utf-8-sig"
+    if raw.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)):
+        return raw.decode("utf-16"), "utf-16"
+    if raw.isascii():
+        return raw.decode("ascii"), "ascii"
+    try:
+        return raw.decode("utf-8"), "utf-8"
+    except UnicodeDecodeError:
+        pass
+    if CP1252_UNDEFINED.isdisjoint(raw):
+        return raw.decode("cp1252"), "cp1252"
+    return raw.decode("latin-1"), "latin-1"
+
+
+def normalize_text(text):
+    return unicodedata.normalize("NFC", text.replace("\r\n", "\n").replace("\r", "\n"))
+
+
+def common_root(files):
+    """ Dossier commun des fichiers : les noms de documents lui sont relatifs """
+    folders = [os.path.dirname(os.path.abspath(path)) for path in files]
+    return os.path.commonpath(folders) if folders else None
+
+
+def document_name(path, root=None):
+    if root is None:
+        return os.path.basename(path)
+    return os.path.relpath(os.path.abspath(path), root).replace(os.sep, "/")
+
+
+def read_document(path, root=None):
+    """ {filename, path, text, encoding} ; None si le fichier est illisible ou vide """
+    try:
+        with open(path, "rb") as f:
+            raw = f.read()
+    except OSError as e:
+        print(f"⚠️ Impossible de lire {path} : {e}")
+        return None
+    text, encoding = decode(raw)
+    text = normalize_text(text)
+    if not text.strip():
+        print(f"⚠️ Fichier vide ignoré : {path}")
+        return None
+    return {"filename": document_name(path, root), "path": path, "text": text, "encoding": encoding}
+
+
+def iter_documents(files, workers=DEFAULT_READ_WORKERS, prefetch=DEFAULT_PREFETCH, root=None):
+    """
+    Générateur : documents lus en parallèle, rendus dans l'ordre de `files`.
+    Les lectures suivantes avancent pendant que l'appelant traite le document courant.
+    `root` : dossier auquel les noms sont relatifs (par défaut common_root(files)).
+    Deux fichiers du même nom lèvent ValueError (jamais un document ignoré en silence).
+    """
+    files = list(files)
+    root = common_root(files) if root is None else os.path.abspath(root)
+    paths = iter(files)
+    seen = {}
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="reader") as executor:
+        pending = deque()
+        for path in paths:
+            pending.append(executor.submit(read_document, path, root))
+            if len(pending) >= prefetch:
+                break
+        while pending:
+            document = pending.popleft().result()
+            path = next(paths, None)
+            if path is not None:
+                pending.append(executor.submit(read_document, path, root))
+            if document is None:
+                continue
+            if document["filename"] in seen:
+                raise ValueError(f"Document en double '{document['filename']}' : "
+                                 f"{seen[document['filename']]} et {document['path']}")
+            seen[document["filename"]] = document["path"]
+            yield document
+
+
+def batched(items, size=DEFAULT_BATCH):
+    """ Générateur : listes d'au plus `size` éléments, sans tout matérialiser """
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
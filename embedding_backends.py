@@ -0,0 +1,160 @@
+import os
+import re
+import time
+
+import numpy as np
+
+from embedding_engine import make_batches, DEFAULT_BATCH_SIZE
+
+# ==========================================
+# 👇 BACKENDS D'INFÉRENCE POUR LE MODÈLE D'EMBEDDING (CPU) 👇
+# ==========================================
+# Même modèle sentence-transformers, trois moteurs interchangeables :
+#   - "torch"     : HuggingFaceEmbeddings (référence),
+#   - "onnx"      : export ONNX du même modèle, exécuté par onnxruntime,
+#   - "onnx-int8" : le même export, poids quantifiés en int8 (quantize_dynamic).
+# Les backends ONNX trient les textes par longueur, découpent en lots et ne
+# complètent (padding) chaque lot que jusqu'au texte le plus long du lot. Pooling
+# moyen sur le masque d'attention puis normalisation L2 (comparaison cosinus partout).
+# Interface LangChain (embed_documents / embed_query) : utilisable par runtime.py,
+# EmbeddingEngine et main.py sans autre changement. Choix du backend : variable
+# d'environnement EMBEDDING_BACKEND (torch par défaut).
+# Export (une fois, dans .cache/onnx/<modèle>/) : transformers + torch + onnxruntime.
+
+BACKENDS = ("torch", "onnx", "onnx-int8")
+DEFAULT_BACKEND = os.environ.get("EMBEDDING_BACKEND", "torch")
+ONNX_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "onnx")
+DEFAULT_THREADS = int(os.environ.get("EMBEDDING_THREADS", os.cpu_count() or 1))
+OPSET = 14
+# Longueur maximale de séquence de chaque modèle (sentence_bert_config.json)
+MAX_SEQ_LENGTH = {
+    "all-MiniLM-L6-v2": 256,
+    "paraphrase-multilingual-MiniLM-L12-v2": 128,
+}
+DEFAULT_MAX_SEQ_LENGTH = 256
+
+
+def hub_name(model_name):
+    """ 'all-MiniLM-L6-v2' -> 'sentence-transformers/all-MiniLM-L6-v2' """
+    return model_name if "/" in model_name else f"sentence-transformers/{model_name}"
+
+
+def model_dir(model_name, root=ONNX_DIR):
+    return os.path.join(root, re.sub(r"[^A-Za-z0-9_.-]+", "_", model_name))
+
+
+def export_onnx(model_name, root=ONNX_DIR):
+    """ Exporte le transformer (sans pooling) en ONNX, axes batch / séquence dynamiques """
+    import torch
+    from transformers import AutoTokenizer, AutoModel
+
+    target = model_dir(model_name, root)
+    path = os.path.join(target, "model.onnx")
+    if os.path.exists(path):
+        return path
+    os.makedirs(target, exist_ok=True)
+    start = time.perf_counter()
+    tokenizer = AutoTokenizer.from_pretrained(hub_name(model_name))
+    model = AutoModel.from_pretrained(hub_name(model_name)).eval()
+    sample = tokenizer(["export onnx"], return_tensors="pt")
+    names = [n for n in ("input_ids", "attention_mask", "token_type_ids") if n in sample]
+    axes = {n: {0: "batch", 1: "sequence"} for n in names + ["last_hidden_state"]}
+    with torch.no_grad():
+        torch.onnx.export(model, tuple(sample[n] for n in names), path + ".tmp", input_names=names,
+                          output_names=["last_hidden_state"], dynamic_axes=axes, opset_version=OPSET)
+    os.replace(path + ".tmp", path)
+    tokenizer.save_pretrained(target)
+    print(f"✅ Modèle {model_name} exporté en ONNX en {time.perf_counter() - start:.1f}s ({path}).")
+    return path
+
+
+def quantize_onnx(model_name, root=ONNX_DIR):
+    """ Poids int8 (quantification dynamique : activations quantifiées à l'exécution) """
+    from onnxruntime.quantization import quantize_dynamic, QuantType
+
+    source = export_onnx(model_name, root)
+    path = os.path.join(model_dir(model_name, root), "model.int8.onnx")
+    if not os.path.exists(path):
+        quantize_dynamic(source, path + ".tmp", weight_type=QuantType.QInt8)
+        os.replace(path + ".tmp", path)
+        print(f"✅ Modèle {model_name} quantifié en int8 "
+              f"({os.path.getsize(source) / 1e6:.0f} Mo -> {os.path.getsize(path) / 1e6:.0f} Mo).")
+    return path
+
+
+class OnnxEmbeddings:
+    """ Même interface que HuggingFaceEmbeddings, exécuté par onnxruntime """
+
+    def __init__(self, model_name, quantized=False, threads=DEFAULT_THREADS, batch_size=DEFAULT_BATCH_SIZE,
+                 max_length=None, root=ONNX_DIR):
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+
+        self.model_name = model_name
+        self.backend = "onnx-int8" if quantized else "onnx"
+        self.batch_size = batch_size
+        self.max_length = max_length or MAX_SEQ_LENGTH.get(model_name.split("/")[-1], DEFAULT_MAX_SEQ_LENGTH)
+        path = quantize_onnx(model_name, root) if quantized else export_onnx(model_name, root)
+        self.tokenizer = AutoTokenizer.from_pretrained(model_dir(model_name, root))
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = threads
+        options.inter_op_num_threads = 1
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+        self.input_names = [i.name for i in self.session.get_inputs()]
+
+    def _embed_batch(self, texts):
+        encoded = self.tokenizer(texts, padding=True, truncation=True, max_length=self.max_length,
+                                 return_tensors="np")
+        feed = {name: encoded[name].astype(np.int64) for name in self.input_names}
+        hidden = self.session.run(None, feed)[0]
+        mask = encoded["attention_mask"][..., None].astype(np.float32)
+        pooled = (hidden * mask).sum(axis=1) / np.maximum(mask.sum(axis=1), 1e-9)
+        norms = np.linalg.norm(pooled, axis=1, keepdims=True)
+        return pooled / np.maximum(norms, 1e-12)
+
+    def embed_documents(self, texts):
+        texts = [str(t).replace("\n", " ") for t in texts]
+        if not texts:
+            return []
+        vectors = [None] * len(texts)
+        # Lots de longueurs voisines : padding dynamique limité au plus long du lot
+        for idx in make_batches(texts, self.batch_size):
+            for i, vector in zip(idx, self._embed_batch([texts[i] for i in idx])):
+                vectors[i] = vector.tolist()
+        return vectors
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+
+def load_embeddings(model_name, backend=None, threads=DEFAULT_THREADS):
+    """ Modèle d'embedding pour `backend` (EMBEDDING_BACKEND par défaut) """
+    backend = backend or DEFAULT_BACKEND
+    if backend not in BACKENDS:
+        raise ValueError(f"Backend d'embedding inconnu : {backend} (attendu : {', '.join(BACKENDS)})")
+    if backend == "torch":
+        try:
+            import torch
+            torch.set_num_threads(threads)
+        except ImportError:
+            pass
+        from langchain_huggingface import HuggingFaceEmbeddings
+        return HuggingFaceEmbeddings(model_name=model_name)
+    return OnnxEmbeddings(model_name, quantized=backend == "onnx-int8", threads=threads)
+
+
+def cache_namespace(model_name, backend=None):
+    """ Vecteurs int8 / ONNX légèrement différents de la référence : cache séparé """
+    backend = backend or DEFAULT_BACKEND
+    return model_name if backend == "torch" else f"{model_name}@{backend}"
+
+
+def cosine_agreement(reference, candidate, texts):
+    """ Cosinus entre les vecteurs des deux modèles, texte par texte : {mean, min} """
+    a = np.asarray(reference.embed_documents(texts), dtype=np.float32)
+    b = np.asarray(candidate.embed_documents(texts), dtype=np.float32)
+    a /= np.maximum(np.linalg.norm(a, axis=1, keepdims=True), 1e-12)
+    b /= np.maximum(np.linalg.norm(b, axis=1, keepdims=True), 1e-12)
+    cosines = (a * b).sum(axis=1)
+    return {"mean": float(cosines.mean()), "min": float(cosines.min())}
@@ -0,0 +1,316 @@
+import os
+import re
+import json
+import time
+import shutil
+import sqlite3
+import hashlib
+import threading
+import unicodedata
+from collections import OrderedDict
+
+import numpy as np
+
+# ==========================================
+# 👇 CACHE D'EMBEDDINGS ADRESSÉ PAR LE CONTENU 👇
+# ==========================================
+# Clé : (nom du modèle, empreinte du texte normalisé). Deux niveaux :
+#   - questions : LRU en mémoire (graph_rag_search, recherche_cas_similaires, service),
+#   - documents / chunks : sur disque, un dossier par modèle,
+#       vectors.f32  : matrice float32 (capacité, dim) ouverte en memory-map,
+#       index.sqlite : clé -> ligne + dernier accès (éviction des moins récemment lus).
+# Un vecteur n'est jamais servi à un autre modèle : la clé contient le nom du modèle
+# et un dossier dont meta.json ne correspond plus (modèle, dimension) est vidé.
+# CachedEmbeddings enveloppe un modèle LangChain (embed_query / embed_documents) ;
+# EmbeddingEngine consulte le niveau disque avant de lancer ses workers.
+
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "embeddings")
+QUERY_CACHE_SIZE = 4096
+DEFAULT_MAX_VECTORS = 500000    # ~730 Mo en 384 dimensions
+INITIAL_CAPACITY = 1024
+SQL_BATCH = 500                 # Clés par requête IN (...) (limite de variables SQLite)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS vectors (
+    key         TEXT PRIMARY KEY,
+    row         INTEGER NOT NULL,
+    accessed_at REAL NOT NULL
+)
+"""
+
+
+def normalize_text(text):
+    """ Unicode NFC, espaces réduits : deux copies du même texte partagent leur vecteur """
+    return " ".join(unicodedata.normalize("NFC", str(text)).split())
+
+
+def embedding_key(model_name, text):
+    return hashlib.sha256(f"{model_name}\0{normalize_text(text)}".encode("utf-8")).hexdigest()
+
+
+def model_slug(model_name):
+    return re.sub(r"[^A-Za-z0-9_.-]+", "_", model_name)
+
+
+class QueryEmbeddingCache:
+    """ LRU en mémoire : clé -> vecteur (liste de floats) """
+
+    def __init__(self, max_entries=QUERY_CACHE_SIZE):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evicted = 0
+
+    def get(self, key):
+        with self.lock:
+            vector = self.entries.get(key)
+            if vector is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return vector
+
+    def put(self, key, vector):
+        with self.lock:
+            self.entries[key] = vector
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.evicted += 1
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+class DiskEmbeddingCache:
+    """ Vecteurs de documents sur disque (memmap), éviction LRU au-delà de max_vectors """
+
+    def __init__(self, model_name, path=CACHE_DIR, max_vectors=DEFAULT_MAX_VECTORS):
+        self.model_name = model_name
+        self.path = os.path.join(path, model_slug(model_name))
+        self.max_vectors = max_vectors
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evicted = 0
+        self.invalidated = False
+        os.makedirs(self.path, exist_ok=True)
+        self.meta = self._read_meta()
+        if self.meta.get("model") not in (None, model_name):
+            self._wipe()  # Même dossier, autre modèle : rien n'est réutilisable
+        self.conn = sqlite3.connect(os.path.join(self.path, "index.sqlite"), check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(SCHEMA)
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_accessed ON vectors (accessed_at)")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS free_rows (row INTEGER PRIMARY KEY)")
+        self.conn.commit()
+        self.matrix = None
+        if self.meta.get("dim"):
+            self._open(self.meta["dim"], self.meta["capacity"])
+
+    # ---------- Stockage ----------
+    def _read_meta(self):
+        meta_path = os.path.join(self.path, "meta.json")
+        if not os.path.exists(meta_path):
+            return {}
+        with open(meta_path, encoding="utf-8") as f:
+            return json.load(f)
+
+    def _write_meta(self):
+        meta_path = os.path.join(self.path, "meta.json")
+        with open(meta_path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(self.meta, f)
+        os.replace(meta_path + ".tmp", meta_path)
+
+    def _wipe(self):
+        print(f"   🔄 Cache d'embeddings invalidé ({self.meta.get('model')} -> {self.model_name}).")
+        shutil.rmtree(self.path, ignore_errors=True)
+        os.makedirs(self.path, exist_ok=True)
+        self.meta = {}
+        self.invalidated = True
+
+    def _open(self, dim, capacity):
+        """ (Ré)ouvre la matrice memmap, agrandie au besoin (le fichier est étendu, pas recopié) """
+        vectors_path = os.path.join(self.path, "vectors.f32")
+        with open(vectors_path, "ab") as f:
+            if f.tell() < capacity * dim * 4:
+                f.truncate(capacity * dim * 4)
+        self.matrix = np.memmap(vectors_path, dtype=np.float32, mode="r+", shape=(capacity, dim))
+        self.meta.update(model=self.model_name, dim=dim, capacity=capacity)
+        self._write_meta()
+
+    def _allocate(self, count, dim):
+        """ Lignes libres (évincées) d'abord, puis fin de la matrice """
+        if self.matrix is None:
+            self.meta["size"] = 0
+            self._open(dim, max(INITIAL_CAPACITY, count))
+        elif dim != self.matrix.shape[1]:
+            raise ValueError(f"Dimension {dim} != {self.matrix.shape[1]} pour le modèle {self.model_name}")
+        rows = [r for (r,) in self.conn.execute("SELECT row FROM free_rows LIMIT ?", (count,))]
+        self.conn.executemany("DELETE FROM free_rows WHERE row=?", [(r,) for r in rows])
+        size = self.meta.get("size", 0)
+        needed = count - len(rows)
+        if size + needed > self.matrix.shape[0]:
+            self.matrix.flush()
+            self._open(dim, max(2 * self.matrix.shape[0], size + needed))
+        rows.extend(range(size, size + needed))
+        self.meta["size"] = size + needed
+        return rows
+
+    # ---------- Accès ----------
+    def get_many(self, keys):
+        """ {clé: vecteur} pour les clés présentes """
+        found = {}
+        with self.lock:
+            if self.matrix is not None:
+                now = time.time()
+                for start in range(0, len(keys), SQL_BATCH):
+                    batch = keys[start:start + SQL_BATCH]
+                    marks = ",".join("?" * len(batch))
+                    rows = self.conn.execute(f"SELECT key, row FROM vectors WHERE key IN ({marks})", batch).fetchall()
+                    for key, row in rows:
+                        found[key] = self.matrix[row].tolist()
+                    self.conn.executemany("UPDATE vectors SET accessed_at=? WHERE key=?",
+                                          [(now, key) for key, _ in rows])
+                self.conn.commit()
+            self.hits += len(found)
+            self.misses += len(set(keys)) - len(found)
+        return found
+
+    def put_many(self, items):
+        """ items : {clé: vecteur} """
+        with self.lock:
+            known = set()
+            keys = list(items)
+            for start in range(0, len(keys), SQL_BATCH):
+                batch = keys[start:start + SQL_BATCH]
+                marks = ",".join("?" * len(batch))
+                known.update(k for (k,) in self.conn.execute(f"SELECT key FROM vectors WHERE key IN ({marks})", batch))
+            new = [k for k in keys if k not in known]
+            if not new:
+                return
+            vectors = np.asarray([items[k] for k in new], dtype=np.float32)
+            rows = self._allocate(len(new), vectors.shape[1])
+            self.matrix[rows] = vectors
+            self.matrix.flush()
+            now = time.time()
+            self.conn.executemany("INSERT INTO vectors (key, row, accessed_at) VALUES (?, ?, ?)",
+                                  [(k, r, now) for k, r in zip(new, rows)])
+            self._write_meta()
+            self.conn.commit()
+            self._evict()
+
+    def _evict(self):
+        count = self.conn.execute("SELECT COUNT(*) FROM vectors").fetchone()[0]
+        excess = count - self.max_vectors
+        if excess <= 0:
+            return
+        victims = self.conn.execute("SELECT key, row FROM vectors ORDER BY accessed_at ASC LIMIT ?",
+                                    (excess,)).fetchall()
+        self.conn.executemany("DELETE FROM vectors WHERE key=?", [(k,) for k, _ in victims])
+        self.conn.executemany("INSERT OR IGNORE INTO free_rows (row) VALUES (?)", [(r,) for _, r in victims])
+        self.conn.commit()
+        self.evicted += len(victims)
+
+    def __len__(self):
+        with self.lock:
+            return self.conn.execute("SELECT COUNT(*) FROM vectors").fetchone()[0]
+
+    def close(self):
+        with self.lock:
+            if self.matrix is not None:
+                self.matrix.flush()
+            self.conn.close()
+
+
+class EmbeddingCache:
+    """ Les deux niveaux pour un modèle, avec leurs métriques """
+
+    def __init__(self, model_name, path=CACHE_DIR, query_cache_size=QUERY_CACHE_SIZE,
+                 max_vectors=DEFAULT_MAX_VECTORS):
+        self.model_name = model_name
+        self.queries = QueryEmbeddingCache(query_cache_size)
+        self.documents = DiskEmbeddingCache(model_name, path, max_vectors)
+
+    def key(self, text):
+        return embedding_key(self.model_name, text)
+
+    def embed_documents(self, texts, compute):
+        """ Vecteurs de `texts` (dans l'ordre) ; seuls les absents du cache passent par compute(textes) """
+        texts = list(texts)
+        keys = [self.key(t) for t in texts]
+        found = self.documents.get_many(list(dict.fromkeys(keys)))
+        missing = list(dict.fromkeys(k for k in keys if k not in found))
+        if missing:
+            first = {}
+            for k, t in zip(keys, texts):
+                first.setdefault(k, t)
+            computed = dict(zip(missing, compute([first[k] for k in missing])))
+            self.documents.put_many(computed)
+            found.update(computed)
+        return [found[k] for k in keys]
+
+    def embed_query(self, text, compute):
+        key = self.key(text)
+        vector = self.queries.get(key)
+        if vector is None:
+            vector = compute(text)
+            self.queries.put(key, vector)
+        return vector
+
+    def embed_queries(self, texts, compute_many):
+        """ Plusieurs questions (micro-batcher du service) : un seul appel pour les absentes """
+        keys = [self.key(t) for t in texts]
+        vectors = [self.queries.get(k) for k in keys]
+        missing = [i for i, v in enumerate(vectors) if v is None]
+        if missing:
+            for i, vector in zip(missing, compute_many([texts[i] for i in missing])):
+                vectors[i] = vector
+                self.queries.put(keys[i], vector)
+        return vectors
+
+    def stats(self):
+        q, d = self.queries, self.documents
+        q_lookups, d_lookups = q.hits + q.misses, d.hits + d.misses
+        return {
+            "model": self.model_name,
+            "query_hits": q.hits, "query_misses": q.misses,
+            "query_hit_rate": q.hits / q_lookups if q_lookups else 0.0,
+            "query_entries": len(q.entries), "query_evicted": q.evicted,
+            "document_hits": d.hits, "document_misses": d.misses,
+            "document_hit_rate": d.hits / d_lookups if d_lookups else 0.0,
+            "document_entries": len(d), "document_evicted": d.evicted,
+        }
+
+    def report(self):
+        s = self.stats()
+        print(f"   📊 Cache d'embeddings ({s['model']}) : questions {s['query_hits']}/"
+              f"{s['query_hits'] + s['query_misses']} ({s['query_hit_rate']:.0%}), documents "
+              f"{s['document_hits']}/{s['document_hits'] + s['document_misses']} "
+              f"({s['document_hit_rate']:.0%}, {s['document_entries']} vecteurs)")
+
+    def close(self):
+        self.documents.close()
+
+
+class CachedEmbeddings:
+    """ Même interface que HuggingFaceEmbeddings (embed_query / embed_documents), avec cache """
+
+    def __init__(self, embeddings, model_name, cache=None):
+        self.embeddings = embeddings
+        self.model_name = model_name
+        self.backend = getattr(embeddings, "backend", "torch")
+        self.cache = cache if cache is not None else EmbeddingCache(model_name)
+
+    def embed_query(self, text):
+        return self.cache.embed_query(text, self.embeddings.embed_query)
+
+    def embed_documents(self, texts):
+        return self.cache.embed_documents(texts, self.embeddings.embed_documents)
+
+    def embed_queries(self, texts):
+        return self.cache.embed_queries(list(texts), self.embeddings.embed_documents)
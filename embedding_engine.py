@@ -0,0 +1,125 @@
+import os
+import time
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+from tracing import traced
+from embedding_cache import CachedEmbeddings
+
+# ==========================================
+# 👇 MOTEUR D'EMBEDDING PAR LOTS (MULTI-CŒURS) 👇
+# ==========================================
+# Remplace les appels embed_query(content) fichier par fichier :
+#   1. les textes sont triés par longueur (moins de padding dans chaque lot),
+#   2. découpés en lots de taille fixe,
+#   3. envoyés à embed_documents dans un pool de processus CPU,
+#   4. les vecteurs sont remis dans l'ordre d'entrée.
+# Le pool est gardé d'un appel à l'autre (ingestion par lots : modèle chargé une
+# seule fois par worker) ; close() l'arrête.
+# Avec un cache (embedding_cache.py), seuls les textes jamais vus par ce modèle
+# sont envoyés aux workers. Chaque worker charge le même backend d'inférence que
+# le modèle fourni (torch, onnx, onnx-int8 : embedding_backends.py).
+
+DEFAULT_MODEL_NAME = "all-MiniLM-L6-v2"
+DEFAULT_BATCH_SIZE = 32
+DEFAULT_WORKERS = max(1, (os.cpu_count() or 2) // 2)
+
+# Modèle chargé une seule fois par processus worker
+_worker_model = None
+
+
+def _init_worker(model_name, threads, backend):
+    """ Charge le modèle d'embedding dans le processus worker """
+    global _worker_model
+    from embedding_backends import load_embeddings
+    _worker_model = load_embeddings(model_name, backend, threads=threads)
+
+
+def _embed_batch(texts):
+    return _worker_model.embed_documents(texts)
+
+
+def make_batches(texts, batch_size=DEFAULT_BATCH_SIZE):
+    """ Regroupe les indices des textes en lots triés par longueur """
+    order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+    return [order[i:i + batch_size] for i in range(0, len(order), batch_size)]
+
+
+class EmbeddingEngine:
+    """ Calcule les embeddings d'un flux de documents par lots, sur plusieurs cœurs """
+
+    def __init__(self, model_name=DEFAULT_MODEL_NAME, workers=DEFAULT_WORKERS,
+                 batch_size=DEFAULT_BATCH_SIZE, embedding_model=None, cache=None, backend=None):
+        self.model_name = model_name
+        self.workers = workers
+        self.batch_size = batch_size
+        # Modèle enveloppé par runtime.get_embeddings : son cache sert aussi aux workers
+        if cache is None and isinstance(embedding_model, CachedEmbeddings):
+            cache, embedding_model = embedding_model.cache, embedding_model.embeddings
+        # Modèle déjà chargé dans le processus courant (utilisé si workers == 1)
+        self.embedding_model = embedding_model
+        self.cache = cache
+        if backend is None:
+            from embedding_backends import DEFAULT_BACKEND
+            backend = getattr(embedding_model, "backend", "torch") if embedding_model is not None else DEFAULT_BACKEND
+        self.backend = backend
+        self.last_seconds = 0.0
+        self.last_computed = 0
+        self.pool = None
+
+    @traced("embedding.documents")
+    def embed_documents(self, texts):
+        """ Retourne les vecteurs dans le même ordre que `texts` """
+        texts = list(texts)
+        if not texts:
+            return []
+        start = time.perf_counter()
+        self.last_computed = 0
+        if self.cache is not None:
+            vectors = self.cache.embed_documents(texts, self._compute)
+        else:
+            vectors = self._compute(texts)
+        self.last_seconds = time.perf_counter() - start
+        return vectors
+
+    def _compute(self, texts):
+        self.last_computed += len(texts)
+        batches = make_batches(texts, self.batch_size)
+        vectors = [None] * len(texts)
+
+        if self.workers <= 1:
+            model = self._local_model()
+            for idx in batches:
+                for i, vec in zip(idx, model.embed_documents([texts[i] for i in idx])):
+                    vectors[i] = vec
+        else:
+            results = self._pool().map(_embed_batch, [[texts[i] for i in idx] for idx in batches])
+            for idx, batch_vectors in zip(batches, results):
+                for i, vec in zip(idx, batch_vectors):
+                    vectors[i] = vec
+        return vectors
+
+    def _pool(self):
+        if self.pool is None:
+            threads = max(1, (os.cpu_count() or 1) // self.workers)
+            self.pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"),
+                                            initializer=_init_worker,
+                                            initargs=(self.model_name, threads, self.backend))
+        return self.pool
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown()
+            self.pool = None
+
+    def _local_model(self):
+        if self.embedding_model is None:
+            from embedding_backends import load_embeddings
+            self.embedding_model = load_embeddings(self.model_name, self.backend)
+        return self.embedding_model
+
+    def report(self, count):
+        rate = count / self.last_seconds if self.last_seconds else 0.0
+        cached = f", {count - self.last_computed} depuis le cache" if self.cache is not None else ""
+        print(f"   📊 Embeddings : {count} documents en {self.last_seconds:.2f}s "
+              f"({rate:.1f} docs/s, {self.workers} worker(s), lots de {self.batch_size}{cached})")
@@ -0,0 +1,368 @@
+import re
+import argparse
+
+import numpy as np
+
+from context_builder import normalize_term
+from tracing import span
+
+# ==========================================
+# 👇 CANONICALISATION DES ENTITÉS (SYMPTÔMES / MALADIES) 👇
+# ==========================================
+# Le LLM renvoie "maux de tête", "mal de tête", "céphalées"... : sans normalisation,
+# chaque variante devient un nœud distinct (graphe fragmenté, statistiques fausses).
+# Chaque nom extrait est rattaché à une entité existante du même type, dans l'ordre :
+#   1. clé normalisée (minuscules, sans accents, sans article en tête, pluriels
+#      ramenés au singulier) ou alias déjà connu,
+#   2. faute de frappe : une seule édition d'écart, dans un seul mot alphabétique
+#      de 5+ lettres,
+#   3. plus proche voisin par embedding du nom (cosinus >= EMBEDDING_THRESHOLD).
+# Chiffres et lettres isolées ("diabète de type 1" / "type 2", "hépatite B" / "C")
+# et préfixes de sens opposé ne sont jamais rapprochés par les étapes 2 et 3 : une
+# fusion écrite par MERGE ne se défait pas.
+# Sinon, le nom devient une nouvelle entité canonique. Les clés des variantes sont
+# gardées dans e.aliases (table d'alias lue aussi par graph_stats.EntityStats).
+#
+# Fusion des doublons d'un graphe déjà peuplé : python entity_canonicalizer.py --merge
+
+EMBEDDING_THRESHOLD = 0.92
+MIN_FUZZY_LENGTH = 5
+LABELS = ("Symptome", "Maladie")
+# Retirés en tête du nom seulement ("la fièvre" -> "fievre", mais "hépatite a" garde son "a")
+ARTICLES = {"le", "la", "les", "l", "un", "une", "des", "du", "de", "d", "au", "aux"}
+# Préfixes de sens opposé : jamais fusionnés par la similarité (hyper-/hypo-tension...)
+OPPOSITE_PREFIXES = [("hyper", "hypo"), ("tachy", "brady")]
+
+# Synonymes médicaux courants (clé normalisée -> nom canonique)
+SEED_ALIASES = {
+    "Symptome": {
+        "cephalee": "mal de tête",
+        "pyrexie": "fièvre",
+        "dyspnee": "essoufflement",
+        "asthenie": "fatigue",
+    },
+    "Maladie": {},
+}
+
+# Alias enregistrés sur le nœud canonique (union sans doublons)
+SAVE_ALIASES_QUERIES = {
+    label: f"""
+UNWIND $rows AS row
+MATCH (e:{label} {{name: row.name}})
+SET e.aliases = reduce(a = coalesce(e.aliases, []), x IN row.aliases | CASE WHEN x IN a THEN a ELSE a + x END)
+"""
+    for label in LABELS
+}
+
+# Déplace les mentions d'un doublon vers l'entité canonique, puis supprime le doublon.
+# Le nom canonique peut venir de SEED_ALIASES sans nœud dans le graphe : il est créé (MERGE).
+MERGE_DUPLICATES_QUERIES = {
+    label: f"""
+UNWIND $rows AS row
+MATCH (d:{label} {{name: row.duplicate}})
+MERGE (c:{label} {{name: row.canonical}})
+CALL {{
+    WITH c, d
+    MATCH (k:Consultation)-[:{rel}]->(d)
+    MERGE (k)-[:{rel}]->(c)
+}}
+SET c.aliases = reduce(a = coalesce(c.aliases, []), x IN row.aliases + coalesce(d.aliases, [])
+                       | CASE WHEN x IN a THEN a ELSE a + x END)
+DETACH DELETE d
+RETURN collect(DISTINCT elementId(c)) AS ids, count(*) AS merged
+"""
+    for label, rel in (("Symptome", "MENTIONNE_SYMPTOME"), ("Maladie", "MENTIONNE_MALADIE"))
+}
+
+WORD_PATTERN = re.compile(r"[a-z0-9]+")
+
+
+def singular(word):
+    """ Pluriels français courants -> singulier (maux -> mal, yeux -> oeil, douleurs -> douleur) """
+    if word == "yeux":
+        return "oeil"
+    if len(word) > 4 and word.endswith("eaux"):
+        return word[:-1]
+    if len(word) > 3 and word.endswith("aux"):
+        return word[:-3] + "al"
+    if len(word) > 3 and word[-1] in "sx":
+        return word[:-1]
+    return word
+
+
+def canonical_key(name):
+    """ Clé de comparaison : 'Les Maux de Tête' et 'mal de tête' -> 'mal de tete' """
+    words = WORD_PATTERN.findall(normalize_term(name).replace("œ", "oe"))
+    start = 0
+    while start < len(words) - 1 and words[start] in ARTICLES:
+        start += 1
+    return " ".join(singular(w) for w in words[start:]) or normalize_term(name).strip()
+
+
+def within_one_edit(a, b):
+    """ Distance d'édition <= 1 (substitution, insertion ou suppression d'un caractère) """
+    if abs(len(a) - len(b)) > 1:
+        return False
+    if len(a) > len(b):
+        a, b = b, a
+    i = 0
+    while i < len(a) and a[i] == b[i]:
+        i += 1
+    if len(a) == len(b):
+        return a[i + 1:] == b[i + 1:]
+    return a[i:] == b[i + 1:]
+
+
+def opposite(a, b):
+    return any((a.startswith(p) and b.startswith(q)) or (a.startswith(q) and b.startswith(p))
+               for p, q in OPPOSITE_PREFIXES)
+
+
+def markers(key):
+    """ Chiffres et lettres isolées d'une clé : 'diabete de type 2' -> {'2'}, 'hepatite b' -> {'b'} """
+    return {w for w in key.split() if any(c.isdigit() for c in w) or (len(w) == 1 and w not in ARTICLES)}
+
+
+def incompatible(a, b):
+    """ Clés jamais rapprochées par faute de frappe ou embedding (types, souches, sens opposé) """
+    return opposite(a, b) or markers(a) != markers(b)
+
+
+def fuzzy_equal(a, b):
+    """ Une faute de frappe, dans un seul mot alphabétique de MIN_FUZZY_LENGTH lettres ou plus """
+    words_a, words_b = a.split(), b.split()
+    if len(words_a) != len(words_b):
+        return False
+    different = [(x, y) for x, y in zip(words_a, words_b) if x != y]
+    if len(different) != 1:
+        return False
+    x, y = different[0]
+    return (x.isalpha() and y.isalpha() and min(len(x), len(y)) >= MIN_FUZZY_LENGTH
+            and within_one_edit(x, y) and not incompatible(a, b))
+
+
+class EntityCanonicalizer:
+    """ Vocabulaire des entités par type : clé normalisée / alias -> nom canonique """
+
+    def __init__(self, embed=None, embedding_threshold=EMBEDDING_THRESHOLD, seed_aliases=SEED_ALIASES):
+        self.embed = embed  # embed_documents(textes) ; None désactive l'étape 3
+        self.embedding_threshold = embedding_threshold
+        self.aliases = {label: {} for label in LABELS}    # clé -> nom canonique
+        self.counts = {label: {} for label in LABELS}     # nom canonique -> doc_count
+        self.new_aliases = {label: {} for label in LABELS}  # nom canonique -> {clés}
+        self.vectors = {label: {} for label in LABELS}    # nom canonique -> vecteur normalisé
+        self.matrices = {label: (0, None) for label in LABELS}  # vocabulaire empilé (grandit seulement)
+        self.seed_aliases = seed_aliases
+        self.stats = {"exact": 0, "alias": 0, "fuzzy": 0, "embedding": 0, "new": 0}
+
+    # ---------- Vocabulaire ----------
+    def add(self, label, name, doc_count=0, aliases=()):
+        self.counts[label].setdefault(name, doc_count)
+        self.aliases[label].setdefault(canonical_key(name), name)
+        for key in aliases:
+            self.aliases[label].setdefault(key, name)
+
+    @classmethod
+    def from_graph(cls, graph, **kwargs):
+        """ Vocabulaire existant (noms, fréquences, alias) en une requête """
+        from graph_stats import SNAPSHOT_QUERY
+        canonicalizer = cls(**kwargs)
+        with span("canonicalize.load"):
+            rows = graph.query(SNAPSHOT_QUERY)
+        for row in sorted(rows, key=lambda r: -r["doc_count"]):
+            canonicalizer.add(row["label"], row["name"], row["doc_count"], row.get("aliases") or [])
+        return canonicalizer
+
+    def _seed(self, label, key):
+        target = self.seed_aliases.get(label, {}).get(key)
+        if target is None:
+            return None
+        target = target.lower()
+        known = self.aliases[label].get(canonical_key(target))
+        if known is not None:
+            return known
+        self.add(label, target)
+        return target
+
+    def _fuzzy(self, label, key):
+        if len(key) < MIN_FUZZY_LENGTH:
+            return None
+        for other, name in self.aliases[label].items():
+            if fuzzy_equal(key, other):
+                return name
+        return None
+
+    def _vector(self, label, name):
+        if name not in self.vectors[label]:
+            self._embed_missing(label, [name])
+        return self.vectors[label][name]
+
+    def _embed_missing(self, label, names):
+        missing = [n for n in dict.fromkeys(names) if n not in self.vectors[label]]
+        if not missing:
+            return
+        with span("canonicalize.embed", names=len(missing)):
+            matrix = np.asarray(self.embed(missing), dtype=np.float32)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        for name, vector in zip(missing, matrix / norms):
+            self.vectors[label][name] = vector
+
+    def _matrix(self, label, candidates):
+        size, matrix = self.matrices[label]
+        if size < len(candidates):
+            rows = np.stack([self.vectors[label][c] for c in candidates[size:]])
+            matrix = rows if matrix is None else np.vstack([matrix, rows])
+            self.matrices[label] = (len(candidates), matrix)
+        return matrix
+
+    def _nearest(self, label, name, candidates):
+        if self.embed is None or not candidates:
+            return None
+        self._embed_missing(label, candidates + [name])
+        scores = self._matrix(label, candidates) @ self._vector(label, name)
+        best = int(np.argmax(scores))
+        if scores[best] >= self.embedding_threshold and not incompatible(canonical_key(name), canonical_key(candidates[best])):
+            return candidates[best]
+        return None
+
+    # ---------- Résolution ----------
+    def _link(self, label, key, canonical, how):
+        self.aliases[label][key] = canonical
+        self.new_aliases[label].setdefault(canonical, set()).add(key)
+        self.stats[how] += 1
+        return canonical
+
+    def resolve(self, label, raw):
+        """ Nom canonique de `raw` ; crée une nouvelle entité si rien ne correspond """
+        name = raw.strip().lower()
+        key = canonical_key(name)
+        known = self.aliases[label].get(key)
+        if known is not None:
+            self.stats["exact" if known == name else "alias"] += 1
+            return known
+        seeded = self._seed(label, key)
+        if seeded is not None:
+            return self._link(label, key, seeded, "alias")
+        fuzzy = self._fuzzy(label, key)
+        if fuzzy is not None:
+            return self._link(label, key, fuzzy, "fuzzy")
+        # Vocabulaire dans l'ordre d'insertion : la matrice empilée reste valide
+        nearest = self._nearest(label, name, list(self.counts[label]))
+        if nearest is not None:
+            return self._link(label, key, nearest, "embedding")
+        self.add(label, name)
+        self.stats["new"] += 1
+        return name
+
+    def canonicalize(self, all_entities):
+        """ [{symptomes, maladies}] -> mêmes listes avec les noms canoniques (sans doublons) """
+        with span("canonicalize.entities", documents=len(all_entities)):
+            raw = {label: [] for label in LABELS}
+            for entities in all_entities:
+                for label, key in (("Symptome", "symptomes"), ("Maladie", "maladies")):
+                    raw[label].extend(n for n in (entities or {}).get(key, []) if isinstance(n, str) and n.strip())
+            if self.embed is not None:
+                # Un seul appel d'embedding pour tous les noms inconnus et le vocabulaire
+                for label in LABELS:
+                    unknown = [n.strip().lower() for n in raw[label]
+                               if canonical_key(n) not in self.aliases[label]]
+                    if unknown:
+                        self._embed_missing(label, list(self.counts[label]) + unknown)
+            result = []
+            for entities in all_entities:
+                if entities is None:
+                    result.append(None)
+                    continue
+                canonical = dict(entities)
+                for label, key in (("Symptome", "symptomes"), ("Maladie", "maladies")):
+                    names = [self.resolve(label, n) for n in entities.get(key, [])
+                             if isinstance(n, str) and n.strip()]
+                    canonical[key] = list(dict.fromkeys(names))
+                result.append(canonical)
+        return result
+
+    def save_aliases(self, graph):
+        """ Enregistre les alias appris (à appeler une fois les entités écrites) """
+        for label in LABELS:
+            rows = [{"name": name, "aliases": sorted(keys)} for name, keys in self.new_aliases[label].items()]
+            if rows:
+                graph.query(SAVE_ALIASES_QUERIES[label], params={"rows": rows})
+            self.new_aliases[label].clear()
+
+    def report(self):
+        s = self.stats
+        print(f"   🔗 Canonicalisation : {s['exact']} exact(s), {s['alias']} alias, {s['fuzzy']} faute(s) de frappe, "
+              f"{s['embedding']} par embedding, {s['new']} nouvelle(s) entité(s).")
+
+
+def merge_duplicates(graph, embed=None, embedding_threshold=EMBEDDING_THRESHOLD, dry_run=False):
+    """
+    Fusionne en masse les doublons d'un graphe existant : les entités sont reprises
+    par fréquence décroissante, la plus fréquente d'un groupe devient canonique.
+    """
+    from graph_stats import SNAPSHOT_QUERY, refresh_entity_stats
+    from ingestion_manifest import bump_graph_version
+    rows = graph.query(SNAPSHOT_QUERY)
+    canonicalizer = EntityCanonicalizer(embed=embed, embedding_threshold=embedding_threshold)
+    merges = {label: [] for label in LABELS}
+    ordered = sorted(rows, key=lambda r: (-r["doc_count"], r["name"]))
+    if embed is not None:
+        for label in LABELS:
+            canonicalizer._embed_missing(label, [r["name"] for r in ordered if r["label"] == label])
+    for row in ordered:
+        label, name = row["label"], row["name"]
+        canonical = canonicalizer.resolve(label, name)
+        if canonical != name:
+            merges[label].append({"canonical": canonical, "duplicate": name,
+                                  "aliases": [canonical_key(name)] + list(row.get("aliases") or [])})
+        else:
+            for key in row.get("aliases") or []:
+                canonicalizer.aliases[label].setdefault(key, name)
+    total = sum(len(m) for m in merges.values())
+    for label in LABELS:
+        for m in merges[label]:
+            print(f"   🔗 {label} : '{m['duplicate']}' -> '{m['canonical']}'")
+    if dry_run or not total:
+        print(f"   {'🔎 Simulation' if dry_run else '✅ Aucun doublon'} : {total} fusion(s).")
+        return merges
+    ids, merged = [], 0
+    with span("canonicalize.merge", merges=total):
+        for label in LABELS:
+            if merges[label]:
+                result = graph.query(MERGE_DUPLICATES_QUERIES[label], params={"rows": merges[label]})
+                ids.extend(result[0]["ids"] if result else [])
+                merged += result[0]["merged"] if result else 0
+        canonicalizer.save_aliases(graph)
+        refresh_entity_stats(graph, ids)
+    bump_graph_version(graph)
+    print(f"✅ {merged} doublon(s) fusionné(s).")
+    if merged < total:
+        print(f"   ⚠️ {total - merged} fusion(s) ignorée(s) : doublon absent du graphe.")
+    return merges
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fusionne les Symptômes / Maladies en double dans Neo4j")
+    parser.add_argument("--merge", action="store_true", help="Applique les fusions (sinon simulation)")
+    parser.add_argument("--threshold", type=float, default=EMBEDDING_THRESHOLD,
+                        help="Cosinus minimal pour rattacher par embedding")
+    parser.add_argument("--no-embedding", action="store_true", help="Clés et fautes de frappe seulement")
+    args = parser.parse_args()
+
+    import runtime
+    from ingestion_graphrag import EMBEDDING_MODEL_NAME
+    embed = None if args.no_embedding else runtime.get_embeddings(EMBEDDING_MODEL_NAME).embed_documents
+    graph = runtime.get_graph()
+    merges = merge_duplicates(graph, embed, args.threshold, dry_run=not args.merge)
+    if args.merge and any(merges.values()):
+        from graph_expansion import sync_snapshot
+        from graph_store import persist
+        from answer_cache import invalidate_answers
+        sync_snapshot(graph)  # Les liens des consultations ont changé
+        persist(graph)
+        invalidate_answers()  # Les entités citées dans les contextes ont pu changer de nom
+
+
+if __name__ == "__main__":
+    main()
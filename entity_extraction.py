@@ -0,0 +1,59 @@
+import json
+import hashlib
+
+from tracing import span
+
+# ==========================================
+# 👇 EXTRACTION D'ENTITÉS (PROMPT PARTAGÉ) 👇
+# ==========================================
+
+ENTITY_PROMPT = """
+        Analyse ce texte médical. Extrais une liste de SYMPTOMES et une liste de MALADIES.
+        Format JSON STRICT: {{"symptomes": ["fièvre", "toux"], "maladies": ["grippe"]}}
+        Traduis les termes en Français.
+        Texte: {text}
+        """
+
+# Change dès que le prompt change : sert à savoir quelles consultations ré-extraire
+EXTRACTOR_VERSION = hashlib.sha256(ENTITY_PROMPT.encode("utf-8")).hexdigest()[:12]
+
+
+def extractor_version(model_name):
+    return f"{model_name}@{EXTRACTOR_VERSION}"
+
+
+def parse_entities(content):
+    """ Nettoyage bourrin du JSON renvoyé par le LLM """
+    json_str = content.replace("```json", "").replace("```", "").strip()
+    start = json_str.find("{")
+    end = json_str.rfind("}") + 1
+    return json.loads(json_str[start:end])
+
+
+class EntityParseError(ValueError):
+    """ Réponse LLM impossible à parser : le document passe en dead-letter et sera retenté """
+
+
+def model_name_of(llm):
+    return getattr(llm, "model_name", None) or type(llm).__name__
+
+
+async def aextract_entities(llm, text, cache=None):
+    """ Version asynchrone : les erreurs d'API (429...) remontent à l'ordonnanceur """
+    model = model_name_of(llm)
+    if cache is not None:
+        cached = cache.get(model, EXTRACTOR_VERSION, text)
+        if cached is not None:
+            return cached
+    with span("llm.extract_entities", model=model):
+        res = await llm.ainvoke(ENTITY_PROMPT.format(text=text))
+    try:
+        entities = parse_entities(res.content)
+    except ValueError as e:
+        # On n'enregistre PAS un résultat vide : l'échec est noté pour être retenté
+        if cache is not None:
+            cache.record_failure(model, EXTRACTOR_VERSION, text, res.content)
+        raise EntityParseError(f"JSON invalide : {e}") from e
+    if cache is not None:
+        cache.put(model, EXTRACTOR_VERSION, text, entities)
+    return entities
@@ -0,0 +1,183 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+
+# ==========================================
+# 👇 CACHE DISQUE DES EXTRACTIONS LLM (SQLITE) 👇
+# ==========================================
+# Clé : (nom du modèle, empreinte du prompt, empreinte du texte).
+# Reconstruire le graphe après un changement de schéma / de Cypher ne repaie pas
+# les appels LLM. Les échecs de parsing sont enregistrés à part (status='error')
+# et ne sont JAMAIS servis comme résultat : ils seront retentés.
+
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache")
+DEFAULT_CACHE_PATH = os.path.join(CACHE_DIR, "extractions.sqlite")
+DEFAULT_MAX_AGE_DAYS = 90
+DEFAULT_MAX_BYTES = 200 * 1024 * 1024
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS extractions (
+    model       TEXT NOT NULL,
+    prompt_hash TEXT NOT NULL,
+    text_hash   TEXT NOT NULL,
+    status      TEXT NOT NULL,
+    result      TEXT,
+    raw         TEXT,
+    attempts    INTEGER NOT NULL DEFAULT 0,
+    size        INTEGER NOT NULL DEFAULT 0,
+    created_at  REAL NOT NULL,
+    accessed_at REAL NOT NULL,
+    PRIMARY KEY (model, prompt_hash, text_hash)
+)
+"""
+
+
+def text_hash(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class ExtractionCache:
+    """ Cache durable des résultats d'extraction, avec éviction par âge et par taille """
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_age_days=DEFAULT_MAX_AGE_DAYS,
+                 max_bytes=DEFAULT_MAX_BYTES):
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self.max_age_seconds = max_age_days * 86400
+        self.max_bytes = max_bytes
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(SCHEMA)
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_accessed ON extractions (accessed_at)")
+        self.conn.commit()
+        self.hits = 0
+        self.misses = 0
+        self.failures = 0
+        self.evicted = self.evict()
+
+    def get(self, model, prompt_hash, text):
+        """ Résultat mis en cache, ou None (absent, expiré ou échec précédent) """
+        key = (model, prompt_hash, text_hash(text))
+        row = self.conn.execute(
+            "SELECT result, created_at FROM extractions "
+            "WHERE model=? AND prompt_hash=? AND text_hash=? AND status='ok'", key
+        ).fetchone()
+        if row is None or time.time() - row[1] > self.max_age_seconds:
+            self.misses += 1
+            return None
+        self.conn.execute(
+            "UPDATE extractions SET accessed_at=? WHERE model=? AND prompt_hash=? AND text_hash=?",
+            (time.time(),) + key
+        )
+        self.conn.commit()
+        self.hits += 1
+        return json.loads(row[0])
+
+    def put(self, model, prompt_hash, text, result):
+        payload = json.dumps(result, ensure_ascii=False)
+        self._upsert(model, prompt_hash, text, "ok", payload, None, len(payload))
+
+    def record_failure(self, model, prompt_hash, text, raw):
+        """ Garde la réponse brute pour diagnostic ; l'entrée sera retentée """
+        self.failures += 1
+        raw = raw if isinstance(raw, str) else repr(raw)
+        self._upsert(model, prompt_hash, text, "error", None, raw, len(raw))
+
+    def _upsert(self, model, prompt_hash, text, status, result, raw, size):
+        now = time.time()
+        self.conn.execute(
+            "INSERT INTO extractions (model, prompt_hash, text_hash, status, result, raw, attempts, "
+            "size, created_at, accessed_at) VALUES (?, ?, ?, ?, ?, ?, 1, ?, ?, ?) "
+            "ON CONFLICT(model, prompt_hash, text_hash) DO UPDATE SET "
+            "status=excluded.status, result=excluded.result, raw=excluded.raw, "
+            "attempts=attempts + 1, size=excluded.size, created_at=excluded.created_at, "
+            "accessed_at=excluded.accessed_at",
+            (model, prompt_hash, text_hash(text), status, result, raw, size, now, now)
+        )
+        self.conn.commit()
+
+    def failed_entries(self):
+        """ Entrées en échec (pour relancer / diagnostiquer) """
+        return self.conn.execute(
+            "SELECT model, prompt_hash, text_hash, attempts, raw FROM extractions WHERE status='error'"
+        ).fetchall()
+
+    def evict(self):
+        """ Supprime les entrées trop vieilles puis les moins récemment lues au-delà de max_bytes """
+        cur = self.conn.execute("DELETE FROM extractions WHERE created_at < ?",
+                                (time.time() - self.max_age_seconds,))
+        evicted = cur.rowcount
+        total = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM extractions").fetchone()[0]
+        if total > self.max_bytes:
+            rows = self.conn.execute(
+                "SELECT rowid, size FROM extractions ORDER BY accessed_at ASC"
+            ).fetchall()
+            to_delete = []
+            for rowid, size in rows:
+                if total <= self.max_bytes:
+                    break
+                to_delete.append((rowid,))
+                total -= size
+            self.conn.executemany("DELETE FROM extractions WHERE rowid=?", to_delete)
+            evicted += len(to_delete)
+        self.conn.commit()
+        return evicted
+
+    def stats(self):
+        entries, size = self.conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM extractions"
+        ).fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "failures": self.failures,
+            "evicted": self.evicted,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": entries,
+            "bytes": size,
+        }
+
+    def report(self):
+        s = self.stats()
+        print(f"   📊 Cache d'extraction : {s['hits']} hit(s), {s['misses']} miss, "
+              f"{s['failures']} échec(s) de parsing ({s['hit_rate']:.0%} de hits, "
+              f"{s['entries']} entrées, {s['bytes'] / 1024:.0f} Ko)")
+
+    def close(self):
+        self.evicted += self.evict()
+        self.conn.close()
+
+
+# ==========================================
+# 👇 SÉRIALISATION DES GraphDocument (main.py) 👇
+# ==========================================
+def graph_documents_to_json(graph_documents):
+    """ GraphDocument -> structure JSON (nœuds + relations, sans le document source) """
+    def node(n):
+        return {"id": n.id, "type": n.type, "properties": dict(n.properties or {})}
+    return [{
+        "nodes": [node(n) for n in gd.nodes],
+        "relationships": [{
+            "source": node(r.source), "target": node(r.target),
+            "type": r.type, "properties": dict(r.properties or {}),
+        } for r in gd.relationships],
+    } for gd in graph_documents]
+
+
+def graph_documents_from_json(data, source):
+    """ Structure JSON -> GraphDocument, rattachés au Document `source` """
+    from langchain_community.graphs.graph_document import GraphDocument, Node, Relationship
+
+    def node(n):
+        return Node(id=n["id"], type=n["type"], properties=n.get("properties", {}))
+    return [GraphDocument(
+        nodes=[node(n) for n in gd["nodes"]],
+        relationships=[Relationship(source=node(r["source"]), target=node(r["target"]),
+                                    type=r["type"], properties=r.get("properties", {}))
+                       for r in gd["relationships"]],
+        source=source,
+    ) for gd in data]
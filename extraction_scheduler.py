@@ -0,0 +1,181 @@
+import time
+import random
+import asyncio
+
+from tracing import span
+
+# ==========================================
+# 👇 ORDONNANCEUR D'EXTRACTION LLM (ASYNCIO) 👇
+# ==========================================
+# Remplace les time.sleep(3) / time.sleep(30) fixes :
+#   - concurrence bornée (Semaphore),
+#   - seaux à jetons pour les requêtes/min et les tokens/min du fournisseur, créés
+#     une fois par ordonnanceur : l'ingestion en flux appelle run() lot par lot sans
+#     remettre à zéro les quotas ni une pause Retry-After en cours,
+#   - respect de l'en-tête Retry-After sur les 429,
+#   - backoff exponentiel avec jitter,
+#   - file "dead-letter" pour les documents qui échouent encore après N essais.
+
+DEFAULT_CONCURRENCY = 4
+DEFAULT_RPM = 30        # Requêtes / minute (quota Groq gratuit)
+DEFAULT_TPM = 6000      # Tokens / minute
+DEFAULT_MAX_RETRIES = 5
+RETRYABLE_STATUS = {408, 409, 413, 429, 500, 502, 503, 504}
+
+
+def estimate_tokens(text):
+    """ Estimation grossière : ~4 caractères par token + marge pour le prompt """
+    return len(str(text)) // 4 + 200
+
+
+class TokenBucket:
+    """ Seau à jetons : `rate_per_minute` jetons, rechargés en continu """
+
+    def __init__(self, rate_per_minute, clock=time.monotonic):
+        self.capacity = float(rate_per_minute)
+        self.tokens = float(rate_per_minute)
+        self.rate = rate_per_minute / 60.0
+        self.clock = clock
+        self.updated = clock()
+        self.loop = None
+        self.lock = None
+
+    def _lock(self):
+        """ Un verrou asyncio par boucle : le seau survit aux appels successifs de asyncio.run """
+        loop = asyncio.get_running_loop()
+        if self.loop is not loop:
+            self.loop, self.lock = loop, asyncio.Lock()
+        return self.lock
+
+    def _refill(self):
+        now = self.clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, amount=1):
+        # Une requête plus grosse que le seau ne doit pas bloquer indéfiniment
+        amount = min(float(amount), self.capacity)
+        async with self._lock():
+            while True:
+                self._refill()
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                await asyncio.sleep((amount - self.tokens) / self.rate)
+
+    def drain(self, seconds):
+        """ Vide le seau pour `seconds` (utilisé quand le fournisseur renvoie Retry-After) """
+        self._refill()
+        self.tokens = min(self.tokens, -seconds * self.rate)
+
+
+def status_code(exc):
+    code = getattr(exc, "status_code", None)
+    if code is None:
+        code = getattr(getattr(exc, "response", None), "status_code", None)
+    if code is None:
+        # Certains clients ne donnent le code que dans le message
+        for candidate in (429, 413):
+            if str(candidate) in str(exc):
+                return candidate
+    return code
+
+
+def retry_after(exc):
+    """ Lit Retry-After (en secondes) sur l'exception ou sa réponse HTTP """
+    value = getattr(exc, "retry_after", None)
+    if value is None:
+        headers = getattr(getattr(exc, "response", None), "headers", None) or {}
+        value = headers.get("retry-after") or headers.get("Retry-After")
+    try:
+        return float(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+class ExtractionScheduler:
+    """ Exécute `call(item)` (coroutine) sur une liste de documents, sans dépasser les quotas """
+
+    def __init__(self, call, concurrency=DEFAULT_CONCURRENCY, rpm=DEFAULT_RPM, tpm=DEFAULT_TPM,
+                 max_retries=DEFAULT_MAX_RETRIES, base_delay=1.0, max_delay=60.0,
+                 token_estimator=estimate_tokens, label=str, on_result=None):
+        self.call = call
+        self.concurrency = concurrency
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.token_estimator = token_estimator
+        self.label = label
+        self.rpm = rpm
+        self.tpm = tpm  # None : pas de quota de tokens
+        self.request_bucket = TokenBucket(rpm)
+        self.token_bucket = TokenBucket(tpm) if tpm else None
+        # on_result(index, item, result, error) dès qu'un élément se termine (écriture en flux)
+        self.on_result = on_result
+        self.dead_letters = []
+        self.retries = 0
+        self.rate_limited = 0
+
+    def backoff(self, attempt):
+        """ Backoff exponentiel avec "full jitter" """
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+    async def _run_one(self, index, item, semaphore):
+        request_bucket, token_bucket = self.request_bucket, self.token_bucket
+        tokens = self.token_estimator(item)
+        last_error = None
+        for attempt in range(self.max_retries + 1):
+            await request_bucket.acquire(1)
+            if token_bucket is not None:
+                await token_bucket.acquire(tokens)
+            async with semaphore:
+                try:
+                    with span("extraction.document", item=str(self.label(item)), attempt=attempt):
+                        result = await self.call(item)
+                except Exception as e:
+                    last_error = e
+                else:
+                    if self.on_result is not None:
+                        self.on_result(index, item, result, None)
+                    return result
+            code = status_code(last_error)
+            if code not in RETRYABLE_STATUS or attempt == self.max_retries:
+                break
+            self.retries += 1
+            delay = self.backoff(attempt)
+            wait = retry_after(last_error)
+            if code == 429:
+                self.rate_limited += 1
+                if wait is not None:
+                    # Le fournisseur sait mieux que nous : on bloque tout le monde
+                    request_bucket.drain(wait)
+                    delay = max(delay, wait)
+            print(f"      ⏳ [{self.label(item)}] Erreur {code}, nouvel essai dans {delay:.1f}s...")
+            await asyncio.sleep(delay)
+
+        print(f"      ❌ [{self.label(item)}] Abandon : {last_error}")
+        self.dead_letters.append({"index": index, "item": item, "error": repr(last_error)})
+        if self.on_result is not None:
+            self.on_result(index, item, None, repr(last_error))
+        return None
+
+    async def run(self, items):
+        """ Retourne les résultats dans l'ordre d'entrée (None pour les dead-letters) """
+        items = list(items)
+        self.dead_letters = []
+        semaphore = asyncio.Semaphore(self.concurrency)
+        start = time.perf_counter()
+        results = await asyncio.gather(*[
+            self._run_one(i, item, semaphore)
+            for i, item in enumerate(items)
+        ])
+        elapsed = time.perf_counter() - start
+        ok = len(items) - len(self.dead_letters)
+        rate = ok / elapsed if elapsed else 0.0
+        print(f"   📊 Extraction : {ok}/{len(items)} documents en {elapsed:.1f}s ({rate:.2f} docs/s), "
+              f"{self.retries} nouvel(s) essai(s), {self.rate_limited} 429, "
+              f"{len(self.dead_letters)} en dead-letter")
+        return results
+
+    def run_sync(self, items):
+        return asyncio.run(self.run(items))
@@ -0,0 +1,174 @@
+import json
+import time
+import zlib
+import random
+import asyncio
+
+import numpy as np
+
+from graph_store import EmbeddedGraph
+
+try:
+    from langchain_core.language_models.chat_models import BaseChatModel
+    from langchain_core.messages import AIMessage, ToolMessage
+    from langchain_core.outputs import ChatGeneration, ChatResult
+except ImportError:
+    BaseChatModel = None  # FakeAgentChatModel indisponible sans langchain-core
+
+# ==========================================
+# 👇 DOUBLURES LOCALES (SANS GROQ / AURADB) 👇
+# ==========================================
+# Permettent de tester l'ordonnanceur, le pipeline et les benchmarks
+# (benchmarks/run_benchmarks.py) sans compte Groq ni instance AuraDB.
+
+
+class FakeMessage:
+    def __init__(self, content):
+        self.content = content
+
+
+class FakeHTTPResponse:
+    def __init__(self, status_code, headers):
+        self.status_code = status_code
+        self.headers = headers
+
+
+class FakeRateLimitError(Exception):
+    """ Imite groq.RateLimitError : status_code + response.headers['retry-after'] """
+
+    def __init__(self, retry_after=1.0):
+        super().__init__("Error code: 429 - Rate limit reached")
+        self.status_code = 429
+        self.response = FakeHTTPResponse(429, {"retry-after": str(retry_after)})
+
+
+DEFAULT_RESPONSE = json.dumps({"symptomes": ["fièvre", "toux"], "maladies": ["grippe"]}, ensure_ascii=False)
+
+
+class FakeChatModel:
+    """
+    Modèle de chat local : latence simulée, 429 aléatoires ou par quota,
+    et réponses JSON préenregistrées.
+    """
+
+    def __init__(self, latency=0.05, rate_limit_prob=0.0, rpm_quota=None, retry_after=1.0,
+                 response=DEFAULT_RESPONSE, fail_if_contains=None, seed=0, model_name="fake-chat",
+                 **kwargs):
+        self.model_name = model_name
+        self.latency = latency
+        self.rate_limit_prob = rate_limit_prob
+        self.rpm_quota = rpm_quota
+        self.retry_after = retry_after
+        self.response = response
+        self.fail_if_contains = fail_if_contains
+        self.random = random.Random(seed)
+        self.calls = 0
+        self.rate_limited = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._window = []
+
+    def _check_quota(self, prompt):
+        now = time.monotonic()
+        self._window = [t for t in self._window if now - t < 60]
+        over_quota = self.rpm_quota is not None and len(self._window) >= self.rpm_quota
+        unlucky = self.random.random() < self.rate_limit_prob
+        poisoned = self.fail_if_contains is not None and self.fail_if_contains in str(prompt)
+        if over_quota or unlucky or poisoned:
+            self.rate_limited += 1
+            raise FakeRateLimitError(self.retry_after)
+        self._window.append(now)
+
+    def _respond(self, prompt):
+        if callable(self.response):
+            return FakeMessage(self.response(prompt))
+        return FakeMessage(self.response)
+
+    def invoke(self, prompt, **kwargs):
+        self.calls += 1
+        self._check_quota(prompt)
+        time.sleep(self.latency)
+        return self._respond(prompt)
+
+    async def ainvoke(self, prompt, **kwargs):
+        self.calls += 1
+        self._check_quota(prompt)
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.latency)
+        finally:
+            self.in_flight -= 1
+        return self._respond(prompt)
+
+
+class FakeEmbeddings:
+    """
+    Embeddings déterministes par hachage des mots (même interface que
+    HuggingFaceEmbeddings) : deux textes qui partagent du vocabulaire sont proches.
+    """
+
+    def __init__(self, dim=384, latency=0.0, model_name="fake-embeddings", **kwargs):
+        self.dim = dim
+        self.latency = latency
+        self.model_name = model_name
+        self.calls = 0
+
+    def _embed(self, text):
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for word in str(text).lower().split():
+            h = zlib.crc32(word.encode("utf-8"))
+            vector[h % self.dim] += 1.0 if (h >> 16) & 1 else -1.0
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
+
+    def embed_documents(self, texts):
+        self.calls += 1
+        time.sleep(self.latency * len(texts))
+        return [self._embed(t) for t in texts]
+
+    def embed_query(self, text):
+        self.calls += 1
+        time.sleep(self.latency)
+        return self._embed(text)
+
+class InMemoryGraph(EmbeddedGraph):
+    """
+    Graphe embarqué (graph_store.py) sans sauvegarde disque, avec une latence
+    simulée par aller-retour pour reproduire le coût réseau d'AuraDB.
+    """
+
+    def __init__(self, latency=0.0):
+        super().__init__(latency=latency)
+
+
+if BaseChatModel is not None:
+    class FakeAgentChatModel(BaseChatModel):
+        """
+        Modèle ReAct minimal pour create_react_agent : appelle d'abord `tool_name`
+        avec la question, puis répond à partir du résultat de l'outil.
+        """
+
+        latency: float = 0.05
+        tool_name: str = "recherche_cas_similaires"
+        model_name: str = "fake-agent"
+        calls: int = 0
+
+        @property
+        def _llm_type(self):
+            return "fake-agent"
+
+        def bind_tools(self, tools, **kwargs):
+            return self
+
+        def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+            self.calls += 1
+            time.sleep(self.latency)
+            last = messages[-1]
+            if isinstance(last, ToolMessage):
+                message = AIMessage(content=f"Selon les documents : {str(last.content)[:300]}")
+            else:
+                message = AIMessage(content="", tool_calls=[{
+                    "name": self.tool_name, "args": {"query": str(last.content)}, "id": f"call_{self.calls}",
+                }])
+            return ChatResult(generations=[ChatGeneration(message=message)])
@@ -0,0 +1,222 @@
+import os
+import json
+import time
+
+import numpy as np
+
+from tracing import span
+
+# ==========================================
+# 👇 EXPANSION PAR LE GRAPHE (SNAPSHOT CSR + PAGERANK PERSONNALISÉ) 👇
+# ==========================================
+# Le graphe biparti Consultation -> Symptome / Maladie est copié localement sous
+# forme CSR (tableaux NumPy) :
+#   - indptr  : début des entités de chaque consultation (n_consultations + 1),
+#   - indices : index des entités (un par lien MENTIONNE_*).
+# Les consultations trouvées par la recherche vectorielle servent de graines à un
+# PageRank personnalisé (ou à un score k-sauts borné) : des consultations qui
+# partagent des symptômes mais pas le vocabulaire remontent dans les candidats,
+# sans requête Cypher à longueur variable vers AuraDB à chaque question.
+# Le snapshot est recopié par l'ingestion (seulement les consultations modifiées
+# en mode incrémental).
+
+SNAPSHOT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "graph_snapshot")
+DAMPING = 0.15           # Probabilité de retour aux graines (PageRank personnalisé)
+MAX_ITERATIONS = 30
+TOLERANCE = 1e-4        # Variation L1 sous laquelle le classement ne bouge plus
+GRAPH_WEIGHT = 0.3       # Part du score de graphe dans le score final
+EXPANSION_CANDIDATES = 5  # Consultations ajoutées au plus par le graphe
+
+EDGES_QUERY = """
+MATCH (c:Consultation)
+OPTIONAL MATCH (c)-[:MENTIONNE_SYMPTOME|MENTIONNE_MALADIE]->(e)
+WITH c, collect(labels(e)[0] + ':' + e.name) AS entities
+RETURN c.filename AS filename, entities
+ORDER BY filename
+SKIP $skip LIMIT $limit
+"""
+
+# Mise à jour incrémentale : liens des consultations modifiées (absentes = supprimées)
+EDGES_FOR_QUERY = """
+UNWIND $filenames AS f
+MATCH (c:Consultation {filename: f})
+OPTIONAL MATCH (c)-[:MENTIONNE_SYMPTOME|MENTIONNE_MALADIE]->(e)
+RETURN c.filename AS filename, collect(labels(e)[0] + ':' + e.name) AS entities
+"""
+
+
+class GraphSnapshot:
+    """ Graphe biparti consultations / entités en CSR, avec scores de proximité par marche aléatoire """
+
+    def __init__(self, path=SNAPSHOT_DIR):
+        self.path = path
+        self.consultations = []
+        self.entities = []
+        self.indptr = np.zeros(1, dtype=np.int64)
+        self.indices = np.zeros(0, dtype=np.int32)
+        self.meta = {}
+        self._prepare()
+
+    # ---------- Construction ----------
+    def adjacency(self):
+        """ {filename: [clés d'entités]} (pour une mise à jour incrémentale) """
+        return {f: [self.entities[i] for i in self.indices[self.indptr[r]:self.indptr[r + 1]]]
+                for r, f in enumerate(self.consultations)}
+
+    def build(self, adjacency, meta=None):
+        """ Construit le CSR depuis {filename: [clés d'entités]} et l'écrit sur disque """
+        self.consultations = sorted(adjacency)
+        self.entities = sorted({e for entities in adjacency.values() for e in entities})
+        position = {e: i for i, e in enumerate(self.entities)}
+        rows = [sorted({position[e] for e in adjacency[f]}) for f in self.consultations]
+        self.indptr = np.concatenate([[0], np.cumsum([len(r) for r in rows])]).astype(np.int64)
+        self.indices = np.fromiter((i for r in rows for i in r), dtype=np.int32, count=int(self.indptr[-1]))
+        self.meta = {"built_at": time.time(), **(meta or {})}
+
+        os.makedirs(self.path, exist_ok=True)
+        arrays_path = os.path.join(self.path, "csr.npz")
+        with open(arrays_path + ".tmp", "wb") as f:
+            np.savez(f, indptr=self.indptr, indices=self.indices)
+        os.replace(arrays_path + ".tmp", arrays_path)
+        ids_path = os.path.join(self.path, "ids.json")
+        with open(ids_path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump({"consultations": self.consultations, "entities": self.entities, **self.meta},
+                      f, ensure_ascii=False)
+        os.replace(ids_path + ".tmp", ids_path)
+        self._prepare()
+        return self
+
+    def load(self):
+        with open(os.path.join(self.path, "ids.json"), encoding="utf-8") as f:
+            self.meta = json.load(f)
+        self.consultations = self.meta.pop("consultations")
+        self.entities = self.meta.pop("entities")
+        data = np.load(os.path.join(self.path, "csr.npz"))
+        self.indptr, self.indices = data["indptr"], data["indices"]
+        self._prepare()
+        return self
+
+    def _prepare(self):
+        """ Tableaux dérivés pour les marches : ligne de chaque lien, degrés """
+        self.position = {f: i for i, f in enumerate(self.consultations)}
+        self.consultation_degree = np.diff(self.indptr)
+        self.edge_rows = np.repeat(np.arange(len(self.consultations)), self.consultation_degree)
+        self.entity_degree = np.bincount(self.indices, minlength=len(self.entities))
+        self.inverse_consultation_degree = 1.0 / np.maximum(self.consultation_degree, 1)
+        self.inverse_entity_degree = 1.0 / np.maximum(self.entity_degree, 1)
+
+    def exists(self):
+        return os.path.exists(os.path.join(self.path, "ids.json"))
+
+    def __len__(self):
+        return len(self.consultations)
+
+    # ---------- Scores ----------
+    def _walk(self, p):
+        """ Un pas consultation -> entité -> consultation (poids divisés par les degrés) """
+        out = p * self.inverse_consultation_degree
+        on_entities = np.bincount(self.indices, weights=out[self.edge_rows], minlength=len(self.entities))
+        on_entities *= self.inverse_entity_degree
+        return np.bincount(self.edge_rows, weights=on_entities[self.indices], minlength=len(self.consultations))
+
+    def _seed_vector(self, seeds):
+        s = np.zeros(len(self.consultations))
+        for filename, weight in seeds.items():
+            if filename in self.position:
+                s[self.position[filename]] += weight
+        return s
+
+    def personalized_pagerank(self, seeds, damping=DAMPING, max_iterations=MAX_ITERATIONS):
+        """ seeds : {filename: poids} -> vecteur de scores (somme 1) sur les consultations """
+        s = self._seed_vector(seeds)
+        if not s.sum():
+            return s
+        s /= s.sum()
+        r = s.copy()
+        for _ in range(max_iterations):
+            walked = self._walk(r)
+            # Masse des consultations sans entité : renvoyée vers les graines
+            nxt = damping * s + (1 - damping) * (walked + (1 - walked.sum()) * s)
+            delta = np.abs(nxt - r).sum()
+            r = nxt
+            if delta < TOLERANCE:
+                break
+        return r
+
+    def khop(self, seeds, hops=2, decay=0.5):
+        """ Score borné : somme des masses atteintes en 1..hops pas (consultation -> entité -> consultation) """
+        s = self._seed_vector(seeds)
+        score, p = np.zeros_like(s), s
+        for hop in range(1, hops + 1):
+            p = self._walk(p)
+            score += decay ** hop * p
+        return score
+
+    def rerank(self, seeds, k, vector_scores=None, method="ppr", graph_weight=GRAPH_WEIGHT,
+               extra=EXPANSION_CANDIDATES):
+        """
+        seeds : {filename: score vectoriel}. Candidats = graines + `extra` consultations
+        les mieux classées par le graphe ; score final = (1 - w) * vecteur + w * graphe
+        (graphe ramené à [0, 1]). `vector_scores(filenames)` donne le score vectoriel
+        des candidats ajoutés (0 sinon). Retourne [(filename, score)] décroissants.
+        """
+        if not len(self) or not seeds:
+            return sorted(seeds.items(), key=lambda item: -item[1])[:k]
+        with span("retrieval.graph_expansion", seeds=len(seeds), method=method):
+            scores = self.personalized_pagerank(seeds) if method == "ppr" else self.khop(seeds)
+            order = np.argsort(-scores)
+            added = [self.consultations[i] for i in order[:len(seeds) + extra]
+                     if scores[i] > 0 and self.consultations[i] not in seeds][:extra]
+            vector = dict(seeds)
+            if added and vector_scores is not None:
+                vector.update(vector_scores(added))
+            candidates = list(seeds) + added
+            graph_scores = np.array([scores[self.position[f]] if f in self.position else 0.0 for f in candidates])
+            top = graph_scores.max()
+            if top > 0:
+                graph_scores = graph_scores / top
+            final = [(f, float((1 - graph_weight) * vector.get(f, 0.0) + graph_weight * g))
+                     for f, g in zip(candidates, graph_scores)]
+        return sorted(final, key=lambda item: -item[1])[:k]
+
+
+def sync_snapshot(graph, path=SNAPSHOT_DIR, page_size=1000):
+    """ Recopie complète des liens Consultation -> Symptome / Maladie depuis Neo4j """
+    start = time.perf_counter()
+    adjacency, skip = {}, 0
+    while True:
+        rows = graph.query(EDGES_QUERY, params={"skip": skip, "limit": page_size})
+        for row in rows:
+            adjacency[row["filename"]] = row["entities"]
+        if len(rows) < page_size:
+            break
+        skip += page_size
+    snapshot = GraphSnapshot(path).build(adjacency)
+    print(f"✅ Snapshot du graphe synchronisé : {len(snapshot)} consultations, {len(snapshot.entities)} entités, "
+          f"{len(snapshot.indices)} liens en {time.perf_counter() - start:.2f}s.")
+    return snapshot
+
+
+def refresh_snapshot(graph, filenames, path=SNAPSHOT_DIR):
+    """ Mise à jour incrémentale : seules les consultations `filenames` sont relues (absentes = supprimées) """
+    snapshot = open_snapshot(path)
+    if snapshot is None:
+        return sync_snapshot(graph, path)
+    filenames = sorted(set(filenames))
+    if not filenames:
+        return snapshot
+    adjacency = snapshot.adjacency()
+    for f in filenames:
+        adjacency.pop(f, None)
+    rows = graph.query(EDGES_FOR_QUERY, params={"filenames": filenames})
+    for row in rows:
+        adjacency[row["filename"]] = row["entities"]
+    snapshot.build(adjacency)
+    print(f"✅ Snapshot du graphe mis à jour : {len(filenames)} consultation(s) relue(s), {len(snapshot)} au total.")
+    return snapshot
+
+
+def open_snapshot(path=SNAPSHOT_DIR):
+    """ Snapshot déjà synchronisé, sinon None """
+    snapshot = GraphSnapshot(path)
+    return snapshot.load() if snapshot.exists() else None
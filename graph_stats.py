@@ -0,0 +1,214 @@
+import time
+
+from context_builder import normalize_term
+from entity_canonicalizer import canonical_key
+import ingestion_manifest
+from ingestion_manifest import graph_version
+from tracing import span
+
+# ==========================================
+# 👇 STATISTIQUES MATÉRIALISÉES (SYMPTÔMES / MALADIES) 👇
+# ==========================================
+# Maintenues par l'ingestion, seulement pour les entités touchées :
+#   - e.doc_count : nombre de consultations qui mentionnent l'entité,
+#   - (s:Symptome)-[:COOCCURS {count}]->(m:Maladie) : consultations communes,
+#   - e.top_related / e.top_related_counts : les TOP_K entités les plus co-occurrentes.
+# Côté requêtes, EntityStats charge ces agrégats une fois par version du graphe et
+# répond sans LLM ni parcours `toLower(n.name) CONTAINS` de tous les nœuds.
+
+TOP_K = 10
+VERSION_CHECK_SECONDS = 30
+
+# Noms d'entités (tels qu'écrits par graph_writer) -> elementId
+ENTITY_IDS_QUERY = """
+UNWIND $symptomes AS name
+MATCH (e:Symptome {name: toLower(name)})
+RETURN elementId(e) AS id
+UNION
+UNWIND $maladies AS name
+MATCH (e:Maladie {name: toLower(name)})
+RETURN elementId(e) AS id
+"""
+
+# Supprime les co-occurrences des entités touchées et renvoie leurs anciens partenaires
+DELETE_COOCCURRENCE_QUERY = """
+UNWIND $ids AS id
+MATCH (e)-[r:COOCCURS]-(partner) WHERE elementId(e) = id
+DELETE r
+RETURN collect(DISTINCT elementId(partner)) AS partners
+"""
+
+DOC_COUNT_QUERY = """
+UNWIND $ids AS id
+MATCH (e) WHERE elementId(e) = id
+SET e.doc_count = COUNT { (e)<-[:MENTIONNE_SYMPTOME|MENTIONNE_MALADIE]-(:Consultation) }
+"""
+
+# Recalcule les paires (symptôme, maladie) dont l'un des deux membres est touché
+COOCCURRENCE_QUERY = """
+UNWIND $ids AS id
+MATCH (e) WHERE elementId(e) = id
+CALL {
+    WITH e
+    MATCH (e:Symptome)<-[:MENTIONNE_SYMPTOME]-(c:Consultation)-[:MENTIONNE_MALADIE]->(m:Maladie)
+    RETURN e AS s, m, c
+    UNION ALL
+    WITH e
+    MATCH (e:Maladie)<-[:MENTIONNE_MALADIE]-(c:Consultation)-[:MENTIONNE_SYMPTOME]->(s:Symptome)
+    RETURN s, e AS m, c
+}
+WITH s, m, count(DISTINCT c) AS n
+MERGE (s)-[r:COOCCURS]->(m)
+SET r.count = n
+RETURN collect(DISTINCT elementId(s)) + collect(DISTINCT elementId(m)) AS partners
+"""
+
+TOP_RELATED_QUERY = """
+UNWIND $ids AS id
+MATCH (e) WHERE elementId(e) = id
+OPTIONAL MATCH (e)-[r:COOCCURS]-(other)
+WITH e, r.count AS n, other.name AS name
+ORDER BY n DESC, name
+WITH e, collect(name)[..$k] AS names, collect(n)[..$k] AS counts
+SET e.top_related = names, e.top_related_counts = counts
+"""
+
+SNAPSHOT_QUERY = """
+MATCH (e:Symptome)
+RETURN 'Symptome' AS label, e.name AS name, coalesce(e.doc_count, 0) AS doc_count,
+       coalesce(e.top_related, []) AS related, coalesce(e.top_related_counts, []) AS related_counts,
+       coalesce(e.aliases, []) AS aliases
+UNION ALL
+MATCH (e:Maladie)
+RETURN 'Maladie' AS label, e.name AS name, coalesce(e.doc_count, 0) AS doc_count,
+       coalesce(e.top_related, []) AS related, coalesce(e.top_related_counts, []) AS related_counts,
+       coalesce(e.aliases, []) AS aliases
+"""
+
+CONSULTATION_COUNT_QUERY = "MATCH (c:Consultation) RETURN count(c) AS cnt"
+
+PAIR_QUERY = """
+MATCH (:Symptome {name: $symptome})-[r:COOCCURS]->(:Maladie {name: $maladie})
+RETURN r.count AS count
+"""
+
+
+# ---------- Maintenance (ingestion) ----------
+def entity_ids(graph, symptomes, maladies):
+    if not symptomes and not maladies:
+        return []
+    rows = graph.query(ENTITY_IDS_QUERY, params={"symptomes": sorted(symptomes), "maladies": sorted(maladies)})
+    return [row["id"] for row in rows]
+
+
+def refresh_entity_stats(graph, ids, top_k=TOP_K):
+    """
+    Met à jour doc_count, COOCCURS et top_related pour les entités `ids`
+    (et le top-k de leurs partenaires, anciens et nouveaux). À appeler après
+    l'écriture des consultations et avant la suppression des orphelins.
+    """
+    ids = sorted(set(ids))
+    if not ids:
+        return 0
+    with span("ingestion.stats", entities=len(ids)):
+        rows = graph.query(DELETE_COOCCURRENCE_QUERY, params={"ids": ids})
+        partners = set(rows[0]["partners"]) if rows else set()
+        graph.query(DOC_COUNT_QUERY, params={"ids": ids})
+        rows = graph.query(COOCCURRENCE_QUERY, params={"ids": ids})
+        partners.update(rows[0]["partners"] if rows else [])
+        touched = sorted(partners | set(ids))
+        graph.query(TOP_RELATED_QUERY, params={"ids": touched, "k": top_k})
+    print(f"   📈 Statistiques mises à jour pour {len(ids)} entité(s) ({len(touched)} top-{top_k} recalculés).")
+    return len(touched)
+
+
+# ---------- Requêtes (agent) ----------
+class EntityStats:
+    """ Agrégats en mémoire, rechargés quand une ingestion a changé le graphe """
+
+    def __init__(self, graph, version_check_seconds=VERSION_CHECK_SECONDS):
+        self.graph = graph
+        self.version_check_seconds = version_check_seconds
+        self.version = None
+        self.version_checked_at = 0.0
+        self.local_bumps = ingestion_manifest.local_bumps  # Ingestions de ce processus déjà vues
+        self.loaded = False
+        self.total_consultations = 0
+        self.entities = {}   # (label, nom) -> {label, name, doc_count, related: [(nom, n)]}
+        self.by_term = {}    # clé canonique (nom ou alias) -> [(label, nom)]
+
+    def refresh(self, force=False):
+        now = time.monotonic()
+        force = force or ingestion_manifest.local_bumps != self.local_bumps
+        if not force and self.loaded and now - self.version_checked_at < self.version_check_seconds:
+            return
+        self.version_checked_at = now
+        self.local_bumps = ingestion_manifest.local_bumps
+        current = graph_version(self.graph)
+        if self.loaded and current == self.version:
+            return
+        with span("stats.load"):
+            rows = self.graph.query(SNAPSHOT_QUERY)
+            count = self.graph.query(CONSULTATION_COUNT_QUERY)
+        self.total_consultations = count[0]["cnt"] if count else 0
+        self.entities, self.by_term = {}, {}
+        for row in rows:
+            key = (row["label"], row["name"])
+            self.entities[key] = {
+                "label": row["label"], "name": row["name"], "doc_count": row["doc_count"],
+                "related": list(zip(row["related"], row["related_counts"])),
+            }
+            for term in {canonical_key(row["name"]), *row.get("aliases", [])}:
+                self.by_term.setdefault(term, []).append(key)
+        self.version, self.loaded = current, True
+
+    def resolve(self, name, label=None):
+        """ Entités correspondant à `name` (nom ou alias, sinon contenant le terme), par fréquence décroissante """
+        self.refresh()
+        term = canonical_key(name)
+        keys = self.by_term.get(term)
+        if not keys and term:
+            keys = list(dict.fromkeys(key for t, ks in self.by_term.items() if term in t for key in ks))
+        matches = [self.entities[key] for key in keys or [] if label is None or key[0] == label]
+        return sorted(matches, key=lambda e: (-e["doc_count"], e["name"]))
+
+    def entity(self, name, label=None):
+        matches = self.resolve(name, label)
+        return matches[0] if matches else None
+
+    def top(self, label, k=TOP_K):
+        """ Entités les plus fréquentes d'un type ('Symptome' ou 'Maladie') """
+        self.refresh()
+        ranked = sorted((e for e in self.entities.values() if e["label"] == label),
+                        key=lambda e: (-e["doc_count"], e["name"]))
+        return ranked[:k]
+
+    def cooccurrence(self, symptome, maladie):
+        """ Nombre de consultations mentionnant à la fois le symptôme et la maladie """
+        s, m = self.entity(symptome, "Symptome"), self.entity(maladie, "Maladie")
+        if s is None or m is None:
+            return 0
+        rows = self.graph.query(PAIR_QUERY, params={"symptome": s["name"], "maladie": m["name"]})
+        return rows[0]["count"] if rows else 0
+
+    def describe(self, name, k=5):
+        """ Résumé texte pour l'agent (fréquence + entités associées) """
+        kind = normalize_term(name.strip()).rstrip("s")
+        if kind in ("symptome", "maladie"):
+            label = "Symptome" if kind == "symptome" else "Maladie"
+            top = self.top(label, k)
+            lines = [f"- {e['name']} : {e['doc_count']} consultation(s)" for e in top]
+            return (f"{label}s les plus fréquents (sur {self.total_consultations} consultations) :\n"
+                    + "\n".join(lines)) if lines else f"Aucun {label.lower()} dans la base."
+        matches = self.resolve(name)
+        if not matches:
+            return f"Aucun symptôme ni maladie ne correspond à '{name}' dans la base."
+        parts = []
+        for e in matches[:3]:
+            other = "Maladies associées" if e["label"] == "Symptome" else "Symptômes associés"
+            related = ", ".join(f"{n} ({c})" for n, c in e["related"][:k]) or "aucun"
+            parts.append(f"{e['label']} '{e['name']}' : mentionné dans {e['doc_count']} consultation(s) "
+                         f"sur {self.total_consultations}. {other} : {related}.")
+        if len(matches) > 3:
+            parts.append(f"(+ {len(matches) - 3} autre(s) entité(s) contenant '{name}')")
+        return "\n".join(parts)
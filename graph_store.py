@@ -0,0 +1,757 @@
+import os
+import json
+import gzip
+import hashlib
+import time
+import shutil
+import argparse
+
+import numpy as np
+
+from graph_writer import UNWIND_WRITE_QUERY
+from ingestion_manifest import (
+    MANIFEST_QUERY, DETACH_ENTITIES_QUERY, DELETE_CHUNKS_QUERY, DELETE_CONSULTATIONS_QUERY,
+    PRUNE_ORPHANS_QUERY, GRAPH_VERSION_QUERY, BUMP_GRAPH_VERSION_QUERY, graph_version
+)
+from vector_index import SYNC_QUERIES, SYNC_FOR_QUERIES
+from graph_expansion import EDGES_QUERY, EDGES_FOR_QUERY
+from entity_canonicalizer import SAVE_ALIASES_QUERIES, MERGE_DUPLICATES_QUERIES
+from graph_stats import (
+    ENTITY_IDS_QUERY, DELETE_COOCCURRENCE_QUERY, DOC_COUNT_QUERY, COOCCURRENCE_QUERY,
+    TOP_RELATED_QUERY, SNAPSHOT_QUERY, PAIR_QUERY, CONSULTATION_COUNT_QUERY
+)
+from retrieval import (
+    VECTOR_SEARCH_QUERY, NEIGHBOURHOOD_QUERY, MULTI_VECTOR_SEARCH_QUERY, MULTI_NEIGHBOURHOOD_QUERY, CHUNK_SEARCH_QUERY, CHUNK_HITS_QUERY,
+    CHUNK_AGGREGATE_QUERY, MULTI_CHUNK_HITS_QUERY, MULTI_CHUNK_SEARCH_QUERY, MULTI_CHUNK_AGGREGATE_QUERY
+)
+
+# ==========================================
+# 👇 STOCKAGE DU GRAPHE : NEO4J OU EMBARQUÉ (EN PROCESSUS) 👇
+# ==========================================
+# Tout le code passe par graph.query(<constante Cypher>, params) : build_graph_rag,
+# search_passages / graph_rag_search et les outils de l'agent fonctionnent donc sur
+# deux implémentations :
+#   - "neo4j"    : Neo4jGraph (AuraDB), la référence, qui exécute n'importe quel Cypher,
+#   - "embedded" : EmbeddedGraph, modèle Consultation / Chunk / Symptome / Maladie en
+#                  mémoire, limité aux opérations nommées d'operation_queries() (une par
+#                  constante Cypher du projet, empreinte vérifiée au démarrage) ; sauvegardé
+#                  sur disque après chaque ingestion,
+#   - "replica"  : EmbeddedGraph en lecture seule chargé depuis un instantané exporté
+#                  de Neo4j (nœuds de requête à forte charge de lecture, sans AuraDB).
+# Instantané compact (dossier) : graph.json.gz (propriétés, liens, statistiques)
+# + consultation_vectors.npy / chunk_vectors.npy (float32, chargés en mmap).
+# Choix du backend : variable d'environnement GRAPH_BACKEND (neo4j par défaut).
+# Export : python graph_store.py export [--output DOSSIER]
+# Le Cypher libre généré par le LLM (statistiques_base_donnees) reste réservé à Neo4j :
+# CachedCypherQA refuse un graphe embarqué dès sa construction (supports_cypher).
+
+BACKENDS = ("neo4j", "embedded", "replica")
+DEFAULT_BACKEND = os.environ.get("GRAPH_BACKEND", "neo4j")
+STORE_DIR = os.environ.get(
+    "GRAPH_STORE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "graph_store"))
+FORMAT_VERSION = 1
+PAGE_SIZE = 1000
+SNAPSHOT_FILE = "graph.json.gz"
+VECTOR_FILES = {"Consultation": "consultation_vectors.npy", "Chunk": "chunk_vectors.npy"}
+
+EXPORT_CONSULTATIONS_QUERY = """
+MATCH (c:Consultation)
+RETURN c.filename AS filename, c.embedding AS embedding,
+       c {.*, embedding: null} AS properties
+ORDER BY filename
+SKIP $skip LIMIT $limit
+"""
+
+EXPORT_CHUNKS_QUERY = """
+MATCH (k:Chunk)-[:PARTIE_DE]->(c:Consultation)
+RETURN k.id AS id, c.filename AS consultation, k.text AS text, k.embedding AS embedding,
+       k.position AS position, k.turn_start AS turn_start, k.turn_end AS turn_end,
+       k.speakers AS speakers
+ORDER BY id
+SKIP $skip LIMIT $limit
+"""
+
+EXPORT_COOCCURS_QUERY = """
+MATCH (s:Symptome)-[r:COOCCURS]->(m:Maladie)
+RETURN s.name AS symptome, m.name AS maladie, r.count AS count
+"""
+
+# Empreinte du texte Cypher (normalisé) pour lequel chaque gestionnaire d'EmbeddedGraph a
+# été écrit. Modifier une requête du projet impose d'adapter son gestionnaire puis cette
+# table (python graph_store.py fingerprints) : sinon le graphe embarqué refuse de démarrer.
+OPERATION_FINGERPRINTS = {
+    "write": "673f393814db",
+    "manifest": "667ce47defa9",
+    "detach_entities": "32d3d26dda8a",
+    "delete_chunks": "ea0527642c1b",
+    "delete_consultations": "6a64454494b6",
+    "prune_orphans": "245265f3e3b0",
+    "graph_version": "54520a89f804",
+    "bump_graph_version": "a1d2aff3126c",
+    "entity_ids": "4a82c0d563d3",
+    "delete_cooccurrence": "25e2e1dbc1a2",
+    "doc_count": "c92ba7fce6f6",
+    "cooccurrence": "0fb1b508c91f",
+    "top_related": "f5afdfebd38e",
+    "entity_snapshot": "588ea78ff087",
+    "save_aliases:Symptome": "fba125b069e8",
+    "save_aliases:Maladie": "ce518920cba7",
+    "merge_duplicates:Symptome": "79c53b8aaca5",
+    "merge_duplicates:Maladie": "89130db344d2",
+    "pair": "92b63e3ce9a9",
+    "sync:Consultation": "2ed71a1deab7",
+    "sync:Chunk": "26adbdfed029",
+    "sync_for:Consultation": "8ae91b0782ce",
+    "sync_for:Chunk": "f3127ecd4bff",
+    "edges": "49d210250106",
+    "edges_for": "301d6587ae15",
+    "vector_search": "65b81f140794",
+    "neighbourhood": "eaf8833434a5",
+    "multi_vector_search": "dcadea4d20ea",
+    "multi_neighbourhood": "9a8dc0c4a097",
+    "chunk_search": "2fb476cce729",
+    "chunk_hits": "281e97d3e86b",
+    "multi_chunk_hits": "deec366e4c56",
+    "multi_chunk_search": "abf4338ff943",
+    "export_consultations": "024c632399b1",
+    "export_chunks": "0e6733dfaf33",
+    "export_cooccurs": "3a8ba8c63f71",
+    "clear": "fe663da50b2e",
+    "ping": "ecdae70c546c",
+    "consultation_count": "c12d7b5da985",
+}
+
+# Opérations qui modifient le graphe : refusées par une réplique en lecture seule
+WRITE_OPERATIONS = {
+    "write", "detach_entities", "delete_chunks", "delete_consultations", "prune_orphans",
+    "bump_graph_version", "delete_cooccurrence", "doc_count", "cooccurrence", "top_related", "clear",
+    "save_aliases:Symptome", "save_aliases:Maladie", "merge_duplicates:Symptome", "merge_duplicates:Maladie",
+}
+
+def _normalize_query(query):
+    return " ".join(query.split())
+
+
+def _fingerprint(query):
+    return hashlib.sha256(_normalize_query(query).encode("utf-8")).hexdigest()[:12]
+
+
+def operation_queries():
+    """ Opérations du graphe embarqué : nom -> requête Cypher du projet qu'elle implémente """
+    return {
+        "write": UNWIND_WRITE_QUERY,
+        "manifest": MANIFEST_QUERY,
+        "detach_entities": DETACH_ENTITIES_QUERY,
+        "delete_chunks": DELETE_CHUNKS_QUERY,
+        "delete_consultations": DELETE_CONSULTATIONS_QUERY,
+        "prune_orphans": PRUNE_ORPHANS_QUERY,
+        "graph_version": GRAPH_VERSION_QUERY,
+        "bump_graph_version": BUMP_GRAPH_VERSION_QUERY,
+        "entity_ids": ENTITY_IDS_QUERY,
+        "delete_cooccurrence": DELETE_COOCCURRENCE_QUERY,
+        "doc_count": DOC_COUNT_QUERY,
+        "cooccurrence": COOCCURRENCE_QUERY,
+        "top_related": TOP_RELATED_QUERY,
+        "entity_snapshot": SNAPSHOT_QUERY,
+        **{f"save_aliases:{label}": q for label, q in SAVE_ALIASES_QUERIES.items()},
+        **{f"merge_duplicates:{label}": q for label, q in MERGE_DUPLICATES_QUERIES.items()},
+        "pair": PAIR_QUERY,
+        **{f"sync:{label}": q for label, q in SYNC_QUERIES.items()},
+        **{f"sync_for:{label}": q for label, q in SYNC_FOR_QUERIES.items()},
+        "edges": EDGES_QUERY,
+        "edges_for": EDGES_FOR_QUERY,
+        "vector_search": VECTOR_SEARCH_QUERY,
+        "neighbourhood": NEIGHBOURHOOD_QUERY,
+        "multi_vector_search": MULTI_VECTOR_SEARCH_QUERY,
+        "multi_neighbourhood": MULTI_NEIGHBOURHOOD_QUERY,
+        "chunk_search": CHUNK_SEARCH_QUERY + CHUNK_AGGREGATE_QUERY,
+        "chunk_hits": CHUNK_HITS_QUERY + CHUNK_AGGREGATE_QUERY,
+        "multi_chunk_hits": MULTI_CHUNK_HITS_QUERY + MULTI_CHUNK_AGGREGATE_QUERY,
+        "multi_chunk_search": MULTI_CHUNK_SEARCH_QUERY + MULTI_CHUNK_AGGREGATE_QUERY,
+        "export_consultations": EXPORT_CONSULTATIONS_QUERY,
+        "export_chunks": EXPORT_CHUNKS_QUERY,
+        "export_cooccurs": EXPORT_COOCCURS_QUERY,
+        "clear": "MATCH (n) DETACH DELETE n",
+        "ping": "RETURN 1",
+        "consultation_count": CONSULTATION_COUNT_QUERY,
+    }
+
+
+def operation_dispatch():
+    """
+    Texte Cypher normalisé -> nom d'opération, après vérification des empreintes :
+    une constante modifiée sans adapter son gestionnaire lève RuntimeError ici
+    (jamais un ancien résultat renvoyé en silence).
+    """
+    queries = operation_queries()
+    changed = sorted(name for name, query in queries.items() if OPERATION_FINGERPRINTS.get(name) != _fingerprint(query))
+    if changed:
+        raise RuntimeError(
+            f"Requêtes modifiées sans adapter le graphe embarqué : {', '.join(changed)}. Mettre à jour les "
+            f"gestionnaires d'EmbeddedGraph, puis OPERATION_FINGERPRINTS (python graph_store.py fingerprints).")
+    return {_normalize_query(query): name for name, query in queries.items()}
+
+
+def supports_cypher(graph):
+    """ Cypher libre (généré par le LLM) exécutable ? Le graphe embarqué ne connaît que ses opérations """
+    return not isinstance(graph, EmbeddedGraph)
+
+
+def _cosine_scores(query, vectors):
+    """ Score sur l'échelle de db.index.vector.queryNodes : (1 + cos) / 2 """
+    matrix = np.asarray(vectors, dtype=np.float32)
+    q = np.asarray(query, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1) * (np.linalg.norm(q) or 1.0)
+    norms[norms == 0] = 1.0
+    return (1 + (matrix @ q) / norms) / 2
+
+
+class EmbeddedGraph:
+    """
+    Graphe en processus limité aux opérations nommées d'operation_queries() : chaque
+    constante Cypher du projet (graph_writer, ingestion_manifest, vector_index, graph_stats,
+    retrieval) est reconnue par son texte et servie par son gestionnaire.
+    Chaque appel à query() compte comme un aller-retour (`latency` : délai simulé, benchmarks).
+    Toute autre requête (Cypher libre) lève NotImplementedError plutôt que de renvoyer un
+    faux vide ; en lecture seule (réplique), une opération d'écriture lève PermissionError.
+    """
+
+    def __init__(self, latency=0.0, path=None, read_only=False):
+        self.latency = latency
+        self.path = path         # Dossier de sauvegarde (save / persist), None : mémoire seule
+        self.read_only = read_only
+        self.round_trips = 0
+        self.consultations = {}  # filename -> propriétés
+        self.entities = {"Symptome": set(), "Maladie": set()}
+        self.mentions = {}       # filename -> {"Symptome": set(noms), "Maladie": set(noms)}
+        self.chunks = {}         # id -> propriétés (+ "consultation")
+        self.meta = {}           # GraphMeta : clé -> propriétés
+        self.stats = {}          # "Label:nom" -> doc_count, top_related, top_related_counts
+        self.cooccurs = {}       # (symptôme, maladie) -> count (relations COOCCURS)
+        self._matrices = {}      # label -> (ids, matrice float32), vidé à chaque écriture
+        self.handlers = {
+            "write": self._write,
+            "manifest": self._manifest,
+            "detach_entities": self._detach_entities,
+            "delete_chunks": self._delete_chunks,
+            "delete_consultations": self._delete_consultations,
+            "prune_orphans": self._prune_orphans,
+            "graph_version": lambda p: [{"version": self.meta.get("ingestion", {}).get("version")}],
+            "bump_graph_version": lambda p: self.meta.__setitem__("ingestion", {"version": p["version"]}) or [],
+            "entity_ids": self._entity_ids,
+            "delete_cooccurrence": self._delete_cooccurrence,
+            "doc_count": self._doc_count,
+            "cooccurrence": self._cooccurrence,
+            "top_related": self._top_related,
+            "entity_snapshot": self._snapshot,
+            "save_aliases:Symptome": lambda p: self._save_aliases("Symptome", p),
+            "save_aliases:Maladie": lambda p: self._save_aliases("Maladie", p),
+            "merge_duplicates:Symptome": lambda p: self._merge_duplicates("Symptome", p),
+            "merge_duplicates:Maladie": lambda p: self._merge_duplicates("Maladie", p),
+            "pair": lambda p: [{"count": n} for n in [self.cooccurs.get((p["symptome"], p["maladie"]))] if n],
+            "sync:Consultation": lambda p: self._sync("Consultation", p),
+            "sync:Chunk": lambda p: self._sync("Chunk", p),
+            "sync_for:Consultation": lambda p: self._sync_for("Consultation", p),
+            "sync_for:Chunk": lambda p: self._sync_for("Chunk", p),
+            "edges": self._edges,
+            "edges_for": lambda p: [self._edge_row(f) for f in p["filenames"] if f in self.consultations],
+            "vector_search": self._vector_search,
+            "neighbourhood": self._neighbourhood,
+            "multi_vector_search": self._multi_vector_search,
+            "multi_neighbourhood": self._multi_neighbourhood,
+            "chunk_search": self._chunk_search,
+            "chunk_hits": self._chunk_hits,
+            "multi_chunk_hits": self._multi_chunk_hits,
+            "multi_chunk_search": self._multi_chunk_search,
+            "export_consultations": self._export_consultations,
+            "export_chunks": self._export_chunks,
+            "export_cooccurs":
+                lambda p: [{"symptome": s, "maladie": m, "count": n} for (s, m), n in sorted(self.cooccurs.items())],
+            "clear": self._clear,
+            "ping": lambda p: [{"1": 1}],
+            "consultation_count": lambda p: [{"cnt": len(self.consultations)}],
+        }
+        self.dispatch = operation_dispatch()
+
+    def query(self, query, params=None):
+        self.round_trips += 1
+        time.sleep(self.latency)
+        text = _normalize_query(query)
+        if text.startswith(("CREATE CONSTRAINT", "CREATE VECTOR INDEX", "DROP INDEX")):
+            return []
+        name = self.dispatch.get(text)
+        if name is None:
+            raise NotImplementedError(f"Requête non prise en charge par le graphe embarqué "
+                                      f"(seules les opérations de OPERATION_FINGERPRINTS le sont) : {text[:80]}...")
+        if name in WRITE_OPERATIONS:
+            if self.read_only:
+                raise PermissionError("Réplique locale du graphe en lecture seule : écrire dans Neo4j puis réexporter.")
+            self._matrices.clear()
+        return self.handlers[name](params or {})
+
+    # ---------- Schéma (interface Neo4jGraph) ----------
+    def refresh_schema(self):
+        pass
+
+    @property
+    def get_structured_schema(self):
+        """ Schéma statique du modèle (propriétés des consultations présentes comprises) """
+        keys = sorted({k for c in self.consultations.values() for k in c} - {"embedding"}) or ["filename"]
+        string = lambda names: [{"property": n, "type": "STRING"} for n in names]
+        return {
+            "node_props": {"Consultation": string(keys), "Symptome": string(["name"]),
+                           "Maladie": string(["name"])},
+            "rel_props": {},
+            "relationships": [
+                {"start": "Consultation", "type": "MENTIONNE_SYMPTOME", "end": "Symptome"},
+                {"start": "Consultation", "type": "MENTIONNE_MALADIE", "end": "Maladie"},
+                {"start": "Symptome", "type": "COOCCURS", "end": "Maladie"},
+            ],
+            "metadata": {"constraint": [], "index": []},
+        }
+
+    # ---------- Écriture ----------
+    def _clear(self, params):
+        self.consultations.clear()
+        self.mentions.clear()
+        self.chunks.clear()
+        self.meta.clear()
+        self.stats.clear()
+        self.cooccurs.clear()
+        for names in self.entities.values():
+            names.clear()
+        return []
+
+    def _write(self, params):
+        for row in params["rows"]:
+            c = self.consultations.setdefault(row["filename"], {"filename": row["filename"]})
+            c.update(content=row["content"], embedding=row["embedding"])
+            for key, value in (row.get("properties") or {}).items():
+                if value is None:
+                    c.pop(key, None)  # SET c += {key: null} supprime la propriété
+                else:
+                    c[key] = value
+            links = self.mentions.setdefault(row["filename"], {"Symptome": set(), "Maladie": set()})
+            for label, key in (("Symptome", "symptomes"), ("Maladie", "maladies")):
+                for name in row[key]:
+                    self.entities[label].add(name.lower())
+                    links[label].add(name.lower())
+            for chunk in row.get("chunks") or []:
+                self.chunks[chunk["id"]] = {
+                    "id": chunk["id"], "text": chunk["text"], "embedding": chunk["embedding"],
+                    "position": chunk["index"], "turn_start": chunk["turn_start"],
+                    "turn_end": chunk["turn_end"], "speakers": chunk["speakers"],
+                    "consultation": row["filename"],
+                }
+        return []
+
+    def _manifest(self, params):
+        keys = ("content_hash", "extractor_version", "embedding_model", "chunker_version")
+        return [dict({"filename": f}, **{k: c.get(k) for k in keys}) for f, c in self.consultations.items()]
+
+    def _detach_entities(self, params):
+        ids = set()
+        for f in params["filenames"]:
+            links = self.mentions.pop(f, None)
+            if links and f in self.consultations:
+                ids.update(f"{label}:{name}" for label, names in links.items() for name in names)
+        return [{"ids": sorted(ids)}]
+
+    def _delete_chunks(self, params):
+        filenames = set(params["filenames"])
+        for chunk_key in [k for k, v in self.chunks.items() if v["consultation"] in filenames]:
+            del self.chunks[chunk_key]
+        return []
+
+    def _delete_consultations(self, params):
+        for f in params["filenames"]:
+            self.consultations.pop(f, None)
+            self.mentions.pop(f, None)
+        return []
+
+    def _prune_orphans(self, params):
+        linked = {(label, name) for links in self.mentions.values()
+                  for label, names in links.items() for name in names}
+        deleted = 0
+        for element_id in params["ids"]:
+            label, name = element_id.split(":", 1)
+            if name in self.entities.get(label, ()) and (label, name) not in linked:
+                self.entities[label].discard(name)
+                self.stats.pop(element_id, None)
+                deleted += 1
+        return [{"deleted": deleted}]
+
+    # ---------- Statistiques (graph_stats) ----------
+    def _entity_ids(self, params):
+        return [{"id": f"{label}:{name.lower()}"}
+                for label, key in (("Symptome", "symptomes"), ("Maladie", "maladies"))
+                for name in params[key] if name.lower() in self.entities[label]]
+
+    def _delete_cooccurrence(self, params):
+        ids, partners = set(params["ids"]), set()
+        for pair in list(self.cooccurs):
+            s, m = f"Symptome:{pair[0]}", f"Maladie:{pair[1]}"
+            if s in ids or m in ids:
+                del self.cooccurs[pair]
+                partners.update((s, m))
+        return [{"partners": sorted(partners)}]
+
+    def _doc_count(self, params):
+        for element_id in params["ids"]:
+            label, name = element_id.split(":", 1)
+            count = sum(name in links[label] for links in self.mentions.values())
+            self.stats.setdefault(element_id, {})["doc_count"] = count
+        return []
+
+    def _cooccurrence(self, params):
+        ids, touched = set(params["ids"]), set()
+        counts = {}
+        for links in self.mentions.values():
+            for s in links["Symptome"]:
+                for m in links["Maladie"]:
+                    if f"Symptome:{s}" in ids or f"Maladie:{m}" in ids:
+                        counts[(s, m)] = counts.get((s, m), 0) + 1
+        for (s, m), n in counts.items():
+            self.cooccurs[(s, m)] = n
+            touched.update({f"Symptome:{s}", f"Maladie:{m}"})
+        return [{"partners": sorted(touched)}]
+
+    def _top_related(self, params):
+        for element_id in params["ids"]:
+            label, name = element_id.split(":", 1)
+            if name not in self.entities.get(label, ()):
+                continue
+            side = 0 if label == "Symptome" else 1
+            related = sorted(((pair[1 - side], n) for pair, n in self.cooccurs.items() if pair[side] == name),
+                             key=lambda item: (-item[1], item[0]))[:params["k"]]
+            stats = self.stats.setdefault(element_id, {})
+            stats["top_related"] = [r[0] for r in related]
+            stats["top_related_counts"] = [r[1] for r in related]
+        return []
+
+    def _add_aliases(self, element_id, aliases):
+        stats = self.stats.setdefault(element_id, {})
+        stats["aliases"] = list(dict.fromkeys(stats.get("aliases", []) + list(aliases)))
+
+    def _save_aliases(self, label, params):
+        for row in params["rows"]:
+            if row["name"] in self.entities[label]:
+                self._add_aliases(f"{label}:{row['name']}", row["aliases"])
+        return []
+
+    def _merge_duplicates(self, label, params):
+        ids, merged = [], 0
+        for row in params["rows"]:
+            canonical, duplicate = row["canonical"], row["duplicate"]
+            if duplicate not in self.entities[label]:
+                continue
+            self.entities[label].add(canonical)  # MERGE : nom canonique issu de SEED_ALIASES
+            merged += 1
+            for links in self.mentions.values():
+                if duplicate in links[label]:
+                    links[label].discard(duplicate)
+                    links[label].add(canonical)
+            old = self.stats.pop(f"{label}:{duplicate}", {})
+            self._add_aliases(f"{label}:{canonical}", row["aliases"] + old.get("aliases", []))
+            side = 0 if label == "Symptome" else 1
+            for pair in [p for p in self.cooccurs if p[side] == duplicate]:
+                del self.cooccurs[pair]
+            self.entities[label].discard(duplicate)
+            ids.append(f"{label}:{canonical}")
+        return [{"ids": sorted(set(ids)), "merged": merged}]
+
+    def _snapshot(self, params):
+        rows = []
+        for label in ("Symptome", "Maladie"):
+            for name in sorted(self.entities[label]):
+                stats = self.stats.get(f"{label}:{name}", {})
+                rows.append({"label": label, "name": name, "doc_count": stats.get("doc_count", 0),
+                             "related": stats.get("top_related", []),
+                             "related_counts": stats.get("top_related_counts", []),
+                             "aliases": stats.get("aliases", [])})
+        return rows
+
+    # ---------- Lecture ----------
+    def _sync(self, label, params):
+        if label == "Consultation":
+            rows = [{"id": f, "embedding": c["embedding"]} for f, c in sorted(self.consultations.items())
+                    if c.get("embedding") is not None]
+        else:
+            rows = [{"id": i, "embedding": k["embedding"]} for i, k in sorted(self.chunks.items())
+                    if k.get("embedding") is not None]
+        return rows[params["skip"]:params["skip"] + params["limit"]]
+
+    def _sync_for(self, label, params):
+        filenames = set(params["filenames"])
+        if label == "Consultation":
+            return [{"id": f, "embedding": self.consultations[f]["embedding"]} for f in params["filenames"]
+                    if f in self.consultations and self.consultations[f].get("embedding") is not None]
+        return [{"id": i, "embedding": k["embedding"]} for i, k in sorted(self.chunks.items())
+                if k["consultation"] in filenames and k["consultation"] in self.consultations
+                and k.get("embedding") is not None]
+
+    def _export_consultations(self, params):
+        rows = [{"filename": f, "embedding": c.get("embedding"),
+                 "properties": dict({k: v for k, v in c.items() if k != "embedding"}, embedding=None)}
+                for f, c in sorted(self.consultations.items())]
+        return rows[params["skip"]:params["skip"] + params["limit"]]
+
+    def _export_chunks(self, params):
+        keys = ("id", "consultation", "text", "embedding", "position", "turn_start", "turn_end", "speakers")
+        rows = [{key: k.get(key) for key in keys} for _, k in sorted(self.chunks.items())
+                if k["consultation"] in self.consultations]
+        return rows[params["skip"]:params["skip"] + params["limit"]]
+
+    def _edge_row(self, filename):
+        links = self.mentions.get(filename, {})
+        return {"filename": filename,
+                "entities": [f"{label}:{name}" for label in ("Symptome", "Maladie")
+                             for name in sorted(links.get(label, ()))]}
+
+    def _edges(self, params):
+        rows = [self._edge_row(f) for f in sorted(self.consultations)]
+        return rows[params["skip"]:params["skip"] + params["limit"]]
+
+    def _entities_of(self, filename):
+        links = self.mentions.get(filename, {})
+        return sorted(links.get("Symptome", ())), sorted(links.get("Maladie", ()))
+
+    def _consultation_row(self, filename, score, **extra):
+        symptomes, maladies = self._entities_of(filename)
+        return dict({"filename": filename, "symptomes": symptomes, "maladies": maladies,
+                     "score": score}, **extra)
+
+    def _vectors(self, label):
+        """ (ids, matrice float32) des nœuds vectorisés, reconstruite seulement après une écriture """
+        if label not in self._matrices:
+            nodes = self.consultations if label == "Consultation" else self.chunks
+            items = [(key, node["embedding"]) for key, node in nodes.items() if node.get("embedding") is not None]
+            matrix = np.asarray([v for _, v in items], dtype=np.float32) if items else None
+            self._matrices[label] = ([key for key, _ in items], matrix)
+        return self._matrices[label]
+
+    def _vector_search(self, params):
+        ids, matrix = self._vectors("Consultation")
+        if not ids:
+            return []
+        scores = _cosine_scores(params["embedding"], matrix)
+        top = np.argsort(-scores)[:params["k"]]
+        return [self._consultation_row(ids[i], float(scores[i]), content=self.consultations[ids[i]]["content"])
+                for i in top]
+
+    def _neighbourhood(self, params):
+        rows = [self._consultation_row(hit["filename"], hit["score"],
+                                       content=self.consultations[hit["filename"]]["content"])
+                for hit in params["hits"] if hit["filename"] in self.consultations]
+        return sorted(rows, key=lambda r: -r["score"])
+
+    def _multi_vector_search(self, params):
+        return [dict(row, question=question["index"]) for question in params["questions"]
+                for row in self._vector_search(dict(params, embedding=question["embedding"]))]
+
+    def _multi_neighbourhood(self, params):
+        return [dict(row, question=question["index"]) for question in params["questions"]
+                for row in self._neighbourhood({"hits": question["hits"]})]
+
+    def _aggregate_chunks(self, hits, k):
+        groups = {}
+        for chunk_key, score in hits:
+            chunk = self.chunks.get(chunk_key)
+            if chunk is None or chunk["consultation"] not in self.consultations:
+                continue
+            group = groups.setdefault(chunk["consultation"], {"score": score, "passages": []})
+            group["score"] = max(group["score"], score)
+            group["passages"].append({"text": chunk["text"], "score": score, "position": chunk["position"]})
+        ranked = sorted(groups.items(), key=lambda item: -item[1]["score"])[:k]
+        return [self._consultation_row(f, g["score"], passages=g["passages"]) for f, g in ranked]
+
+    def _chunk_search(self, params):
+        ids, matrix = self._vectors("Chunk")
+        if not ids:
+            return []
+        scores = _cosine_scores(params["embedding"], matrix)
+        top = np.argsort(-scores)[:params["chunk_k"]]
+        return self._aggregate_chunks([(ids[i], float(scores[i])) for i in top], params["k"])
+
+    def _chunk_hits(self, params):
+        return self._aggregate_chunks([(hit["id"], hit["score"]) for hit in params["hits"]], params["k"])
+
+    def _project(self, question, rows, params):
+        """ Colonnes de MULTI_CHUNK_AGGREGATE_QUERY : propriétés demandées, entités optionnelles """
+        for row in rows:
+            c = self.consultations[row["filename"]]
+            row["question"] = question["index"]
+            row["properties"] = [c.get(key) for key in params["properties"]]
+            if not params["entities"]:
+                row["symptomes"], row["maladies"] = [], []
+        return rows
+
+    def _multi_chunk_hits(self, params):
+        return [row for question in params["questions"]
+                for row in self._project(question, self._chunk_hits(dict(params, hits=question["hits"])), params)]
+
+    def _multi_chunk_search(self, params):
+        return [row for question in params["questions"]
+                for row in self._project(question, self._chunk_search(dict(params, embedding=question["embedding"])),
+                                         params)]
+
+    # ---------- Instantané disque ----------
+    def save(self, path=None):
+        """ Sauvegarde dans `path` (par défaut le dossier d'origine du graphe) """
+        return export_snapshot(self, path or self.path)
+
+    @classmethod
+    def load(cls, path=STORE_DIR, read_only=False):
+        """ Recharge un instantané (export_snapshot) : état restauré tel quel, sans recalcul """
+        start = time.perf_counter()
+        with gzip.open(os.path.join(path, SNAPSHOT_FILE), "rt", encoding="utf-8") as f:
+            data = json.load(f)
+        if data.get("format") != FORMAT_VERSION:
+            raise ValueError(f"Format d'instantané inconnu dans {path} : {data.get('format')}")
+        vectors = {label: np.load(os.path.join(path, filename), mmap_mode="r")
+                   for label, filename in VECTOR_FILES.items()}
+        graph = cls(path=path, read_only=read_only)
+        for row in data["consultations"]:
+            c = {k: v for k, v in row["properties"].items() if v is not None}
+            if row["vector"] is not None:
+                c["embedding"] = vectors["Consultation"][row["vector"]]
+            graph.consultations[row["properties"]["filename"]] = c
+        for row in data["chunks"]:
+            k = {key: value for key, value in row.items() if key != "vector"}
+            if row["vector"] is not None:
+                k["embedding"] = vectors["Chunk"][row["vector"]]
+            graph.chunks[k["id"]] = k
+        for filename, entities in data["mentions"].items():
+            links = graph.mentions.setdefault(filename, {"Symptome": set(), "Maladie": set()})
+            for element_id in entities:
+                label, name = element_id.split(":", 1)
+                links[label].add(name)
+                graph.entities[label].add(name)
+        for row in data["entities"]:
+            graph.entities[row["label"]].add(row["name"])
+            graph.stats[f"{row['label']}:{row['name']}"] = {
+                "doc_count": row["doc_count"], "top_related": row["related"],
+                "top_related_counts": row["related_counts"], "aliases": row["aliases"]}
+        graph.cooccurs = {(s, m): n for s, m, n in data["cooccurs"]}
+        if data.get("version") is not None:
+            graph.meta["ingestion"] = {"version": data["version"]}
+        mode = "lecture seule" if read_only else "lecture / écriture"
+        print(f"📦 Graphe embarqué chargé ({mode}) : {len(graph.consultations)} consultations, "
+              f"{len(graph.chunks)} chunks en {time.perf_counter() - start:.2f}s.")
+        return graph
+
+
+def _paged(graph, query, page_size):
+    skip = 0
+    while True:
+        rows = graph.query(query, params={"skip": skip, "limit": page_size})
+        yield from rows
+        if len(rows) < page_size:
+            break
+        skip += page_size
+
+
+def _vector_row(vectors, embedding):
+    """ Ajoute le vecteur à la liste et renvoie sa ligne (None : nœud sans embedding) """
+    if embedding is None:
+        return None
+    vectors.append(np.asarray(embedding, dtype=np.float32))
+    return len(vectors) - 1
+
+
+def export_snapshot(graph, path=STORE_DIR, page_size=PAGE_SIZE):
+    """
+    Instantané compact de `graph` (Neo4j ou embarqué), lu par pages avec les mêmes
+    requêtes que la synchronisation : écrit dans un dossier temporaire puis renommé.
+    """
+    start = time.perf_counter()
+    vectors = {label: [] for label in VECTOR_FILES}
+    consultations = [{"properties": row["properties"], "vector": _vector_row(vectors["Consultation"], row["embedding"])}
+                     for row in _paged(graph, EXPORT_CONSULTATIONS_QUERY, page_size)]
+    chunks = [dict({k: v for k, v in row.items() if k != "embedding"},
+                   vector=_vector_row(vectors["Chunk"], row["embedding"]))
+              for row in _paged(graph, EXPORT_CHUNKS_QUERY, page_size)]
+    data = {
+        "format": FORMAT_VERSION,
+        "version": graph_version(graph),
+        "consultations": consultations,
+        "chunks": chunks,
+        "mentions": {row["filename"]: row["entities"] for row in _paged(graph, EDGES_QUERY, page_size)},
+        "entities": graph.query(SNAPSHOT_QUERY),
+        "cooccurs": [[row["symptome"], row["maladie"], row["count"]] for row in graph.query(EXPORT_COOCCURS_QUERY)],
+    }
+
+    tmp = path + ".tmp"
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+    with gzip.open(os.path.join(tmp, SNAPSHOT_FILE), "wt", encoding="utf-8", compresslevel=6) as f:
+        json.dump(data, f, ensure_ascii=False, default=str)
+    for label, filename in VECTOR_FILES.items():
+        matrix = np.stack(vectors[label]) if vectors[label] else np.zeros((0, 0), dtype=np.float32)
+        np.save(os.path.join(tmp, filename), matrix)
+    shutil.rmtree(path, ignore_errors=True)
+    os.replace(tmp, path)
+
+    size = sum(os.path.getsize(os.path.join(path, f)) for f in os.listdir(path))
+    print(f"✅ Instantané du graphe écrit : {len(consultations)} consultations, {len(chunks)} chunks, "
+          f"{len(data['entities'])} entités ({size / 1e6:.1f} Mo) en {time.perf_counter() - start:.2f}s.")
+    return path
+
+
+def snapshot_exists(path=STORE_DIR):
+    return os.path.exists(os.path.join(path, SNAPSHOT_FILE))
+
+
+def open_graph(backend=DEFAULT_BACKEND, path=STORE_DIR):
+    """ Graphe du backend demandé (voir BACKENDS) """
+    if backend not in BACKENDS:
+        raise ValueError(f"Backend de graphe inconnu : {backend} (attendu : {', '.join(BACKENDS)})")
+    if backend == "neo4j":
+        from langchain_community.graphs import Neo4jGraph
+        return Neo4jGraph(refresh_schema=False)
+    if snapshot_exists(path):
+        return EmbeddedGraph.load(path, read_only=backend == "replica")
+    if backend == "replica":
+        raise FileNotFoundError(f"Aucun instantané du graphe dans {path} : lancer `python graph_store.py export`.")
+    print(f"📦 Graphe embarqué vide (sauvegardé dans {path} après l'ingestion).")
+    return EmbeddedGraph(path=path)
+
+
+def persist(graph):
+    """ Après une écriture : sauvegarde du graphe embarqué (sans effet sur Neo4j ou une réplique) """
+    if isinstance(graph, EmbeddedGraph) and graph.path and not graph.read_only:
+        graph.save()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Instantané local du graphe (export Neo4j -> disque)")
+    sub = parser.add_subparsers(dest="command", required=True)
+    export = sub.add_parser("export", help="Exporte le graphe Neo4j dans un dossier local")
+    export.add_argument("--output", default=STORE_DIR)
+    export.add_argument("--page-size", type=int, default=PAGE_SIZE)
+    info = sub.add_parser("info", help="Charge un instantané et affiche son contenu")
+    info.add_argument("--path", default=STORE_DIR)
+    sub.add_parser("fingerprints", help="Affiche les empreintes des requêtes (OPERATION_FINGERPRINTS)")
+    args = parser.parse_args()
+
+    if args.command == "fingerprints":
+        for name, query in operation_queries().items():
+            mark = "" if OPERATION_FINGERPRINTS.get(name) == _fingerprint(query) else "  # modifiée"
+            print(f'    "{name}": "{_fingerprint(query)}",{mark}')
+        return
+
+    if args.command == "export":
+        export_snapshot(open_graph("neo4j"), args.output, args.page_size)
+        path = args.output
+    else:
+        path = args.path
+    if not snapshot_exists(path):
+        print(f"❌ Aucun instantané du graphe dans {path}.")
+        return
+    graph = EmbeddedGraph.load(path, read_only=True)
+    print(f"   {len(graph.entities['Symptome'])} symptômes, {len(graph.entities['Maladie'])} maladies, "
+          f"{len(graph.cooccurs)} cooccurrences, version {graph_version(graph)}.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+import time
+
+from tracing import span
+
+# ==========================================
+# 👇 ÉCRITURE GROUPÉE DANS NEO4J (UNWIND) 👇
+# ==========================================
+# Au lieu d'un aller-retour réseau par Consultation, par Symptôme et par Maladie,
+# on accumule les lignes en mémoire puis on les envoie par lots avec UNWIND $rows.
+# Une requête = une transaction = un seul aller-retour vers AuraDB par lot.
+
+DEFAULT_BATCH_SIZE = 200
+
+CONSTRAINTS = [
+    "CREATE CONSTRAINT consultation_filename IF NOT EXISTS FOR (c:Consultation) REQUIRE c.filename IS UNIQUE",
+    "CREATE CONSTRAINT symptome_name IF NOT EXISTS FOR (s:Symptome) REQUIRE s.name IS UNIQUE",
+    "CREATE CONSTRAINT maladie_name IF NOT EXISTS FOR (m:Maladie) REQUIRE m.name IS UNIQUE",
+    "CREATE CONSTRAINT chunk_id IF NOT EXISTS FOR (k:Chunk) REQUIRE k.id IS UNIQUE",
+]
+
+UNWIND_WRITE_QUERY = """
+UNWIND $rows AS row
+MERGE (c:Consultation {filename: row.filename})
+SET c.content = row.content,
+    c.embedding = row.embedding,
+    c += row.properties
+FOREACH (name IN row.symptomes |
+    MERGE (s:Symptome {name: toLower(name)})
+    MERGE (c)-[:MENTIONNE_SYMPTOME]->(s)
+)
+FOREACH (name IN row.maladies |
+    MERGE (m:Maladie {name: toLower(name)})
+    MERGE (c)-[:MENTIONNE_MALADIE]->(m)
+)
+FOREACH (chunk IN row.chunks |
+    MERGE (k:Chunk {id: chunk.id})
+    SET k.text = chunk.text,
+        k.embedding = chunk.embedding,
+        k.position = chunk.index,
+        k.turn_start = chunk.turn_start,
+        k.turn_end = chunk.turn_end,
+        k.speakers = chunk.speakers
+    MERGE (k)-[:PARTIE_DE]->(c)
+)
+"""
+
+
+VECTOR_INDEX_QUERIES = {
+    "consultation_vector": """
+        CREATE VECTOR INDEX consultation_vector IF NOT EXISTS
+        FOR (c:Consultation)
+        ON (c.embedding)
+        OPTIONS {indexConfig: {
+          `vector.dimensions`: 384,
+          `vector.similarity_function`: 'cosine'
+        }}
+    """,
+    "chunk_vector": """
+        CREATE VECTOR INDEX chunk_vector IF NOT EXISTS
+        FOR (k:Chunk)
+        ON (k.embedding)
+        OPTIONS {indexConfig: {
+          `vector.dimensions`: 384,
+          `vector.similarity_function`: 'cosine'
+        }}
+    """,
+}
+
+
+def setup_vector_index(graph, drop=False):
+    """ Crée les index vectoriels (384 dimensions = MiniLM), en supprimant les anciens si `drop` """
+    for name, query in VECTOR_INDEX_QUERIES.items():
+        try:
+            if drop:
+                graph.query(f"DROP INDEX {name} IF EXISTS")
+            graph.query(query)
+        except Exception as e:
+            print(f"⚠️ Info Index {name}: {e}")
+    print("✅ Index Vectoriels (consultations + chunks) créés dans Neo4j.")
+
+
+def setup_constraints(graph):
+    """ Crée les contraintes d'unicité pour que les MERGE utilisent un index """
+    for statement in CONSTRAINTS:
+        try:
+            graph.query(statement)
+        except Exception as e:
+            print(f"⚠️ Info Contrainte: {e}")
+    print("✅ Contraintes d'unicité en place (Consultation, Symptome, Maladie).")
+
+
+class GraphBatchWriter:
+    """ Accumule consultations + entités et les écrit par lots avec UNWIND """
+
+    def __init__(self, graph, batch_size=DEFAULT_BATCH_SIZE):
+        self.graph = graph
+        self.batch_size = batch_size
+        self.rows = []
+        # Statistiques pour le rapport lignes/seconde
+        self.rows_written = 0
+        self.entities_written = 0
+        self.batches = 0
+        self.write_seconds = 0.0
+
+    def add(self, filename, content, embedding, entities, properties=None, chunks=None):
+        """ Ajoute une consultation (avec ses entités et ses chunks) au lot courant """
+        self.rows.append({
+            "filename": filename,
+            "content": content,
+            "embedding": embedding,
+            "properties": properties or {},
+            "chunks": chunks or [],
+            "symptomes": [s for s in entities.get("symptomes", []) if isinstance(s, str) and s.strip()],
+            "maladies": [m for m in entities.get("maladies", []) if isinstance(m, str) and m.strip()],
+        })
+        if len(self.rows) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """ Envoie le lot courant en une seule transaction """
+        if not self.rows:
+            return
+        rows, self.rows = self.rows, []
+        start = time.perf_counter()
+        with span("neo4j.write_batch", rows=len(rows)):
+            self.graph.query(UNWIND_WRITE_QUERY, params={"rows": rows})
+        self.write_seconds += time.perf_counter() - start
+        self.batches += 1
+        self.rows_written += len(rows)
+        self.entities_written += sum(len(r["symptomes"]) + len(r["maladies"]) for r in rows)
+
+    def close(self):
+        """ Vide le dernier lot et affiche le débit """
+        self.flush()
+        self.report()
+
+    def rows_per_second(self):
+        if self.write_seconds == 0:
+            return 0.0
+        return self.rows_written / self.write_seconds
+
+    def report(self):
+        print(
+            f"   📊 Écriture Neo4j : {self.rows_written} consultations, "
+            f"{self.entities_written} entités en {self.batches} lot(s), "
+            f"{self.write_seconds:.2f}s ({self.rows_per_second():.1f} lignes/s)"
+        )
@@ -0,0 +1,149 @@
+import time
+import hashlib
+
+# ==========================================
+# 👇 INGESTION INCRÉMENTALE (MANIFESTE) 👇
+# ==========================================
+# Chaque Consultation porte son empreinte (content_hash), la version de l'extracteur,
+# le nom du modèle d'embedding et la version du découpage en chunks. On compare avec
+# les fichiers sur disque pour ne traiter que les nouveaux / modifiés, et supprimer
+# ceux qui ont disparu.
+
+MANIFEST_QUERY = """
+MATCH (c:Consultation)
+RETURN c.filename AS filename,
+       c.content_hash AS content_hash,
+       c.extractor_version AS extractor_version,
+       c.embedding_model AS embedding_model,
+       c.chunker_version AS chunker_version
+"""
+
+# Retire les liens d'entités des consultations modifiées/supprimées
+# et renvoie les entités concernées (candidates à devenir orphelines)
+DETACH_ENTITIES_QUERY = """
+UNWIND $filenames AS f
+MATCH (:Consultation {filename: f})-[r:MENTIONNE_SYMPTOME|MENTIONNE_MALADIE]->(e)
+DELETE r
+RETURN collect(DISTINCT elementId(e)) AS ids
+"""
+
+# Les chunks sont toujours recalculés pour un fichier modifié
+DELETE_CHUNKS_QUERY = """
+UNWIND $filenames AS f
+MATCH (:Consultation {filename: f})<-[:PARTIE_DE]-(k:Chunk)
+DETACH DELETE k
+"""
+
+DELETE_CONSULTATIONS_QUERY = """
+UNWIND $filenames AS f
+MATCH (c:Consultation {filename: f})
+DETACH DELETE c
+"""
+
+PRUNE_ORPHANS_QUERY = """
+UNWIND $ids AS id
+MATCH (e) WHERE elementId(e) = id AND (e:Symptome OR e:Maladie) AND NOT (e)--()
+DELETE e
+RETURN count(e) AS deleted
+"""
+
+# Version globale du graphe : changée par chaque ingestion qui modifie quelque chose.
+# Les caches côté requêtes (Cypher généré, schéma) se comparent à elle.
+GRAPH_VERSION_QUERY = """
+OPTIONAL MATCH (m:GraphMeta {key: 'ingestion'})
+RETURN m.version AS version
+"""
+
+BUMP_GRAPH_VERSION_QUERY = """
+MERGE (m:GraphMeta {key: 'ingestion'})
+SET m.version = $version, m.updated_at = timestamp()
+"""
+
+
+def content_hash(content):
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+def fetch_manifest(graph):
+    """ {filename: {content_hash, extractor_version, embedding_model, chunker_version}} """
+    return {row["filename"]: row for row in graph.query(MANIFEST_QUERY)}
+
+
+def is_unchanged(known, content, expected):
+    """ Entrée du manifeste (ou None) identique au contenu et aux versions attendues ? """
+    return (known is not None
+            and known.get("content_hash") == content_hash(content)
+            and all(known.get(key) == value for key, value in expected.items()))
+
+
+def deleted_files(manifest, seen):
+    """ Consultations du manifeste dont le fichier n'a pas été vu sur disque """
+    return [f for f in manifest if f not in seen]
+
+
+def plan_changes(manifest, documents, expected):
+    """
+    `documents` : {filename: content} ; `expected` : propriétés de version attendues
+    (voir manifest_properties, sans content_hash).
+    Retourne (à_traiter, inchangés, supprimés) sous forme de listes de noms de fichiers.
+    L'ingestion en flux applique is_unchanged document par document, puis deleted_files.
+    """
+    to_process, unchanged = [], []
+    for filename, content in documents.items():
+        if is_unchanged(manifest.get(filename), content, expected):
+            unchanged.append(filename)
+        else:
+            to_process.append(filename)
+    return to_process, unchanged, deleted_files(manifest, documents)
+
+
+def version_properties(extractor_version, embedding_model, chunker_version):
+    return {
+        "extractor_version": extractor_version,
+        "embedding_model": embedding_model,
+        "chunker_version": chunker_version,
+    }
+
+
+def manifest_properties(content, versions):
+    """ Propriétés stockées sur la Consultation (voir GraphBatchWriter.add) """
+    return {"content_hash": content_hash(content), **versions}
+
+
+def detach_consultations(graph, changed, deleted):
+    """ Détache les entités des fichiers modifiés et supprime les fichiers disparus """
+    filenames = list(changed) + list(deleted)
+    if not filenames:
+        return []
+    rows = graph.query(DETACH_ENTITIES_QUERY, params={"filenames": filenames})
+    graph.query(DELETE_CHUNKS_QUERY, params={"filenames": filenames})
+    if deleted:
+        graph.query(DELETE_CONSULTATIONS_QUERY, params={"filenames": list(deleted)})
+    return rows[0]["ids"] if rows else []
+
+
+def prune_orphans(graph, entity_ids):
+    """ Supprime les Symptome/Maladie qui ne sont plus reliés à aucune consultation """
+    if not entity_ids:
+        return 0
+    rows = graph.query(PRUNE_ORPHANS_QUERY, params={"ids": list(entity_ids)})
+    return rows[0]["deleted"] if rows else 0
+
+
+def graph_version(graph):
+    rows = graph.query(GRAPH_VERSION_QUERY)
+    return rows[0]["version"] if rows else None
+
+
+# Ingestions faites par ce processus : les caches du même processus (cypher_qa.py) se
+# revalident dès la question suivante, sans attendre leur contrôle périodique
+local_bumps = 0
+
+
+def bump_graph_version(graph):
+    """ Signale aux processus de requête que le graphe a changé """
+    global local_bumps
+    version = f"{time.time_ns():x}"
+    graph.query(BUMP_GRAPH_VERSION_QUERY, params={"version": version})
+    local_bumps += 1
+    return version
@@ -0,0 +1,226 @@
+import numpy as np
+
+from graph_writer import GraphBatchWriter, setup_constraints, setup_vector_index, DEFAULT_BATCH_SIZE
+from embedding_engine import EmbeddingEngine, DEFAULT_WORKERS
+from entity_extraction import aextract_entities, extractor_version
+from extraction_scheduler import (
+    ExtractionScheduler, estimate_tokens, DEFAULT_CONCURRENCY, DEFAULT_RPM, DEFAULT_TPM
+)
+from extraction_cache import ExtractionCache
+from vector_index import (
+    open_local_index, stored_quantization, sync_from_neo4j, refresh_from_neo4j, INDEX_DIR, CHUNK_INDEX_DIR,
+    KEEP_QUANTIZATION
+)
+from chunking import chunk_document, chunk_id, CHUNKER_VERSION
+from tracing import span, traced
+from graph_stats import entity_ids, refresh_entity_stats
+from entity_canonicalizer import EntityCanonicalizer
+from graph_expansion import GraphSnapshot, sync_snapshot, refresh_snapshot
+from lexical_index import LexicalIndex, build_lexical_index, document_terms
+from document_loader import iter_documents, DEFAULT_BATCH
+from graph_store import persist
+from answer_cache import invalidate_answers
+from ingestion_manifest import (
+    fetch_manifest, is_unchanged, deleted_files, version_properties, manifest_properties,
+    detach_consultations, prune_orphans, bump_graph_version
+)
+
+# ==========================================
+# 👇 PIPELINE D'INGESTION GRAPHRAG (PARTAGÉ) 👇
+# ==========================================
+# Utilisé par ingestion_graphrag.py et chat_graph_tout.py :
+#   lecture en flux (document_loader.py) -> plan incrémental document par document
+#   -> par lots de `document_batch` : découpage en chunks -> embeddings -> extraction
+#      concurrente -> écriture UNWIND
+#   -> fichiers supprimés -> nettoyage des orphelins
+
+
+def mean_vector(vectors):
+    """ Moyenne normalisée (cosinus) des vecteurs des chunks """
+    if not vectors:
+        return None
+    mean = np.mean(np.asarray(vectors, dtype=np.float32), axis=0)
+    norm = np.linalg.norm(mean)
+    return (mean / norm if norm else mean).tolist()
+
+
+@traced("ingestion.run")
+def run_ingestion(graph, files, embedding_model, llm, embedding_model_name, llm_model_name,
+                  batch_size=DEFAULT_BATCH_SIZE, embed_workers=DEFAULT_WORKERS,
+                  concurrency=DEFAULT_CONCURRENCY, incremental=False, use_cache=True,
+                  sync_local_index=True, rpm=DEFAULT_RPM, tpm=DEFAULT_TPM, canonicalize=True,
+                  quantization=KEEP_QUANTIZATION, document_batch=DEFAULT_BATCH):
+    mode = "incrémentale" if incremental else "complète"
+    print(f"\n🚀 Ingestion GraphRAG ({mode}) pour {len(files)} fichiers...")
+
+    # 1. Nettoyage complet (seulement en mode complet)
+    if not incremental:
+        with span("neo4j.clear"):
+            graph.query("MATCH (n) DETACH DELETE n")
+
+    # 2. Index Vectoriel + contraintes d'unicité (MERGE indexés)
+    with span("neo4j.setup"):
+        setup_vector_index(graph, drop=not incremental)
+        setup_constraints(graph)
+
+    # 3. Étapes partagées par tous les lots : manifeste (mode incrémental), moteur
+    #    d'embedding (pool de workers gardé), extraction, canonicalisation, écriture
+    versions = version_properties(extractor_version(llm_model_name), embedding_model_name, CHUNKER_VERSION)
+    manifest = {}
+    if incremental:
+        with span("ingestion.manifest"):
+            manifest = fetch_manifest(graph)
+    engine = EmbeddingEngine(model_name=embedding_model_name, workers=embed_workers,
+                             embedding_model=embedding_model)
+    cache = ExtractionCache() if use_cache else None
+    scheduler = ExtractionScheduler(
+        lambda item: aextract_entities(llm, item[1], cache=cache),
+        concurrency=concurrency,
+        rpm=rpm,
+        tpm=tpm,
+        token_estimator=lambda item: estimate_tokens(item[1]),
+        label=lambda item: item[0],
+    )
+    canonicalizer = None
+    if canonicalize:
+        embed = embedding_model.embed_documents if embedding_model is not None else None
+        canonicalizer = EntityCanonicalizer.from_graph(graph, embed=embed)
+    writer = GraphBatchWriter(graph, batch_size=batch_size)
+    filenames, unchanged, stale_entities, written = [], [], [], []
+
+    def process(batch):
+        """ Un lot de documents nouveaux / modifiés : chunks -> embeddings -> entités -> écriture """
+        names = [document["filename"] for document in batch]
+        contents = [document["text"] for document in batch]
+        print(f"   📦 Lot de {len(batch)} document(s) ({len(filenames) + len(batch)} traité(s) au total)")
+        changed = [f for f in names if f in manifest]
+        if changed:
+            stale_entities.extend(detach_consultations(graph, changed, []))
+
+        # 5. Découpage par tours de parole + Embeddings des chunks en lots (multi-cœurs).
+        #    Le vecteur de la Consultation est la moyenne normalisée de ses chunks :
+        #    toute la consultation est représentée, pas seulement ses ~256 premiers tokens.
+        with span("ingestion.chunk", documents=len(contents)):
+            doc_chunks = [chunk_document(content) for content in contents]
+        chunk_texts = [chunk["text"] for chunks in doc_chunks for chunk in chunks]
+        chunk_vectors = iter(engine.embed_documents(chunk_texts))
+        engine.report(len(chunk_texts))
+        vectors = []
+        for filename, chunks in zip(names, doc_chunks):
+            for chunk in chunks:
+                chunk["id"] = chunk_id(filename, chunk["index"])
+                chunk["embedding"] = next(chunk_vectors)
+            vectors.append(mean_vector([chunk["embedding"] for chunk in chunks]))
+
+        # 6. Extraction concurrente des entités (quotas Groq respectés, sans pause fixe)
+        #    Les résultats déjà connus sont servis par le cache disque sans appel LLM.
+        with span("ingestion.extract", documents=len(contents)):
+            all_entities = scheduler.run_sync(list(zip(names, contents)))
+
+        # 6 bis. Canonicalisation : variantes, pluriels, fautes de frappe et synonymes
+        #        rattachés aux entités existantes (entity_canonicalizer.py)
+        if canonicalizer is not None:
+            all_entities = canonicalizer.canonicalize(all_entities)
+
+        # 7. Écriture groupée par lots UNWIND (Consultation + Vecteur + liens graphiques)
+        for filename, content, vector, entities, chunks in zip(names, contents, vectors, all_entities, doc_chunks):
+            # Les documents en dead-letter sont indexés sans entités et sans version
+            # d'extracteur : la prochaine ingestion incrémentale les retentera.
+            properties = manifest_properties(content, versions)
+            if entities is None:
+                properties["extractor_version"] = None
+            writer.add(filename, content, vector, entities or {}, properties, chunks)
+        filenames.extend(names)
+        written.extend(entities or {} for entities in all_entities)
+
+    # 4. Lecture en flux (document_loader.py) : chaque document est comparé au manifeste
+    #    dès son arrivée, les nouveaux / modifiés partent par lots pendant que les
+    #    suivants se lisent. Seul le résumé BM25 (termes, fréquences) reste en mémoire.
+    lexical_terms, encodings, pending = {}, {}, []
+    try:
+        with span("ingestion.stream", files=len(files)):
+            for document in iter_documents(files):
+                filename = document["filename"]
+                lexical_terms[filename] = document_terms(document["text"])
+                encodings[document["encoding"]] = encodings.get(document["encoding"], 0) + 1
+                if incremental and is_unchanged(manifest.get(filename), document["text"], versions):
+                    unchanged.append(filename)
+                    continue
+                pending.append(document)
+                if len(pending) >= document_batch:
+                    process(pending)
+                    pending = []
+            if pending:
+                process(pending)
+        writer.close()
+        if canonicalizer is not None:
+            canonicalizer.report()
+            canonicalizer.save_aliases(graph)
+    finally:
+        engine.close()
+        if cache is not None:
+            cache.report()
+            cache.close()
+    detail = ", ".join(f"{n} {e}" for e, n in sorted(encodings.items()))
+    print(f"📂 {len(lexical_terms)} fichiers lus ({detail or 'aucun'}).")
+
+    # Fichiers disparus du disque : connus seulement une fois tout le flux lu
+    deleted = deleted_files(manifest, lexical_terms) if incremental else []
+    if incremental:
+        print(f"   🔎 {len(filenames)} traité(s), {len(unchanged)} inchangé(s), {len(deleted)} supprimé(s).")
+        stale_entities.extend(detach_consultations(graph, [], deleted))
+
+    # 8. Statistiques matérialisées des entités touchées (graph_stats.py), puis
+    #    nettoyage des Symptômes / Maladies devenus orphelins
+    symptomes = {s for e in written for s in e.get("symptomes", []) if isinstance(s, str) and s.strip()}
+    maladies = {m for e in written for m in e.get("maladies", []) if isinstance(m, str) and m.strip()}
+    refresh_entity_stats(graph, list(stale_entities) + entity_ids(graph, symptomes, maladies))
+    with span("ingestion.prune", candidates=len(stale_entities)):
+        pruned = prune_orphans(graph, stale_entities)
+    if pruned:
+        print(f"   🧹 {pruned} entité(s) orpheline(s) supprimée(s).")
+    if filenames or deleted or not incremental:
+        # Caches Cypher et statistiques (cypher_qa.py, graph_stats.py) : revalidés dès la
+        # question suivante dans ce processus, au plus VERSION_CHECK_SECONDS plus tard ailleurs
+        bump_graph_version(graph)
+        with span("ingestion.persist_graph"):
+            persist(graph)  # Graphe embarqué (GRAPH_BACKEND=embedded) : sauvegarde disque
+        # Réponses en cache appuyées sur une consultation modifiée ou supprimée (toutes en mode complet)
+        invalidate_answers(list(filenames) + list(deleted) if incremental else None)
+
+    # 9. Copie locale des embeddings pour la recherche vectorielle en mémoire
+    #    (quantization="int8" / "binary" : présélection quantifiée, reclassement float32 ;
+    #    None : float32 ; KEEP_QUANTIZATION : mode de l'index existant, gardé d'une ingestion à l'autre).
+    #    Incrémental : seuls les vecteurs des fichiers modifiés / supprimés sont relus depuis Neo4j ;
+    #    copie complète en mode complet, ou si un index manque ou change de quantification.
+    kept = quantization == KEEP_QUANTIZATION
+    if kept:
+        quantization = stored_quantization()
+    indexes = ((INDEX_DIR, "Consultation"), (CHUNK_INDEX_DIR, "Chunk"))
+    index_stale = sync_local_index and incremental and any(
+        current is None or current.quantization != quantization  # Absent ou autre quantification
+        for current in (open_local_index(path) for path, _ in indexes)
+    )
+    if sync_local_index and (not incremental or filenames or deleted or index_stale):
+        origin = "mode de l'index existant" if kept else "demandé"
+        print(f"   🗜️ Index vectoriels locaux : {quantization or 'float32'} ({origin}).")
+        with span("ingestion.sync_index", incremental=incremental):
+            for path, label in indexes:
+                if incremental:
+                    refresh_from_neo4j(graph, list(filenames) + list(deleted), path, label,
+                                       embedding_model_name=embedding_model_name, quantization=quantization)
+                else:
+                    sync_from_neo4j(graph, path, label, embedding_model_name=embedding_model_name,
+                                    quantization=quantization)
+
+    # 10. Index lexical BM25 : reconstruit depuis les termes de tous les fichiers lus (pas seulement les modifiés)
+    if sync_local_index and (not incremental or filenames or deleted or not LexicalIndex().exists()):
+        build_lexical_index(lexical_terms)
+
+    # 11. Snapshot CSR du graphe pour l'expansion multi-sauts (seulement les consultations touchées)
+    if sync_local_index and (not incremental or filenames or deleted or not GraphSnapshot().exists()):
+        with span("ingestion.sync_snapshot"):
+            if incremental:
+                refresh_snapshot(graph, list(filenames) + list(deleted))
+            else:
+                sync_snapshot(graph)
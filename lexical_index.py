@@ -0,0 +1,200 @@
+import os
+import re
+import json
+import math
+import time
+
+import numpy as np
+
+from context_builder import normalize_term, STOPWORDS
+from entity_canonicalizer import singular
+from tracing import span
+
+# ==========================================
+# 👇 INDEX LEXICAL BM25 (LISTES INVERSÉES SUR DISQUE) 👇
+# ==========================================
+# Les termes exacts ("hCG", noms de médicaments, dosages) sont mal servis par les
+# embeddings MiniLM seuls. Index inversé BM25 sur le contenu des Consultations :
+#   - terms.json   : vocabulaire trié + table des documents,
+#   - offsets.npy  : début des postings de chaque terme (int64, n_termes + 1),
+#   - docs.npy     : numéros de documents (uint32), triés par terme puis document,
+#   - tfs.npy      : fréquences dans le document (uint16),
+#   - lengths.npy  : longueur des documents en termes (uint32).
+# Les tableaux sont ouverts en memory-map. La tokenisation est adaptée au français
+# (minuscules, sans accents, élisions l' / d' / qu' retirées, mots vides, pluriels).
+# Les résultats sont fusionnés avec la recherche vectorielle par Reciprocal Rank
+# Fusion (retrieval.py) ; une requête par mots-clés évidente peut s'en passer.
+
+LEXICAL_INDEX_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "lexical_index")
+K1 = 1.2
+B = 0.75
+RRF_K = 60
+# Raccourci lexical : requête courte, tous les termes connus et présents dans le
+# premier document, qui devance nettement le second
+SHORTCUT_MAX_TERMS = 3
+SHORTCUT_RATIO = 1.5
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+ELISION_PATTERN = re.compile(r"\b(?:l|d|j|m|n|s|t|c|qu|jusqu|lorsqu|puisqu)'")
+LEXICAL_STOPWORDS = STOPWORDS | {
+    "le", "la", "un", "de", "du", "et", "ou", "en", "au", "il", "je", "tu", "on", "ce", "ne",
+    "se", "sa", "ma", "ta", "me", "te", "est", "ai", "as", "a", "y", "si", "mais", "donc",
+    "the", "of", "to", "in", "is", "it", "my", "be", "on", "or", "an", "at", "as", "do", "if", "so",
+    "i", "me", "am", "can", "not", "will", "hi", "hello", "bonjour",
+}
+
+
+def tokenize(text):
+    """ 'L'hCG ne double pas' -> ['hcg', 'double'] """
+    text = ELISION_PATTERN.sub(" ", normalize_term(text.replace("’", "'")))
+    return [singular(t) for t in TOKEN_PATTERN.findall(text) if t not in LEXICAL_STOPWORDS]
+
+
+def document_terms(text):
+    """ texte -> ({terme: fréquence}, longueur en termes) : seul ce résumé reste en mémoire à l'ingestion """
+    tokens = tokenize(text)
+    counts = {}
+    for token in tokens:
+        counts[token] = counts.get(token, 0) + 1
+    return counts, len(tokens)
+
+
+class LexicalIndex:
+    """ BM25 sur le contenu des consultations, postings en memory-map """
+
+    def __init__(self, path=LEXICAL_INDEX_DIR):
+        self.path = path
+        self.ids = []
+        self.terms = {}
+        self.offsets = np.zeros(1, dtype=np.int64)
+        self.docs = np.zeros(0, dtype=np.uint32)
+        self.tfs = np.zeros(0, dtype=np.uint16)
+        self.lengths = np.zeros(0, dtype=np.uint32)
+        self.average_length = 0.0
+        self.position = {}
+        self.meta = {}
+
+    # ---------- Construction ----------
+    def build(self, documents, meta=None):
+        """ documents : {filename: texte} ou {filename: document_terms(texte)} """
+        self.ids = sorted(documents)
+        postings = {}
+        lengths = []
+        for doc, filename in enumerate(self.ids):
+            value = documents[filename]
+            counts, length = document_terms(value) if isinstance(value, str) else value
+            lengths.append(length)
+            for token, tf in counts.items():
+                postings.setdefault(token, []).append((doc, min(tf, 65535)))
+        vocabulary = sorted(postings)
+        sizes = [len(postings[t]) for t in vocabulary]
+        offsets = np.concatenate([[0], np.cumsum(sizes)]).astype(np.int64)
+        docs = np.fromiter((d for t in vocabulary for d, _ in postings[t]), dtype=np.uint32, count=int(offsets[-1]))
+        tfs = np.fromiter((tf for t in vocabulary for _, tf in postings[t]), dtype=np.uint16, count=int(offsets[-1]))
+
+        os.makedirs(self.path, exist_ok=True)
+        arrays = {"offsets": offsets, "docs": docs, "tfs": tfs, "lengths": np.asarray(lengths, dtype=np.uint32)}
+        for name, array in arrays.items():
+            target = os.path.join(self.path, f"{name}.npy")
+            with open(target + ".tmp", "wb") as f:
+                np.save(f, array)
+            os.replace(target + ".tmp", target)
+        terms_path = os.path.join(self.path, "terms.json")
+        with open(terms_path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump({"terms": vocabulary, "ids": self.ids, "built_at": time.time(), **(meta or {})},
+                      f, ensure_ascii=False)
+        os.replace(terms_path + ".tmp", terms_path)
+        return self.load()
+
+    def load(self):
+        with open(os.path.join(self.path, "terms.json"), encoding="utf-8") as f:
+            self.meta = json.load(f)
+        self.terms = {t: i for i, t in enumerate(self.meta.pop("terms"))}
+        self.ids = self.meta.pop("ids")
+        self.position = {f: i for i, f in enumerate(self.ids)}
+        for name in ("offsets", "docs", "tfs", "lengths"):
+            setattr(self, name, np.load(os.path.join(self.path, f"{name}.npy"), mmap_mode="r"))
+        self.average_length = float(np.mean(self.lengths)) if len(self.lengths) else 0.0
+        return self
+
+    def exists(self):
+        return os.path.exists(os.path.join(self.path, "terms.json"))
+
+    def __len__(self):
+        return len(self.ids)
+
+    # ---------- Recherche ----------
+    def search(self, query, k=10):
+        """ [(filename, score BM25)] décroissants """
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not self.ids or not terms:
+            return []
+        n = len(self.ids)
+        scores = np.zeros(n, dtype=np.float32)
+        for term in terms:
+            i = self.terms.get(term)
+            if i is None:
+                continue
+            start, end = int(self.offsets[i]), int(self.offsets[i + 1])
+            docs = np.asarray(self.docs[start:end], dtype=np.int64)
+            tf = np.asarray(self.tfs[start:end], dtype=np.float32)
+            idf = math.log(1 + (n - (end - start) + 0.5) / ((end - start) + 0.5))
+            norm = K1 * (1 - B + B * self.lengths[docs] / (self.average_length or 1.0))
+            scores[docs] += idf * tf * (K1 + 1) / (tf + norm)
+        hits = np.flatnonzero(scores)
+        if not len(hits):
+            return []
+        k = min(k, len(hits))
+        top = hits[np.argpartition(-scores[hits], k - 1)[:k]]
+        top = top[np.argsort(-scores[top])]
+        return [(self.ids[d], float(scores[d])) for d in top]
+
+    def contains_all(self, filename, terms):
+        """ Le document contient-il tous les termes ? (lecture des postings, pas du texte) """
+        doc = self.position.get(filename)
+        if doc is None:
+            return False
+        for term in terms:
+            i = self.terms.get(term)
+            if i is None:
+                return False
+            postings = self.docs[int(self.offsets[i]):int(self.offsets[i + 1])]
+            j = int(np.searchsorted(postings, doc))
+            if j >= len(postings) or postings[j] != doc:
+                return False
+        return True
+
+    def confident(self, query, hits):
+        """ Requête par mots-clés évidente : la recherche lexicale suffit (pas d'embedding) """
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not hits or not terms or len(terms) > SHORTCUT_MAX_TERMS:
+            return False
+        if any(t not in self.terms for t in terms):
+            return False
+        if len(hits) > 1 and hits[0][1] < SHORTCUT_RATIO * hits[1][1]:
+            return False
+        return self.contains_all(hits[0][0], terms)
+
+
+def reciprocal_rank_fusion(rankings, k=RRF_K):
+    """ rankings : listes de filenames classés -> {filename: score} ramené à (0, 1] """
+    fused = {}
+    for ranking in rankings:
+        for rank, filename in enumerate(ranking):
+            fused[filename] = fused.get(filename, 0.0) + 1.0 / (k + rank + 1)
+    best = len(rankings) / (k + 1)  # Premier dans toutes les listes
+    return {f: s / best for f, s in fused.items()}
+
+
+def build_lexical_index(documents, path=LEXICAL_INDEX_DIR):
+    start = time.perf_counter()
+    with span("lexical.build", documents=len(documents)):
+        index = LexicalIndex(path).build(documents)
+    print(f"✅ Index lexical BM25 construit : {len(index)} documents, {len(index.terms)} termes "
+          f"en {time.perf_counter() - start:.2f}s.")
+    return index
+
+
+def open_lexical_index(path=LEXICAL_INDEX_DIR):
+    index = LexicalIndex(path)
+    return index.load() if index.exists() else None
@@ -1,19 +1,27 @@
 import os
-import glob
+import hashlib
 import warnings
-import time
+from importlib import metadata
 
 # --- IMPORTS ---
 import langchain
 from langchain_groq import ChatGroq
 from langchain_community.graphs import Neo4jGraph
 from langchain_experimental.graph_transformers import LLMGraphTransformer
-from langchain_community.embeddings import HuggingFaceEmbeddings
 from langchain_community.vectorstores import Neo4jVector
 from langchain_community.chains.graph_qa.cypher import GraphCypherQAChain
 from langchain_core.documents import Document
 from langchain_core.prompts import PromptTemplate
 
+from embedding_engine import EmbeddingEngine
+from embedding_cache import CachedEmbeddings
+from embedding_backends import load_embeddings, cache_namespace
+from chunking import chunk_document
+from extraction_scheduler import ExtractionScheduler, estimate_tokens
+from extraction_cache import ExtractionCache, graph_documents_to_json, graph_documents_from_json
+from tracing import span
+from document_loader import find_files, iter_documents, batched
+
 warnings.filterwarnings("ignore")
 
 # ==========================================
@@ -35,42 +43,16 @@ os.environ["NEO4J_URI"] = MY_NEO4J_URI
 os.environ["NEO4J_USERNAME"] = MY_NEO4J_USER
 os.environ["NEO4J_PASSWORD"] = MY_NEO4J_PASS
 
+# Limite : 4000 caractères max par fichier envoyés au LLMGraphTransformer (quota tokens)
+MAX_GRAPH_CHARS = 4000
 
-def read_data():
-    """Lit TOUS les fichiers .txt du dossier Data et gère plusieurs encodages."""
-    documents = []
-    base_path = os.path.dirname(os.path.abspath(__file__))
-    data_folder = os.path.join(base_path, "Data")
-
-    if not os.path.exists(data_folder):
-        print(f"❌ Erreur Dossier : {data_folder}")
-        return []
-
-    files = glob.glob(os.path.join(data_folder, "*.txt"))
-    print(f"📂 Lecture de {len(files)} fichiers trouvés...")
-
-    for f in files:
-        text = None
-        for encoding in ["utf-8", "cp1252", "latin-1"]:
-            try:
-                with open(f, "r", encoding=encoding) as file:
-                    text = file.read().strip()
-                break  # lecture réussie, on sort de la boucle
-            except Exception:
-                continue
-
-        if not text:
-            print(f"⚠️ Impossible de lire {f} avec les encodages standards.")
-            continue
-
-        # Limite facultative : 4000 caractères max par fichier
-        short_text = text[:4000]
-        documents.append(
-            Document(page_content=short_text, metadata={"source": os.path.basename(f)})
-        )
 
-    print(f"✅ {len(documents)} fichiers lus avec succès !")
-    return documents
+def read_data(files):
+    """Générateur : fichiers .txt du dossier Data (récursif), lus en parallèle, encodage détecté."""
+    for document in iter_documents(files):
+        # Texte complet : la limite de 4000 caractères ne s'applique plus qu'à
+        # l'extraction LLM (voir MAX_GRAPH_CHARS), l'index vectoriel voit tout le dialogue.
+        yield Document(page_content=document["text"].strip(), metadata={"source": document["filename"]})
 
 
 
@@ -78,14 +60,16 @@ def main():
     print("🤖 Chargement des modèles...")
 
     # 1️⃣ EMBEDDINGS
-    hf_embeddings = HuggingFaceEmbeddings(
-        model_name="sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2"
-    )
+    embedding_model_name = "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2"
+    # Backend torch / onnx / onnx-int8 (EMBEDDING_BACKEND). Cache propre à ce modèle (L12) :
+    # jamais mélangé avec les vecteurs MiniLM-L6 des autres scripts
+    hf_embeddings = CachedEmbeddings(load_embeddings(embedding_model_name), cache_namespace(embedding_model_name))
 
     # 2️⃣ LLM GROQ (Llama 3.3)
+    llm_model_name = "llama-3.3-70b-versatile"
     try:
         llm = ChatGroq(
-            model_name="llama-3.3-70b-versatile",
+            model_name=llm_model_name,
             temperature=0
         )
     except Exception as e:
@@ -107,50 +91,102 @@ def main():
         return
 
     # 4️⃣ LECTURE DES DONNÉES
-    all_docs = read_data()
-    if not all_docs:
-        print("❌ Aucun document trouvé.")
+    # Chaque étape relit les fichiers en flux, par lots : jamais tout le corpus en
+    # mémoire, et la lecture du lot suivant avance pendant le traitement du lot courant
+    files = find_files("Data")
+    if not files:
+        print("❌ Erreur Dossier : aucun fichier .txt dans Data")
         return
+    print(f"📂 {len(files)} fichiers trouvés.")
 
     # --- ÉTAPE 1 : CREATION DU GRAPHE ---
-    print(f"\n🚀 ÉTAPE 1 : Construction du Graphe ({len(all_docs)} fichiers)...")
+    print(f"\n🚀 ÉTAPE 1 : Construction du Graphe ({len(files)} fichiers)...")
     print("   (Cela va prendre du temps. Ne touchez à rien tant que ce n'est pas fini.)")
 
-    count_ok = 0
-
-    for i, doc in enumerate(all_docs):
-        filename = doc.metadata.get("source", "inconnu")
-        print(f"\n   📄 [{i+1}/{len(all_docs)}] Traitement de : {filename}...")
+    # Cache disque : un document déjà converti (même modèle, même version du
+    # transformer, même texte) ne repaie pas l'appel LLM.
+    cache = ExtractionCache()
+    try:
+        transformer_version = metadata.version("langchain-experimental")
+    except metadata.PackageNotFoundError:
+        transformer_version = "inconnue"
+    prompt_hash = hashlib.sha256(f"LLMGraphTransformer@{transformer_version}".encode()).hexdigest()[:12]
+
+    async def convert(doc):
+        doc = Document(page_content=doc.page_content[:MAX_GRAPH_CHARS], metadata=doc.metadata)
+        cached = cache.get(llm_model_name, prompt_hash, doc.page_content)
+        if cached is not None:
+            return graph_documents_from_json(cached, doc)
+        result = await llm_transformer.aconvert_to_graph_documents([doc])
+        cache.put(llm_model_name, prompt_hash, doc.page_content, graph_documents_to_json(result))
+        return result
+
+    # Extraction concurrente, limitée par les quotas Groq (requêtes/min, tokens/min)
+    # au lieu d'une pause fixe de 3s entre chaque fichier.
+    scheduler = ExtractionScheduler(
+        convert,
+        token_estimator=lambda doc: estimate_tokens(doc.page_content),
+        label=lambda doc: doc.metadata.get("source", "inconnu"),
+    )
+    count_ok = count_docs = 0
+    with span("main.graph_extraction", documents=len(files)):
+        for docs in batched(read_data(files)):
+            results = scheduler.run_sync(docs)
+            count_docs += len(docs)
+            graph_documents = []
+            for doc, result in zip(docs, results):
+                if result:
+                    graph_documents.extend(result)
+                    count_ok += 1
+                elif result is not None:
+                    print(f"      ⚠️ Aucun nœud trouvé : {doc.metadata.get('source', 'inconnu')}")
 
-        try:
-            graph_documents = llm_transformer.convert_to_graph_documents([doc])
             if graph_documents:
-                graph.add_graph_documents(graph_documents)
-                count_ok += 1
+                with span("neo4j.add_graph_documents", structures=len(graph_documents)):
+                    graph.add_graph_documents(graph_documents)
                 print(f"      ✅ Ajouté ({len(graph_documents)} structures).")
-            else:
-                print("      ⚠️ Aucun nœud trouvé.")
-            print("      ⏳ Pause 3s...")
-            time.sleep(3)
-        except Exception as e:
-            print(f"      ❌ Erreur : {e}")
-            if "429" in str(e) or "413" in str(e):
-                print("      🛑 Pause longue (30s)...")
-                time.sleep(30)
-
-    print(f"\n✅ FIN ÉTAPE 1 : {count_ok}/{len(all_docs)} fichiers traités avec succès !")
+            for dead in scheduler.dead_letters:
+                print(f"      ❌ Dead-letter : {dead['item'].metadata.get('source', 'inconnu')} ({dead['error']})")
+    cache.report()
+    cache.close()
+
+    print(f"\n✅ FIN ÉTAPE 1 : {count_ok}/{count_docs} fichiers traités avec succès !")
 
     # --- ÉTAPE 2 : INDEXATION VECTORIELLE ---
     print("\n🚀 ÉTAPE 2 : Indexation Vectorielle...")
     try:
-        vector_index = Neo4jVector.from_documents(
-            all_docs,
-            hf_embeddings,
-            url=MY_NEO4J_URI,
-            username=MY_NEO4J_USER,
-            password=MY_NEO4J_PASS,
-            index_name="vector_index"
-        )
+        # Un vecteur par groupe de tours de parole (chunk) plutôt qu'un par document
+        # tronqué : la fin des longues consultations reste cherchable.
+        # Embeddings calculés en lots sur plusieurs cœurs (pool gardé d'un lot à l'autre),
+        # puis injectés tels quels : le premier lot crée l'index, les suivants s'y ajoutent.
+        engine = EmbeddingEngine(model_name=embedding_model_name, embedding_model=hf_embeddings)
+        vector_index = None
+        try:
+            for docs in batched(read_data(files)):
+                texts, metadatas = [], []
+                for doc in docs:
+                    for chunk in chunk_document(doc.page_content):
+                        texts.append(chunk["text"])
+                        metadatas.append({**doc.metadata, "chunk": chunk["index"],
+                                          "turn_start": chunk["turn_start"], "turn_end": chunk["turn_end"]})
+                vectors = engine.embed_documents(texts)
+                engine.report(len(texts))
+                with span("neo4j.vector_index", chunks=len(texts)):
+                    if vector_index is None:
+                        vector_index = Neo4jVector.from_embeddings(
+                            list(zip(texts, vectors)),
+                            hf_embeddings,
+                            metadatas=metadatas,
+                            url=MY_NEO4J_URI,
+                            username=MY_NEO4J_USER,
+                            password=MY_NEO4J_PASS,
+                            index_name="vector_index"
+                        )
+                    else:
+                        vector_index.add_embeddings(texts, vectors, metadatas=metadatas)
+        finally:
+            engine.close()
+        hf_embeddings.cache.report()
         print("   -> ✅ Index Vectoriel créé avec succès !")
     except Exception as e:
         print(f"❌ Erreur Vector : {e}")
@@ -189,7 +225,8 @@ def main():
             allow_dangerous_requests=True,
             cypher_prompt=cypher_prompt
         )
-        result = chain.invoke({"query": question})
+        with span("main.graph_qa"):
+            result = chain.invoke({"query": question})
         print(f"   🤖 Réponse : {result['result']}")
     except Exception as e:
         print(f"   ❌ Erreur : {e}")
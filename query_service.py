@@ -0,0 +1,342 @@
+import json
+import time
+import asyncio
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+import runtime
+import chat_graphrag
+from retrieval import search_passages, keyword_shortcut
+from context_builder import ContextBuilder
+from vector_index import INDEX_DIR, CHUNK_INDEX_DIR
+from tracing import span
+from embedding_cache import CachedEmbeddings
+
+# ==========================================
+# 👇 SERVICE DE QUESTIONS (ASYNCIO + HTTP) 👇
+# ==========================================
+# Un seul processus sert tous les cliniciens, au lieu d'un REPL input() par personne
+# (chacun avec sa propre copie du modèle) :
+#   - POST /search {"question": ...} -> passages (graph_rag_search)
+#   - POST /answer {"question": ...} -> réponse + sources (generate_response), servie par
+#     le cache sémantique des réponses (answer_cache.py) si la question a déjà été posée
+#   - GET  /health, GET /metrics
+# Les questions qui arrivent à quelques ms d'intervalle sont regroupées par le
+# micro-batcher en UN appel embed_documents. Les requêtes Neo4j (driver unique et
+# son pool de connexions) passent par un pool de threads borné, et les appels LLM
+# sont asynchrones, avec une limite de concurrence configurable.
+#
+# Usage : python query_service.py [--port 8080] [--batch-window-ms 5] [--llm-concurrency 8]
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8080
+BATCH_WINDOW_MS = 5
+MAX_BATCH_SIZE = 64
+LLM_CONCURRENCY = 8
+GRAPH_WORKERS = 8  # Requêtes Neo4j simultanées (threads partageant le pool du driver)
+MAX_BODY_BYTES = 64 * 1024
+
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+           413: "Payload Too Large", 500: "Internal Server Error"}
+
+
+class MicroBatcher:
+    """
+    Regroupe les textes soumis dans une fenêtre de `window_ms` (ou jusqu'à `max_batch`)
+    et les vectorise en un seul appel `embed_many(texts)`, exécuté hors de la boucle asyncio.
+    """
+
+    def __init__(self, embed_many, window_ms=BATCH_WINDOW_MS, max_batch=MAX_BATCH_SIZE, executor=None):
+        self.embed_many = embed_many
+        self.window = window_ms / 1000
+        self.max_batch = max_batch
+        self.executor = executor
+        self.queue = None
+        self.task = None
+        # Statistiques (exposées par /metrics)
+        self.batches = 0
+        self.items = 0
+        self.largest_batch = 0
+
+    def start(self):
+        self.queue = asyncio.Queue()
+        self.task = asyncio.get_running_loop().create_task(self._run())
+
+    async def close(self):
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+
+    async def embed(self, text):
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((text, future))
+        return await future
+
+    async def _collect(self):
+        """ Attend un premier texte, puis ceux qui arrivent pendant la fenêtre """
+        batch = [await self.queue.get()]
+        deadline = time.monotonic() + self.window
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._collect()
+            texts = [text for text, _ in batch]
+            try:
+                with span("service.embed_batch", size=len(texts)):
+                    vectors = await loop.run_in_executor(self.executor, self.embed_many, texts)
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            self.batches += 1
+            self.items += len(texts)
+            self.largest_batch = max(self.largest_batch, len(texts))
+            for (_, future), vector in zip(batch, vectors):
+                if not future.done():  # Client parti entre-temps
+                    future.set_result(vector)
+
+
+class QueryService:
+    """ graph_rag_search / generate_response servis de manière concurrente """
+
+    def __init__(self, embedding_model_name=chat_graphrag.EMBEDDING_MODEL_NAME,
+                 llm_model_name=chat_graphrag.LLM_MODEL_NAME, window_ms=BATCH_WINDOW_MS,
+                 max_batch=MAX_BATCH_SIZE, llm_concurrency=LLM_CONCURRENCY, graph_workers=GRAPH_WORKERS):
+        self.embedding_model_name = embedding_model_name
+        self.llm_model_name = llm_model_name
+        self.window_ms = window_ms
+        self.max_batch = max_batch
+        self.llm_concurrency = llm_concurrency
+        self.executor = ThreadPoolExecutor(max_workers=graph_workers, thread_name_prefix="graphrag-io")
+        self.context_builder = ContextBuilder()
+        self.batcher = None
+        self.llm_slots = None
+        self.started_at = time.time()
+        self.requests = 0
+        self.errors = 0
+        self.llm_in_flight = 0
+
+    async def start(self):
+        # Tout est chargé avant d'accepter des connexions (pas de latence de premier appel)
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self.executor, lambda: runtime.warm_up(
+            self.embedding_model_name, self.llm_model_name, background=False))
+        embeddings = runtime.get_embeddings(self.embedding_model_name)
+        # Questions déjà vues : servies par le LRU du cache d'embeddings (runtime.get_embeddings)
+        embed_many = embeddings.embed_queries if isinstance(embeddings, CachedEmbeddings) else embeddings.embed_documents
+        self.batcher = MicroBatcher(embed_many, self.window_ms, self.max_batch, executor=self.executor)
+        self.batcher.start()
+        self.llm_slots = asyncio.Semaphore(self.llm_concurrency)
+
+    async def close(self):
+        if self.batcher is not None:
+            await self.batcher.close()
+        self.executor.shutdown(wait=False)
+
+    # ---------- Logique métier ----------
+    async def _search(self, question):
+        """ (résultats, vecteur de la question ; None si servie par le raccourci mots-clés) """
+        graph = runtime.get_graph()
+        lexical_index = runtime.get_lexical_index()
+        loop = asyncio.get_running_loop()
+        # Requête par mots-clés évidente : pas de passage par le micro-batcher d'embeddings
+        shortcut = await loop.run_in_executor(
+            self.executor, lambda: keyword_shortcut(graph, question, lexical_index))
+        if shortcut:
+            return shortcut, None
+        vector = await self.batcher.embed(question)
+        chunk_index = runtime.get_local_index(CHUNK_INDEX_DIR, self.embedding_model_name)
+        local_index = runtime.get_local_index(INDEX_DIR, self.embedding_model_name)
+        snapshot = runtime.get_graph_snapshot()
+        results = await loop.run_in_executor(
+            self.executor,
+            lambda: search_passages(graph, vector, local_chunk_index=chunk_index, local_index=local_index,
+                                    graph_snapshot=snapshot, question=question, lexical_index=lexical_index),
+        )
+        return results, vector
+
+    async def search(self, question):
+        with span("service.search"):
+            results, _ = await self._search(question)
+            return results
+
+    async def answer(self, question):
+        with span("service.answer"):
+            results, vector = await self._search(question)
+            if not results:
+                return {"answer": "Je n'ai rien trouvé de pertinent dans la base.", "sources": []}
+            sources = [{"filename": r["filename"], "score": r["score"]} for r in results]
+            filenames = [r["filename"] for r in results]
+            loop = asyncio.get_running_loop()
+            # Question proche déjà répondue avec les mêmes sources : réponse en quelques ms, sans LLM
+            answer_cache = self.answer_cache()
+            if answer_cache is not None:
+                if vector is None:
+                    vector = await self.batcher.embed(question)
+                with span("answer_cache.lookup"):
+                    cached = await loop.run_in_executor(self.executor, answer_cache.lookup, vector, filenames)
+                if cached is not None:
+                    return {"answer": cached, "sources": sources, "cached": True}
+            context_text, context_stats = self.context_builder.build_with_stats(question, results)
+            prompt = chat_graphrag.build_prompt(question, context_text)
+            llm = runtime.get_llm(self.llm_model_name)
+            async with self.llm_slots:
+                self.llm_in_flight += 1
+                start = time.perf_counter()
+                try:
+                    with span("llm.invoke", prompt_chars=len(prompt)):
+                        response = await llm.ainvoke(prompt)
+                finally:
+                    self.llm_in_flight -= 1
+            if answer_cache is not None:
+                await loop.run_in_executor(self.executor, answer_cache.put, question, vector, filenames,
+                                           response.content, time.perf_counter() - start)
+            return {
+                "answer": response.content,
+                "sources": sources,
+                "context_tokens": context_stats["context_tokens"],
+                "cached": False,
+            }
+
+    def answer_cache(self):
+        return runtime.get_answer_cache(
+            chat_graphrag.answer_cache_namespace(self.llm_model_name, self.embedding_model_name))
+
+    def metrics(self):
+        b = self.batcher
+        embeddings = runtime.get_embeddings(self.embedding_model_name)
+        cache = embeddings.cache if isinstance(embeddings, CachedEmbeddings) else None
+        answer_cache = self.answer_cache()
+        return {
+            "uptime_seconds": round(time.time() - self.started_at, 1),
+            "requests": self.requests,
+            "errors": self.errors,
+            "embed_batches": b.batches if b else 0,
+            "embedded_questions": b.items if b else 0,
+            "mean_batch_size": round(b.items / b.batches, 2) if b and b.batches else 0.0,
+            "largest_batch": b.largest_batch if b else 0,
+            "llm_in_flight": self.llm_in_flight,
+            "llm_concurrency": self.llm_concurrency,
+            "embedding_cache": cache.stats() if cache is not None else None,
+            "answer_cache": answer_cache.stats() if answer_cache is not None else None,
+        }
+
+    # ---------- HTTP/1.1 minimal (keep-alive, corps JSON) ----------
+    async def route(self, method, path, body):
+        if path == "/health":
+            return 200, {"status": "ok"}
+        if path == "/metrics":
+            return 200, self.metrics()
+        if path not in ("/search", "/answer"):
+            return 404, {"error": f"Route inconnue : {path}"}
+        if method != "POST":
+            return 405, {"error": "Utilisez POST avec un corps JSON {\"question\": ...}"}
+        try:
+            question = json.loads(body or b"{}").get("question", "").strip()
+        except (ValueError, AttributeError):
+            return 400, {"error": "Corps JSON invalide"}
+        if not question:
+            return 400, {"error": "Champ 'question' manquant"}
+        if path == "/search":
+            return 200, {"results": await self.search(question)}
+        return 200, await self.answer(question)
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                try:
+                    method, path, _ = request_line.decode("latin-1").split(" ", 2)
+                except ValueError:
+                    await self._respond(writer, 400, {"error": "Requête HTTP invalide"}, keep_alive=False)
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    key, _, value = line.decode("latin-1").partition(":")
+                    headers[key.strip().lower()] = value.strip()
+                length = int(headers.get("content-length", 0) or 0)
+                keep_alive = headers.get("connection", "keep-alive").lower() != "close"
+                if length > MAX_BODY_BYTES:
+                    await self._respond(writer, 413, {"error": "Corps trop volumineux"}, keep_alive=False)
+                    break
+                body = await reader.readexactly(length) if length else b""
+
+                self.requests += 1
+                try:
+                    status, payload = await self.route(method, path.split("?", 1)[0], body)
+                except Exception as e:
+                    self.errors += 1
+                    status, payload = 500, {"error": str(e)}
+                await self._respond(writer, status, payload, keep_alive)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def _respond(self, writer, status, payload, keep_alive=True):
+        data = json.dumps(payload, ensure_ascii=False, default=float).encode("utf-8")
+        writer.write(
+            f"HTTP/1.1 {status} {REASONS.get(status, '')}\r\n"
+            f"Content-Type: application/json; charset=utf-8\r\n"
+            f"Content-Length: {len(data)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode("latin-1") + data
+        )
+        await writer.drain()
+
+    async def serve(self, host=DEFAULT_HOST, port=DEFAULT_PORT, ready=None):
+        await self.start()
+        server = await asyncio.start_server(self.handle, host, port)
+        address = server.sockets[0].getsockname()
+        print(f"🌐 Service GraphRAG à l'écoute sur http://{address[0]}:{address[1]} "
+              f"(fenêtre {self.window_ms} ms, lots ≤ {self.max_batch}, LLM ≤ {self.llm_concurrency})")
+        if ready is not None:
+            ready.set_result(address)
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            await self.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Service HTTP GraphRAG (asyncio)")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--batch-window-ms", type=float, default=BATCH_WINDOW_MS)
+    parser.add_argument("--max-batch", type=int, default=MAX_BATCH_SIZE)
+    parser.add_argument("--llm-concurrency", type=int, default=LLM_CONCURRENCY)
+    parser.add_argument("--graph-workers", type=int, default=GRAPH_WORKERS)
+    args = parser.parse_args()
+
+    print("🤖 Initialisation du service GraphRAG...")
+    service = QueryService(window_ms=args.batch_window_ms, max_batch=args.max_batch,
+                           llm_concurrency=args.llm_concurrency, graph_workers=args.graph_workers)
+    try:
+        asyncio.run(service.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        print("\n👋 Service arrêté.")
+
+
+if __name__ == "__main__":
+    main()
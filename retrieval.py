@@ -0,0 +1,392 @@
+import os
+
+from tracing import span
+from lexical_index import reciprocal_rank_fusion
+
+# ==========================================
+# 👇 RECHERCHE HYBRIDE (VECTEUR + GRAPHE) PARTAGÉE 👇
+# ==========================================
+# Utilisée par chat_graphrag.py, chat_graph_tout.py et l'outil
+# recherche_cas_similaires de agent_graph_main.py.
+#   - avec un index local : top-k en NumPy, puis UNE requête Neo4j pour le voisinage,
+#   - sinon : index vectoriel AuraDB (db.index.vector.queryNodes) comme avant.
+# search_passages travaille au niveau des Chunks (tours de parole) et ne renvoie
+# que les passages qui correspondent à la question, regroupés par consultation.
+# Avec un index BM25 (lexical_index.py), les résultats vectoriels et lexicaux sont
+# fusionnés par Reciprocal Rank Fusion ; keyword_shortcut répond sans embedding aux
+# requêtes par mots-clés évidentes.
+# Avec un snapshot du graphe (graph_expansion.py), les candidats sont reclassés par
+# PageRank personnalisé et complétés par des consultations voisines dans le graphe.
+# Les entités voisines sont lues par compréhension de motifs (une liste par consultation)
+# et non par deux OPTIONAL MATCH, qui produisaient symptômes x maladies lignes avant
+# le collect(distinct ...). search_passages_many traite une liste de questions en UNE
+# requête UNWIND (plus une seule pour le repli des questions sans chunk), avec les
+# propriétés choisies par l'appelant ; profile=True mesure les db hits du plan
+# (PROFILE) pour repérer les régressions.
+
+TOP_K = 3
+CHUNK_TOP_K = 12  # Chunks candidats, regroupés ensuite par consultation
+LEXICAL_TOP_K = 12  # Consultations candidates côté BM25 avant fusion
+
+VECTOR_SEARCH_QUERY = """
+CALL db.index.vector.queryNodes('consultation_vector', $k, $embedding)
+YIELD node AS c, score
+
+// Traversée du graphe pour enrichir le contexte
+RETURN c.filename AS filename,
+       c.content AS content,
+       [(c)-[:MENTIONNE_SYMPTOME]->(s:Symptome) | s.name] AS symptomes,
+       [(c)-[:MENTIONNE_MALADIE]->(m:Maladie) | m.name] AS maladies,
+       score
+"""
+
+# Voisinage des candidats trouvés localement (pas de recherche vectorielle côté serveur)
+NEIGHBOURHOOD_QUERY = """
+UNWIND $hits AS hit
+MATCH (c:Consultation {filename: hit.filename})
+RETURN c.filename AS filename,
+       c.content AS content,
+       [(c)-[:MENTIONNE_SYMPTOME]->(s:Symptome) | s.name] AS symptomes,
+       [(c)-[:MENTIONNE_MALADIE]->(m:Maladie) | m.name] AS maladies,
+       hit.score AS score
+ORDER BY score DESC
+"""
+
+# Repli de search_passages_many (questions sans chunk) : toutes les questions en UNE requête
+MULTI_NEIGHBOURHOOD_QUERY = """
+UNWIND $questions AS question
+UNWIND question.hits AS hit
+MATCH (c:Consultation {filename: hit.filename})
+RETURN question.index AS question,
+       c.filename AS filename,
+       c.content AS content,
+       [(c)-[:MENTIONNE_SYMPTOME]->(s:Symptome) | s.name] AS symptomes,
+       [(c)-[:MENTIONNE_MALADIE]->(m:Maladie) | m.name] AS maladies,
+       hit.score AS score
+ORDER BY question, score DESC
+"""
+
+MULTI_VECTOR_SEARCH_QUERY = """
+UNWIND $questions AS question
+CALL {
+    WITH question
+    CALL db.index.vector.queryNodes('consultation_vector', $k, question.embedding)
+    YIELD node AS c, score
+    RETURN c, score
+}
+RETURN question.index AS question,
+       c.filename AS filename,
+       c.content AS content,
+       [(c)-[:MENTIONNE_SYMPTOME]->(s:Symptome) | s.name] AS symptomes,
+       [(c)-[:MENTIONNE_MALADIE]->(m:Maladie) | m.name] AS maladies,
+       score
+ORDER BY question, score DESC
+"""
+
+
+def search_consultations(graph, embedding, k=TOP_K, local_index=None, approximate=False):
+    """ Top-k consultations + symptômes / maladies connectés """
+    if local_index is not None and len(local_index):
+        with span("retrieval.local_search", k=k, size=len(local_index)):
+            hits = local_index.search(embedding, k=k, approximate=approximate)
+        if not hits:
+            return []
+        return fetch_neighbourhood(graph, hits)
+    with span("neo4j.vector_search", k=k):
+        return graph.query(VECTOR_SEARCH_QUERY, params={"k": k, "embedding": embedding})
+
+
+def search_consultations_many(graph, embeddings, k=TOP_K, local_index=None, approximate=False):
+    """ search_consultations pour plusieurs vecteurs, en UN aller-retour : une liste par vecteur """
+    embeddings = list(embeddings)
+    results = [[] for _ in embeddings]
+    if not embeddings:
+        return results
+    if local_index is not None and len(local_index):
+        with span("retrieval.local_search", k=k, size=len(local_index), questions=len(embeddings)):
+            questions = [{"index": i, "hits": [{"filename": f, "score": sc} for f, sc in
+                                               local_index.search(embedding, k=k, approximate=approximate)]}
+                         for i, embedding in enumerate(embeddings)]
+        questions = [q for q in questions if q["hits"]]
+        if not questions:
+            return results
+        with span("neo4j.neighbourhood_many", questions=len(questions)):
+            rows = graph.query(MULTI_NEIGHBOURHOOD_QUERY, params={"questions": questions})
+    else:
+        with span("neo4j.vector_search_many", k=k, questions=len(embeddings)):
+            rows = graph.query(MULTI_VECTOR_SEARCH_QUERY, params={
+                "k": k, "questions": [{"index": i, "embedding": e} for i, e in enumerate(embeddings)]
+            })
+    for row in rows:
+        results[row.pop("question")].append(row)
+    return results
+
+
+# Les chunks trouvés sont regroupés par consultation parente (score = meilleur chunk)
+CHUNK_SEARCH_QUERY = """
+CALL db.index.vector.queryNodes('chunk_vector', $chunk_k, $embedding)
+YIELD node AS k, score
+WITH k, score
+"""
+
+CHUNK_HITS_QUERY = """
+UNWIND $hits AS hit
+MATCH (k:Chunk {id: hit.id})
+WITH k, hit.score AS score
+"""
+
+CHUNK_AGGREGATE_QUERY = """
+MATCH (k)-[:PARTIE_DE]->(c:Consultation)
+WITH c, max(score) AS score,
+     collect({text: k.text, score: score, position: k.position}) AS passages
+ORDER BY score DESC
+LIMIT $k
+RETURN c.filename AS filename,
+       passages,
+       [(c)-[:MENTIONNE_SYMPTOME]->(s:Symptome) | s.name] AS symptomes,
+       [(c)-[:MENTIONNE_MALADIE]->(m:Maladie) | m.name] AS maladies,
+       score
+"""
+
+# ---------- Plusieurs questions par aller-retour ----------
+# $questions : [{index, hits: [{id, score}]}] (index local) ou [{index, embedding}] (AuraDB).
+# La sous-requête CALL est exécutée une fois par question : le LIMIT $k s'applique
+# à chaque question. Propriétés projetées passées en paramètre ($properties) :
+# le texte de la requête, donc son plan en cache, ne change pas d'un appel à l'autre.
+MULTI_CHUNK_HITS_QUERY = """
+UNWIND $questions AS question
+CALL {
+    WITH question
+    UNWIND question.hits AS hit
+    MATCH (k:Chunk {id: hit.id})
+    WITH k, hit.score AS score
+"""
+
+MULTI_CHUNK_SEARCH_QUERY = """
+UNWIND $questions AS question
+CALL {
+    WITH question
+    CALL db.index.vector.queryNodes('chunk_vector', $chunk_k, question.embedding)
+    YIELD node AS k, score
+    WITH k, score
+"""
+
+MULTI_CHUNK_AGGREGATE_QUERY = """
+    MATCH (k)-[:PARTIE_DE]->(c:Consultation)
+    WITH c, max(score) AS score,
+         collect({text: k.text, score: score, position: k.position}) AS passages
+    ORDER BY score DESC
+    LIMIT $k
+    RETURN c, score, passages
+}
+RETURN question.index AS question,
+       c.filename AS filename,
+       passages,
+       [key IN $properties | c[key]] AS properties,
+       CASE WHEN $entities THEN [(c)-[:MENTIONNE_SYMPTOME]->(s:Symptome) | s.name] ELSE [] END AS symptomes,
+       CASE WHEN $entities THEN [(c)-[:MENTIONNE_MALADIE]->(m:Maladie) | m.name] ELSE [] END AS maladies,
+       score
+ORDER BY question, score DESC
+"""
+
+
+def join_passages(row):
+    """ Passages dans l'ordre du dialogue ; `content` = passages joints (sauf contenu déjà projeté) """
+    row["passages"] = sorted(row["passages"], key=lambda p: p["position"])
+    row.setdefault("content", "\n[...]\n".join(p["text"] for p in row["passages"]))
+    return row
+
+
+def fetch_neighbourhood(graph, hits):
+    """ [(filename, score)] -> lignes de consultation (contenu complet + entités), UNE requête """
+    if not hits:
+        return []
+    with span("neo4j.neighbourhood", hits=len(hits)):
+        return graph.query(NEIGHBOURHOOD_QUERY, params={
+            "hits": [{"filename": f, "score": s} for f, s in hits]
+        })
+
+
+def keyword_shortcut(graph, question, lexical_index, k=TOP_K):
+    """
+    Requête par mots-clés évidente (ex. "hCG") : top-k BM25 sans embedding ni
+    recherche vectorielle. None si la recherche lexicale n'est pas assez nette.
+    """
+    if lexical_index is None or not len(lexical_index):
+        return None
+    with span("retrieval.lexical_search", k=k):
+        hits = lexical_index.search(question, k=k)
+    if not lexical_index.confident(question, hits):
+        return None
+    top = hits[0][1]
+    rows = fetch_neighbourhood(graph, [(f, sc / top) for f, sc in hits])
+    for row in rows:
+        row["retrieval"] = "lexical"
+    return rows
+
+
+def fuse_lexical(graph, rows, question, lexical_index, k=TOP_K):
+    """ Fusion RRF des consultations vectorielles (`rows`, classées) et des résultats BM25 """
+    with span("retrieval.lexical_search", k=LEXICAL_TOP_K):
+        hits = lexical_index.search(question, k=LEXICAL_TOP_K)
+    if not hits:
+        return rows[:k]
+    fused = reciprocal_rank_fusion([[r["filename"] for r in rows], [f for f, _ in hits]])
+    ranked = sorted(fused, key=lambda f: -fused[f])[:k]
+    by_filename = {r["filename"]: dict(r, vector_score=r.get("score")) for r in rows}
+    for row in fetch_neighbourhood(graph, [(f, fused[f]) for f in ranked if f not in by_filename]):
+        by_filename[row["filename"]] = dict(row, vector_score=None)
+    results = []
+    for filename in ranked:
+        row = by_filename.get(filename)
+        if row is None:
+            continue
+        row["score"] = fused[filename]
+        if row.get("passages"):
+            # Ordre du ContextBuilder : d'abord le score fusionné du document, puis celui du passage
+            row["passages"] = [dict(p, score=fused[filename] + 1e-3 * p.get("score", 0.0)) for p in row["passages"]]
+        results.append(row)
+    return results
+
+
+def expand_with_graph(graph, rows, embedding, graph_snapshot, k=TOP_K, local_index=None):
+    """
+    Reclasse `rows` (graines) avec le snapshot du graphe ; les consultations ajoutées
+    par le graphe sont lues en UNE requête de voisinage (contenu complet, réduit ensuite
+    par le ContextBuilder).
+    """
+    vector_scores = (lambda filenames: local_index.scores(embedding, filenames)) if local_index is not None else None
+    ranked = graph_snapshot.rerank({r["filename"]: r["score"] for r in rows}, k, vector_scores=vector_scores)
+    by_filename = {r["filename"]: r for r in rows}
+    for row in fetch_neighbourhood(graph, [(f, sc) for f, sc in ranked if f not in by_filename]):
+        row["expanded"] = True
+        by_filename[row["filename"]] = row
+    results = []
+    for filename, score in ranked:
+        if filename in by_filename:
+            results.append(dict(by_filename[filename], score=score))
+    return results
+
+
+def search_passages(graph, embedding, k=TOP_K, chunk_k=CHUNK_TOP_K, local_chunk_index=None,
+                    local_index=None, graph_snapshot=None, question=None, lexical_index=None):
+    """
+    Top-k consultations trouvées via leurs chunks. `content` ne contient que les
+    tours de parole pertinents (dans l'ordre du dialogue), pas le document entier.
+    Repli sur search_consultations si aucun chunk n'est indexé.
+    """
+    expand = graph_snapshot is not None and len(graph_snapshot) > 0
+    lexical = question is not None and lexical_index is not None and len(lexical_index) > 0
+    # Fusion / expansion : toutes les consultations touchées par les chunks sont candidates
+    fetch_k = max(k, chunk_k) if expand or lexical else k
+    if local_chunk_index is not None and len(local_chunk_index):
+        with span("retrieval.local_chunk_search", k=chunk_k, size=len(local_chunk_index)):
+            hits = local_chunk_index.search(embedding, k=chunk_k)
+        with span("neo4j.chunk_passages", hits=len(hits)):
+            rows = graph.query(CHUNK_HITS_QUERY + CHUNK_AGGREGATE_QUERY, params={
+                "hits": [{"id": i, "score": sc} for i, sc in hits], "k": fetch_k
+            }) if hits else []
+    else:
+        try:
+            with span("neo4j.chunk_vector_search", k=chunk_k):
+                rows = graph.query(CHUNK_SEARCH_QUERY + CHUNK_AGGREGATE_QUERY,
+                                   params={"chunk_k": chunk_k, "k": fetch_k, "embedding": embedding})
+        except Exception:
+            rows = []  # Index chunk_vector absent (graphe ingéré avant le découpage)
+    if not rows:
+        rows = search_consultations(graph, embedding, k=fetch_k, local_index=local_index)
+    else:
+        for row in rows:
+            join_passages(row)
+    if lexical:
+        rows = fuse_lexical(graph, rows, question, lexical_index, k=fetch_k if expand else k)
+    if expand and rows:
+        return expand_with_graph(graph, rows, embedding, graph_snapshot, k=k, local_index=local_index)
+    return rows
+
+
+def plan_db_hits(plan):
+    """ Plan PROFILE (résumé du driver) -> {db_hits, rows, operators: [(opérateur, db hits)]} """
+    operators, stack = [], [plan]
+    while stack:
+        node = stack.pop()
+        operators.append((node.get("operatorType"), node.get("dbHits", 0)))
+        stack.extend(node.get("children", []))
+    return {"db_hits": sum(hits for _, hits in operators), "rows": plan.get("rows"), "operators": operators}
+
+
+_profile_skipped = set()
+
+
+def profile_query(graph, query, params=None):
+    """
+    (lignes, profil) : `PROFILE query` exécuté par le driver neo4j (API publique
+    execute_query, qui rend le résumé avec le plan et ses db hits ; Neo4jGraph.query ne
+    rend que les lignes). Connexion ouverte avec les mêmes variables d'environnement que
+    Neo4jGraph. Graphe embarqué ou NEO4J_URI absent : requête exécutée sans profil (None),
+    et la raison est affichée une fois.
+    """
+    from graph_store import supports_cypher
+    uri = os.environ.get("NEO4J_URI")
+    reason = ("graphe embarqué" if not supports_cypher(graph)
+              else "NEO4J_URI non défini" if not uri else None)
+    if reason is not None:
+        if reason not in _profile_skipped:
+            _profile_skipped.add(reason)
+            print(f"   ℹ️ PROFILE non disponible ({reason}) : requêtes exécutées sans db hits.")
+        return graph.query(query, params=params), None
+    from neo4j import GraphDatabase
+    auth = (os.environ.get("NEO4J_USERNAME", "neo4j"), os.environ.get("NEO4J_PASSWORD", ""))
+    with GraphDatabase.driver(uri, auth=auth) as driver:
+        records, summary, _ = driver.execute_query("PROFILE " + query, params or {},
+                                                   database_=os.environ.get("NEO4J_DATABASE", "neo4j"))
+    rows = [record.data() for record in records]
+    return rows, plan_db_hits(summary.profile) if summary.profile else None
+
+
+def search_passages_many(graph, embeddings, k=TOP_K, chunk_k=CHUNK_TOP_K, local_chunk_index=None,
+                         local_index=None, properties=(), entities=True, profile=False):
+    """
+    Plusieurs questions en UN aller-retour : une liste de résultats par vecteur de
+    `embeddings`, au format de search_passages (passages pertinents, sans fusion
+    lexicale ni expansion). `properties` : propriétés de Consultation à projeter
+    (ex. ("content",) pour le document complet) ; `entities=False` : sans symptômes /
+    maladies. profile=True : renvoie (résultats, profil PROFILE ou None).
+    """
+    embeddings = list(embeddings)
+    results = [[] for _ in embeddings]
+    params = {"k": k, "chunk_k": chunk_k, "properties": list(properties), "entities": entities}
+    if local_chunk_index is not None and len(local_chunk_index):
+        with span("retrieval.local_chunk_search", k=chunk_k, questions=len(embeddings)):
+            params["questions"] = [{"index": i, "hits": [{"id": key, "score": sc} for key, sc in
+                                                         local_chunk_index.search(embedding, k=chunk_k)]}
+                                   for i, embedding in enumerate(embeddings)]
+        query = MULTI_CHUNK_HITS_QUERY + MULTI_CHUNK_AGGREGATE_QUERY
+    else:
+        params["questions"] = [{"index": i, "embedding": embedding} for i, embedding in enumerate(embeddings)]
+        query = MULTI_CHUNK_SEARCH_QUERY + MULTI_CHUNK_AGGREGATE_QUERY
+    plan, rows = None, []
+    if embeddings:
+        try:
+            with span("neo4j.chunk_passages_many", questions=len(embeddings), profile=profile) as s:
+                if profile:
+                    rows, plan = profile_query(graph, query, params)
+                    s.set(db_hits=plan["db_hits"] if plan else None)
+                else:
+                    rows = graph.query(query, params=params)
+        except NotImplementedError:
+            raise  # Graphe embarqué : opération inconnue, jamais masquée par le repli
+        except Exception:
+            rows = []  # Index chunk_vector absent (graphe ingéré avant le découpage)
+        for row in rows:
+            values = row.pop("properties")
+            row.update(zip(properties, values))
+            results[row.pop("question")].append(join_passages(row))
+    # Questions sans chunk indexé : repli sur les consultations, comme search_passages,
+    # mais toutes ensemble en UN aller-retour de plus (pas un par question)
+    missing = [i for i, rows in enumerate(results) if not rows]
+    if missing:
+        fallback = search_consultations_many(graph, [embeddings[i] for i in missing], k=k, local_index=local_index)
+        for i, rows in zip(missing, fallback):
+            results[i] = rows
+    return (results, plan) if profile else results
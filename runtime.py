@@ -0,0 +1,165 @@
+import time
+import threading
+
+from vector_index import open_local_index, INDEX_DIR, CHUNK_INDEX_DIR
+from graph_expansion import open_snapshot, SNAPSHOT_DIR
+from lexical_index import open_lexical_index, LEXICAL_INDEX_DIR
+from context_builder import count_tokens
+from embedding_cache import EmbeddingCache, CachedEmbeddings
+from embedding_backends import load_embeddings, cache_namespace, DEFAULT_BACKEND
+from answer_cache import SemanticAnswerCache
+
+# ==========================================
+# 👇 SINGLETONS PARESSEUX (GRAPHE, LLM, EMBEDDINGS) 👇
+# ==========================================
+# Les scripts ne construisent plus rien à l'import : langchain / langgraph, les poids
+# SentenceTransformer et la connexion Neo4j ne sont chargés qu'au premier usage, puis
+# partagés (un seul exemplaire par processus et par nom de modèle).
+#   - get_graph / get_llm / get_embeddings / get_local_index : construction à la demande,
+#   - warm_up() : préchargement en arrière-plan pendant que la boucle input() attend,
+#   - override() : doublures locales (benchmarks, fakes.py) sans patcher les imports.
+
+DEFAULT_EMBEDDING_MODEL = "all-MiniLM-L6-v2"
+DEFAULT_LLM_MODEL = "llama-3.1-8b-instant"
+
+_instances = {}
+_overrides = {}
+_locks = {}
+_locks_guard = threading.Lock()
+load_seconds = {}  # clé -> durée de construction
+
+
+def _lock_for(key):
+    with _locks_guard:
+        return _locks.setdefault(key, threading.Lock())
+
+
+def _get(key, factory, override_key):
+    if override_key in _overrides:
+        return _overrides[override_key]
+    if key in _instances:
+        return _instances[key]
+    # Un verrou par ressource : le préchargement des embeddings ne bloque pas la connexion Neo4j
+    with _lock_for(key):
+        if key not in _instances:
+            start = time.perf_counter()
+            _instances[key] = factory()
+            load_seconds[key] = time.perf_counter() - start
+    return _instances[key]
+
+
+def get_graph():
+    """
+    Graphe partagé (GRAPH_BACKEND : neo4j, embedded ou replica, voir graph_store.py) ;
+    le schéma Neo4j n'est introspecté que si un outil en a besoin
+    """
+    def factory():
+        from graph_store import open_graph
+        return open_graph()
+    return _get("graph", factory, "graph")
+
+
+def ensure_schema(graph):
+    """ Introspection du schéma (GraphCypherQAChain), faite une seule fois """
+    if not getattr(graph, "schema", None) and hasattr(graph, "refresh_schema"):
+        graph.refresh_schema()
+    return graph
+
+
+def get_llm(model_name=DEFAULT_LLM_MODEL, temperature=0):
+    def factory():
+        from langchain_groq import ChatGroq
+        return ChatGroq(model_name=model_name, temperature=temperature)
+    return _get(("llm", model_name, temperature), factory, "llm")
+
+
+def get_embedding_cache(model_name=DEFAULT_EMBEDDING_MODEL):
+    """ Cache d'embeddings (questions en mémoire, documents sur disque) propre au modèle """
+    return _get(("embedding_cache", model_name), lambda: EmbeddingCache(model_name), "embedding_cache")
+
+
+def get_embeddings(model_name=DEFAULT_EMBEDDING_MODEL, backend=DEFAULT_BACKEND):
+    """
+    Modèle d'embedding (backend torch / onnx / onnx-int8, voir embedding_backends.py)
+    enveloppé par son cache : un texte déjà vu n'est pas revectorisé
+    """
+    def factory():
+        embeddings = load_embeddings(model_name, backend)
+        namespace = cache_namespace(model_name, backend)
+        cache = get_embedding_cache(namespace)
+        return CachedEmbeddings(embeddings, namespace, cache) if cache is not None else embeddings
+    return _get(("embeddings", model_name, backend), factory, "embeddings")
+
+
+def get_answer_cache(namespace):
+    """ Cache sémantique des réponses du LLM (answer_cache.py), un par espace de noms """
+    return _get(("answer_cache", namespace), lambda: SemanticAnswerCache(namespace), "answer_cache")
+
+
+def get_local_index(path=INDEX_DIR, embedding_model_name=DEFAULT_EMBEDDING_MODEL):
+    """ Index vectoriel local (memmap) ou None s'il n'a pas encore été synchronisé """
+    override_key = "local_chunk_index" if path == CHUNK_INDEX_DIR else "local_index"
+    return _get(("index", path, embedding_model_name),
+                lambda: open_local_index(path, embedding_model_name=embedding_model_name), override_key)
+
+
+def get_graph_snapshot(path=SNAPSHOT_DIR):
+    """ Snapshot CSR du graphe (graph_expansion.py) ou None s'il n'a pas encore été synchronisé """
+    return _get(("index", path), lambda: open_snapshot(path), "graph_snapshot")
+
+
+def get_lexical_index(path=LEXICAL_INDEX_DIR):
+    """ Index BM25 (lexical_index.py) ou None s'il n'a pas encore été construit """
+    return _get(("index", path), lambda: open_lexical_index(path), "lexical_index")
+
+
+def invalidate_local_indexes():
+    """ À appeler après une ingestion qui a resynchronisé les index locaux (et le snapshot du graphe) """
+    for key in [k for k in _instances if isinstance(k, tuple) and k[0] == "index"]:
+        del _instances[key]
+
+
+def override(**instances):
+    """
+    graph=, llm=, embeddings=, embedding_cache=, answer_cache=, local_index=, local_chunk_index=,
+    graph_snapshot=, lexical_index= (None = absent)
+    """
+    _overrides.update(instances)
+
+
+def reset():
+    _instances.clear()
+    _overrides.clear()
+    load_seconds.clear()
+
+
+def warm_up(embedding_model_name=DEFAULT_EMBEDDING_MODEL, llm_model_name=None, graph=True,
+            local_indexes=True, background=True):
+    """
+    Précharge les ressources (poids du modèle + premier embed_query, connexion Neo4j,
+    index locaux). En arrière-plan par défaut : l'invite est affichée tout de suite et
+    la première question attend seulement ce qui n'est pas encore prêt.
+    """
+    def run():
+        try:
+            get_embeddings(embedding_model_name).embed_query("warm-up")
+            count_tokens("warm-up")  # Tokenizer du ContextBuilder
+            if local_indexes:
+                get_local_index(INDEX_DIR, embedding_model_name)
+                get_local_index(CHUNK_INDEX_DIR, embedding_model_name)
+                get_graph_snapshot()
+                get_lexical_index()
+            if graph:
+                get_graph().query("RETURN 1")
+            if llm_model_name:
+                get_llm(llm_model_name)
+        except Exception as e:
+            print(f"\n⚠️ Préchargement interrompu : {e}")
+
+    if not background:
+        run()
+        return None
+    thread = threading.Thread(target=run, name="graphrag-warm-up", daemon=True)
+    thread.start()
+    return thread
+
@@ -0,0 +1,6 @@
+import os
+import sys
+
+# Permet d'importer les modules du projet depuis tests/ (comme benchmarks/)
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
@@ -0,0 +1,91 @@
+import pytest
+
+from answer_cache import SemanticAnswerCache, answer_namespace, invalidate_answers
+from fakes import FakeEmbeddings
+
+# ==========================================
+# 👇 CACHE SÉMANTIQUE DES RÉPONSES 👇
+# ==========================================
+
+EMBEDDINGS = FakeEmbeddings(dim=64)
+QUESTION = "J'ai mal à la tête, que faire ?"
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "answers.sqlite")
+
+
+@pytest.fixture
+def cache(path):
+    cache = SemanticAnswerCache("ns", path=path)
+    yield cache
+    cache.close()
+
+
+def vector(text=QUESTION):
+    return EMBEDDINGS.embed_query(text)
+
+
+def test_hit_sur_memes_sources(cache):
+    cache.put(QUESTION, vector(), ["a.txt", "b.txt"], "Reposez-vous.", llm_seconds=2.0)
+    assert cache.lookup(vector(), ["b.txt", "a.txt"]) == "Reposez-vous."
+    assert cache.stats()["hits"] == 1 and cache.stats()["llm_seconds_saved"] == 2.0
+
+
+def test_miss_si_sources_differentes(cache):
+    cache.put(QUESTION, vector(), ["a.txt"], "Reposez-vous.")
+    assert cache.lookup(vector(), ["a.txt", "c.txt"]) is None
+    assert cache.source_mismatches == 1
+
+
+def test_miss_sous_le_seuil(cache):
+    cache.put(QUESTION, vector(), ["a.txt"], "Reposez-vous.")
+    assert cache.lookup(vector("Douleur au dos après un effort"), ["a.txt"]) is None
+
+
+def test_invalidate_par_source(cache):
+    cache.put(QUESTION, vector(), ["a.txt", "b.txt"], "r1")
+    cache.put("Fièvre ?", vector("Fièvre ?"), ["c.txt"], "r2")
+    assert cache.invalidate(["b.txt", "inconnu.txt"]) == 1
+    assert cache.lookup(vector(), ["a.txt", "b.txt"]) is None
+    assert cache.lookup(vector("Fièvre ?"), ["c.txt"]) == "r2"
+    assert len(cache) == 1 and cache.invalidated == 1
+
+
+def test_invalidate_tout(cache):
+    cache.put(QUESTION, vector(), ["a.txt"], "r1")
+    cache.put("Fièvre ?", vector("Fièvre ?"), ["c.txt"], "r2")
+    assert cache.invalidate() == 2
+    assert len(cache) == 0
+
+
+def test_invalidation_par_l_ingestion_vue_des_autres_processus(path, cache):
+    cache.put(QUESTION, vector(), ["a.txt"], "r1")
+    assert invalidate_answers(["a.txt"], path=path) == 1
+    # Autre connexion : l'index en mémoire est rechargé (PRAGMA data_version)
+    assert cache.lookup(vector(), ["a.txt"]) is None
+    assert len(cache) == 0
+
+
+def test_invalidate_answers_sans_cache(tmp_path):
+    assert invalidate_answers(["a.txt"], path=str(tmp_path / "absent.sqlite")) == 0
+
+
+def test_espaces_de_noms_separes(path, cache):
+    cache.put(QUESTION, vector(), ["a.txt"], "r1")
+    other = SemanticAnswerCache("autre", path=path)
+    assert other.lookup(vector(), ["a.txt"]) is None
+    other.close()
+
+
+def test_espace_de_noms_tire_du_prompt():
+    def prompt_a(question, context):
+        return f"Contexte : {context}\nQuestion : {question}"
+
+    def prompt_b(question, context):
+        return f"Question : {question}\nContexte : {context}"
+
+    assert answer_namespace("llm", "emb", prompt_a) == answer_namespace("llm", "emb", prompt_a)
+    assert answer_namespace("llm", "emb", prompt_a) != answer_namespace("llm", "emb", prompt_b)
+    assert answer_namespace("llm", "emb", prompt_a) != answer_namespace("llm2", "emb", prompt_a)
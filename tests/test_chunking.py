@@ -0,0 +1,73 @@
+from chunking import split_turns, chunk_document, chunk_id
+
+# ==========================================
+# 👇 DÉCOUPAGE PAR TOURS DE PAROLE 👇
+# ==========================================
+
+DIALOGUE = """<01> patient : Hi doctor, I have a headache.
+<02> doctor : Since when?
+<03> patient : Three days, with fever.
+<04> doctor : Take paracetamol and rest.
+"""
+
+TRANSCRIPT = """<01> hotesse
+     h: bonjour
+<02> hotesse+client
+     h: je vous écoute
+     c: c'est pour ma fille
+"""
+
+
+def test_tours_et_locuteurs():
+    turns = split_turns(DIALOGUE)
+    assert [t["turn"] for t in turns] == [1, 2, 3, 4]
+    assert [t["speaker"] for t in turns] == ["patient", "doctor", "patient", "doctor"]
+    assert turns[0]["text"] == "<01> patient : Hi doctor, I have a headache."
+
+
+def test_tours_multilignes_du_corpus_data():
+    turns = split_turns(TRANSCRIPT)
+    assert [t["speaker"] for t in turns] == ["hotesse", "hotesse+client"]
+    assert turns[1]["text"].endswith("c: c'est pour ma fille")
+
+
+def test_texte_non_balise():
+    assert split_turns("  texte libre  ") == [{"turn": 0, "speaker": "", "text": "texte libre"}]
+    assert split_turns("   ") == []
+    assert chunk_document("") == []
+
+
+def test_document_court_un_seul_chunk():
+    chunks = chunk_document(DIALOGUE)
+    assert len(chunks) == 1
+    assert (chunks[0]["turn_start"], chunks[0]["turn_end"]) == (1, 4)
+    assert chunks[0]["speakers"] == ["doctor", "patient"]
+
+
+def test_coupure_sur_les_tours_avec_recouvrement():
+    chunks = chunk_document(DIALOGUE, max_chars=90, overlap_turns=1)
+    assert len(chunks) > 1
+    assert [c["index"] for c in chunks] == list(range(len(chunks)))
+    assert all(len(c["text"]) <= 90 for c in chunks)
+    for previous, current in zip(chunks, chunks[1:]):
+        # Le dernier tour d'un chunk ouvre le suivant
+        assert current["turn_start"] == previous["turn_end"]
+    assert chunks[-1]["turn_end"] == 4
+
+
+def test_sans_recouvrement():
+    chunks = chunk_document(DIALOGUE, max_chars=90, overlap_turns=0)
+    for previous, current in zip(chunks, chunks[1:]):
+        assert current["turn_start"] == previous["turn_end"] + 1
+
+
+def test_tour_trop_long_coupe_en_phrases():
+    long_turn = "<01> patient : " + " ".join(f"Phrase numéro {i}." for i in range(40))
+    chunks = chunk_document(long_turn, max_chars=100)
+    assert len(chunks) > 1
+    assert all(len(c["text"]) <= 100 for c in chunks)
+    assert all(c["turn_start"] == c["turn_end"] == 1 for c in chunks)
+
+
+def test_chunk_id():
+    assert chunk_id("sub/a.txt", 3) == "sub/a.txt#3"
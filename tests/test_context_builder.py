@@ -0,0 +1,29 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from context_builder import ContextBuilder
+
+# ==========================================
+# 👇 CONTEXTE : STATISTIQUES PAR APPEL 👇
+# ==========================================
+
+
+def results(n):
+    return [{"filename": f"{i}.txt", "score": 1.0 - i / 100, "symptomes": [], "maladies": [],
+             "content": f"Le patient {i} a de la fièvre. " * (i + 1)} for i in range(n)]
+
+
+def test_statistiques_rendues_avec_le_contexte():
+    builder = ContextBuilder(max_tokens=200)
+    context, stats = builder.build_with_stats("fièvre", results(3))
+    assert context == builder.build("fièvre", results(3))
+    assert stats["documents"] == 3 and 0 < stats["context_tokens"] <= 200
+    assert stats["saved_tokens"] == max(0, stats["original_tokens"] - stats["context_tokens"])
+
+
+def test_instance_partagee_entre_threads():
+    builder = ContextBuilder()
+    expected = {n: builder.build_with_stats("fièvre", results(n))[1] for n in range(1, 9)}
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        found = list(executor.map(lambda n: (n, builder.build_with_stats("fièvre", results(n))[1]),
+                                  [n for n in range(1, 9)] * 20))
+    assert all(stats == expected[n] for n, stats in found)
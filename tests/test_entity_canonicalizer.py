@@ -0,0 +1,142 @@
+import numpy as np
+
+from entity_canonicalizer import (
+    EntityCanonicalizer, canonical_key, within_one_edit, opposite, fuzzy_equal, merge_duplicates
+)
+from fakes import InMemoryGraph
+from graph_stats import SNAPSHOT_QUERY, refresh_entity_stats
+from graph_writer import GraphBatchWriter
+
+# ==========================================
+# 👇 CANONICALISATION DES ENTITÉS 👇
+# ==========================================
+
+
+def fixed_embed(vectors):
+    """ embed_documents avec des vecteurs imposés par nom (les autres : nuls, jamais proches) """
+    def embed(names):
+        return [vectors.get(name, np.zeros(64, dtype=np.float32)) for name in names]
+    return embed
+
+
+def test_cle_canonique():
+    assert canonical_key("Les Maux de Tête") == canonical_key("mal de tête") == "mal de tete"
+    assert canonical_key("les douleurs") == "douleur"
+    assert canonical_key("l'asthme") == "asthme"
+    assert canonical_key("Yeux rouges") == "oeil rouge"
+
+
+def test_articles_en_tete_seulement():
+    assert canonical_key("hépatite A") == "hepatite a"
+    assert canonical_key("hépatite A") != canonical_key("Hépatite")
+
+
+def test_forme_et_alias_connus():
+    c = EntityCanonicalizer()
+    c.add("Symptome", "mal de tête", aliases=["migraine legere"])
+    assert c.resolve("Symptome", "Maux de tête") == "mal de tête"
+    assert c.resolve("Symptome", "migraine légère") == "mal de tête"
+    assert c.resolve("Symptome", "mal de tête") == "mal de tête"
+    assert c.stats["exact"] == 1 and c.stats["alias"] == 2
+
+
+def test_synonyme_medical_seme():
+    c = EntityCanonicalizer()
+    c.add("Symptome", "fièvre")
+    assert c.resolve("Symptome", "Pyrexie") == "fièvre"
+    assert c.new_aliases["Symptome"] == {"fièvre": {"pyrexie"}}
+
+
+def test_faute_de_frappe():
+    c = EntityCanonicalizer()
+    c.add("Maladie", "bronchite")
+    assert c.resolve("Maladie", "bronchitte") == "bronchite"
+    assert c.stats["fuzzy"] == 1
+    # Mots courts : pas de rapprochement par édition
+    c.add("Maladie", "gale")
+    assert c.resolve("Maladie", "gala") == "gala"
+
+
+def test_types_de_diabete_jamais_fusionnes():
+    c = EntityCanonicalizer()
+    c.add("Maladie", "diabète de type 1")
+    assert c.resolve("Maladie", "diabète de type 2") == "diabète de type 2"
+    assert c.resolve("Maladie", "Diabètes de type 1") == "diabète de type 1"
+    assert c.stats["fuzzy"] == 0
+
+
+def test_hepatites_jamais_fusionnees():
+    c = EntityCanonicalizer()
+    c.add("Maladie", "hépatite b")
+    c.add("Maladie", "hépatite")
+    assert c.resolve("Maladie", "hépatite c") == "hépatite c"
+    assert c.resolve("Maladie", "hépatite a") == "hépatite a"
+    assert c.resolve("Maladie", "Hépatite A") == "hépatite a"
+    assert c.resolve("Maladie", "l'hépatite b") == "hépatite b"
+    assert c.stats["fuzzy"] == 0
+
+
+def test_faute_de_frappe_limitee_aux_mots_alphabetiques():
+    assert fuzzy_equal("bronchite aigue", "bronchitte aigue")
+    assert not fuzzy_equal("diabete de type 1", "diabete de type 2")
+    assert not fuzzy_equal("covid 19", "covid 18")
+    assert not fuzzy_equal("hepatite b", "hepatite c")
+    assert not fuzzy_equal("angine", "angines rouge")  # Mot ajouté, pas une faute de frappe
+    assert not fuzzy_equal("bronchite", "bronchite")
+
+
+def test_embedding_ne_fusionne_pas_les_types():
+    same = np.ones(64, dtype=np.float32)
+    c = EntityCanonicalizer(embed=fixed_embed({"diabète de type 1": same, "diabète de type 2": same}))
+    c.add("Maladie", "diabète de type 1")
+    assert c.resolve("Maladie", "diabète de type 2") == "diabète de type 2"
+    assert c.stats["embedding"] == 0
+
+
+def test_prefixes_opposes_jamais_fusionnes():
+    assert opposite("hypertension", "hypotension")
+    assert within_one_edit("hypertension", "hypotension") is False  # deux éditions
+    same = np.ones(64, dtype=np.float32)
+    c = EntityCanonicalizer(embed=fixed_embed({"tachycardie": same, "bradycardie": same}))
+    c.add("Symptome", "tachycardie")
+    assert c.resolve("Symptome", "bradycardie") == "bradycardie"
+    assert c.stats["new"] == 1 and c.stats["embedding"] == 0
+
+
+def test_plus_proche_voisin_par_embedding():
+    close = np.ones(64, dtype=np.float32)
+    c = EntityCanonicalizer(embed=fixed_embed({"céphalée de tension": close, "mal de tête": close}))
+    c.add("Symptome", "mal de tête")
+    assert c.resolve("Symptome", "céphalée de tension") == "mal de tête"
+    assert c.stats["embedding"] == 1
+
+
+def test_nouvelle_entite_puis_reconnue():
+    c = EntityCanonicalizer(embed=fixed_embed({}))
+    c.add("Symptome", "fièvre")
+    assert c.resolve("Symptome", "Toux sèche") == "toux sèche"
+    assert c.resolve("Symptome", "toux seches") == "toux sèche"
+    assert c.stats["new"] == 1
+
+
+def test_types_separes():
+    c = EntityCanonicalizer()
+    c.add("Maladie", "grippe")
+    assert c.resolve("Symptome", "grippe") == "grippe"
+    assert c.stats["new"] == 1
+
+
+def test_fusion_vers_un_synonyme_absent_du_graphe():
+    # "céphalée" se rattache au nom canonique semé "mal de tête", absent du graphe
+    graph = InMemoryGraph()
+    writer = GraphBatchWriter(graph)
+    for filename, symptoms in (("a.txt", ["céphalée"]), ("b.txt", ["céphalée", "fièvre"])):
+        writer.add(filename, filename, [0.0] * 8, {"symptomes": symptoms, "maladies": []})
+    writer.close()
+    refresh_entity_stats(graph, [f"Symptome:{name}" for name in ("céphalée", "fièvre")])
+    merges = merge_duplicates(graph)
+    assert merges["Symptome"][0]["canonical"] == "mal de tête"
+    rows = {r["name"]: r for r in graph.query(SNAPSHOT_QUERY) if r["label"] == "Symptome"}
+    assert "céphalée" not in rows
+    assert rows["mal de tête"]["doc_count"] == 2
+    assert "cephalee" in rows["mal de tête"]["aliases"]
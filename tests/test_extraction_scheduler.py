@@ -0,0 +1,95 @@
+import time
+
+from extraction_scheduler import ExtractionScheduler, retry_after
+from fakes import FakeRateLimitError
+
+# ==========================================
+# 👇 ORDONNANCEUR : RETRY-AFTER ET DEAD-LETTERS 👇
+# ==========================================
+
+
+class ServerError(Exception):
+    def __init__(self, status_code):
+        super().__init__(f"Error code: {status_code}")
+        self.status_code = status_code
+
+
+def failing(errors, result="ok"):
+    """ Coroutine qui lève les erreurs de `errors` une par une, puis renvoie `result` """
+    errors = list(errors)
+    calls = []
+
+    async def call(item):
+        calls.append(time.monotonic())
+        if errors:
+            raise errors.pop(0)
+        return result
+
+    return call, calls
+
+
+def scheduler(call, **kwargs):
+    options = dict(concurrency=2, rpm=6000, tpm=None, base_delay=0.0, max_retries=3)
+    options.update(kwargs)
+    return ExtractionScheduler(call, **options)
+
+
+def test_retry_after_lu_sur_la_reponse_http():
+    assert retry_after(FakeRateLimitError(retry_after=2.5)) == 2.5
+    assert retry_after(ValueError("429")) is None
+
+
+def test_429_attend_retry_after_puis_reussit():
+    call, calls = failing([FakeRateLimitError(retry_after=0.2)])
+    s = scheduler(call)
+    assert s.run_sync(["doc"]) == ["ok"]
+    assert len(calls) == 2
+    assert calls[1] - calls[0] >= 0.2
+    assert (s.retries, s.rate_limited, s.dead_letters) == (1, 1, [])
+
+
+def test_retry_after_bloque_aussi_les_autres_documents():
+    # Le seau de requêtes est vidé : le document suivant attend lui aussi
+    call, calls = failing([FakeRateLimitError(retry_after=0.2)])
+    s = scheduler(call, concurrency=1)
+    start = time.monotonic()
+    assert s.run_sync(["a", "b"]) == ["ok", "ok"]
+    assert time.monotonic() - start >= 0.2
+
+
+def test_dead_letter_apres_max_retries():
+    call, calls = failing([ServerError(503)] * 10)
+    s = scheduler(call, max_retries=2)
+    results = s.run_sync(["ok", "ko"])
+    assert results == [None, None]
+    assert len(calls) == 6
+    assert sorted(d["item"] for d in s.dead_letters) == ["ko", "ok"]
+    assert all("503" in d["error"] for d in s.dead_letters)
+
+
+def test_erreur_non_reessayable_directement_en_dead_letter():
+    seen = []
+    call, calls = failing([ValueError("JSON invalide")])
+    s = scheduler(call, on_result=lambda index, item, result, error: seen.append((item, result, error)))
+    assert s.run_sync(["doc"]) == [None]
+    assert len(calls) == 1 and s.retries == 0
+    assert s.dead_letters[0]["index"] == 0
+    assert seen == [("doc", None, s.dead_letters[0]["error"])]
+
+
+def test_quota_partage_entre_les_lots():
+    # L'ingestion en flux appelle run_sync lot par lot : le quota ne repart pas à zéro
+    call, calls = failing([])
+    s = scheduler(call, rpm=3)
+    s.run_sync(["a", "b", "c"])
+    assert s.request_bucket.tokens < 1
+
+
+def test_pause_retry_after_conservee_au_lot_suivant():
+    call, calls = failing([])
+    s = scheduler(call)
+    s.run_sync(["a"])
+    s.request_bucket.drain(0.2)  # 429 reçu à la fin du lot précédent
+    start = time.monotonic()
+    assert s.run_sync(["b"]) == ["ok"]
+    assert time.monotonic() - start >= 0.2
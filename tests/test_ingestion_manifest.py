@@ -0,0 +1,51 @@
+from ingestion_manifest import (
+    plan_changes, manifest_properties, version_properties, graph_version, bump_graph_version
+)
+from fakes import InMemoryGraph
+
+# ==========================================
+# 👇 MANIFESTE D'INGESTION : PLAN INCRÉMENTAL 👇
+# ==========================================
+
+VERSIONS = version_properties("extracteur-v1", "MiniLM", "turns-v1")
+
+
+def manifest(documents, versions=VERSIONS):
+    return {filename: manifest_properties(content, versions) for filename, content in documents.items()}
+
+
+def test_nouveau_modifie_inchange_supprime():
+    known = manifest({"a.txt": "fièvre", "b.txt": "toux", "c.txt": "migraine"})
+    documents = {"a.txt": "fièvre", "b.txt": "toux sèche", "d.txt": "angine"}
+    to_process, unchanged, deleted = plan_changes(known, documents, VERSIONS)
+    assert sorted(to_process) == ["b.txt", "d.txt"]
+    assert unchanged == ["a.txt"]
+    assert deleted == ["c.txt"]
+
+
+def test_changement_de_version_retraite_tout():
+    documents = {"a.txt": "fièvre", "b.txt": "toux"}
+    known = manifest(documents)
+    for key in VERSIONS:
+        expected = dict(VERSIONS, **{key: "v2"})
+        to_process, unchanged, deleted = plan_changes(known, documents, expected)
+        assert (sorted(to_process), unchanged, deleted) == (["a.txt", "b.txt"], [], [])
+
+
+def test_entree_sans_version_retraitee():
+    # Consultation ingérée avant le manifeste : pas de propriétés de version
+    known = {"a.txt": {"content_hash": manifest_properties("fièvre", {})["content_hash"]}}
+    assert plan_changes(known, {"a.txt": "fièvre"}, VERSIONS) == (["a.txt"], [], [])
+
+
+def test_rien_a_faire():
+    documents = {"a.txt": "fièvre"}
+    assert plan_changes(manifest(documents), documents, VERSIONS) == ([], ["a.txt"], [])
+
+
+def test_bump_graph_version():
+    graph = InMemoryGraph()
+    first = bump_graph_version(graph)
+    assert graph_version(graph) == first
+    second = bump_graph_version(graph)
+    assert second != first and graph_version(graph) == second
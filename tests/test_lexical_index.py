@@ -0,0 +1,77 @@
+import pytest
+
+from lexical_index import LexicalIndex, tokenize, document_terms, reciprocal_rank_fusion
+
+# ==========================================
+# 👇 INDEX LEXICAL BM25 : RECHERCHE ET RACCOURCI 👇
+# ==========================================
+
+DOCUMENTS = {
+    "grossesse.txt": "Mon test de grossesse est positif mais le taux d'hCG ne double pas.",
+    "migraine.txt": "J'ai une migraine et des maux de tête depuis trois jours, avec nausées.",
+    "gorge.txt": "Fièvre et mal à la gorge : angine probable, la fièvre dure depuis hier.",
+    "dos.txt": "Douleur au dos après avoir soulevé une charge, la douleur descend dans la jambe.",
+}
+
+
+@pytest.fixture
+def index(tmp_path):
+    return LexicalIndex(str(tmp_path / "lexical")).build(DOCUMENTS)
+
+
+def test_tokenisation_francaise():
+    assert tokenize("L'hCG ne double pas") == ["hcg", "double"]
+    assert tokenize("qu'il tousse, j'ai des maux") == ["tousse", "mal"]
+    assert document_terms("Fièvres, fièvre et nausée") == ({"fievre": 2, "nausee": 1}, 3)
+
+
+def test_recherche_classe_le_bon_document(index):
+    hits = index.search("taux hCG", k=3)
+    assert hits[0][0] == "grossesse.txt"
+    assert [score for _, score in hits] == sorted((score for _, score in hits), reverse=True)
+    assert index.search("fièvre gorge")[0][0] == "gorge.txt"
+
+
+def test_recherche_sans_terme_connu(index):
+    assert index.search("xylophone") == []
+    assert index.search("le la de") == []
+
+
+def test_frequence_du_terme_compte(index):
+    # "douleur" deux fois dans dos.txt
+    assert index.search("douleur")[0][0] == "dos.txt"
+
+
+def test_construction_depuis_les_resumes(tmp_path, index):
+    summaries = {f: document_terms(t) for f, t in DOCUMENTS.items()}
+    other = LexicalIndex(str(tmp_path / "resumes")).build(summaries)
+    assert other.search("migraine nausées") == index.search("migraine nausées")
+
+
+def test_rechargement_memory_map(tmp_path, index):
+    reopened = LexicalIndex(index.path).load()
+    assert len(reopened) == len(DOCUMENTS)
+    assert reopened.search("angine") == index.search("angine")
+
+
+def test_raccourci_confiant(index):
+    hits = index.search("hCG")
+    assert index.confident("hCG", hits)
+
+
+def test_raccourci_refuse(index):
+    # Terme inconnu
+    assert not index.confident("hCG xylophone", index.search("hCG xylophone"))
+    # Trop de termes
+    query = "fièvre gorge angine hier"
+    assert not index.confident(query, index.search(query))
+    # Tous les termes ne sont pas dans le premier document
+    assert not index.confident("fièvre migraine", index.search("fièvre migraine"))
+    # Aucun résultat
+    assert not index.confident("hCG", [])
+
+
+def test_fusion_rrf():
+    fused = reciprocal_rank_fusion([["a", "b"], ["a", "c"]])
+    assert fused["a"] == pytest.approx(1.0)
+    assert fused["b"] == fused["c"] < fused["a"]
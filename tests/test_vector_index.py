@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+
+from chunking import chunk_document, chunk_id
+from fakes import InMemoryGraph, FakeEmbeddings
+from graph_writer import GraphBatchWriter
+from ingestion_manifest import detach_consultations
+from vector_index import sync_from_neo4j, refresh_from_neo4j
+
+# ==========================================
+# 👇 INDEX VECTORIEL LOCAL : MISE À JOUR INCRÉMENTALE 👇
+# ==========================================
+
+EMBEDDINGS = FakeEmbeddings(dim=32)
+DOCUMENTS = {
+    "a.txt": "<01> patient : J'ai de la fièvre.\n<02> docteur : Depuis quand ?",
+    "b.txt": "<01> patient : Mal à la gorge.\n<02> docteur : Une angine ?",
+    "c.txt": "<01> patient : Douleur au dos.",
+}
+
+
+def write(graph, documents):
+    writer = GraphBatchWriter(graph)
+    for filename, content in documents.items():
+        chunks = chunk_document(content, max_chars=40)
+        for chunk in chunks:
+            chunk["id"] = chunk_id(filename, chunk["index"])
+            chunk["embedding"] = EMBEDDINGS.embed_query(chunk["text"])
+        writer.add(filename, content, EMBEDDINGS.embed_query(content), {}, chunks=chunks)
+    writer.close()
+
+
+@pytest.mark.parametrize("label", ["Consultation", "Chunk"])
+def test_mise_a_jour_identique_a_une_copie_complete(tmp_path, label):
+    graph = InMemoryGraph()
+    write(graph, DOCUMENTS)
+    sync_from_neo4j(graph, str(tmp_path / "inc"), label, quantization="int8")
+    # b.txt modifié, c.txt supprimé, d.txt ajouté
+    detach_consultations(graph, ["b.txt"], ["c.txt"])
+    write(graph, {"b.txt": "<01> patient : Toux sèche la nuit.", "d.txt": "<01> patient : Vertiges."})
+    index = refresh_from_neo4j(graph, ["b.txt", "c.txt", "d.txt"], str(tmp_path / "inc"), label,
+                               quantization="int8")
+    full = sync_from_neo4j(graph, str(tmp_path / "full"), label, quantization="int8")
+    assert index.ids == full.ids
+    assert np.allclose(index.matrix, full.matrix)
+    assert index.quantization == "int8"
+    assert not any(i.startswith("c.txt") for i in index.ids)
+
+
+def test_autre_quantification_copie_complete(tmp_path):
+    graph = InMemoryGraph()
+    write(graph, DOCUMENTS)
+    sync_from_neo4j(graph, str(tmp_path / "v"), quantization="int8")
+    index = refresh_from_neo4j(graph, [], str(tmp_path / "v"), quantization=None)
+    assert index.quantization is None and len(index) == len(DOCUMENTS)
@@ -0,0 +1,255 @@
+import os
+import json
+import time
+import atexit
+import bisect
+import inspect
+import functools
+import contextvars
+
+# ==========================================
+# 👇 TRAÇAGE DES ÉTAPES (SPANS + HISTOGRAMMES) 👇
+# ==========================================
+# Chronométrage léger de chaque étape (embed_query, recherche vectorielle, traversée,
+# construction du prompt, llm.invoke, lots Neo4j, extraction par fichier...) :
+#   - span("nom", attr=...) : contexte imbriqué, le parent est propagé par contextvars
+#     (fonctionne aussi entre tâches asyncio),
+#   - histogrammes en mémoire par nom d'étape (compte, total, min/max, p50/p95/p99),
+#   - en fin d'exécution : tableau récapitulatif + export JSON compatible OpenTelemetry (OTLP).
+# Désactivé par défaut : span() renvoie alors un objet vide partagé (coût ~ un test booléen).
+# Activation : GRAPHRAG_TRACE=1 (fichier d'export optionnel : GRAPHRAG_TRACE_FILE) ou enable().
+
+SERVICE_NAME = "graph-rag-medical"
+TRACE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "traces")
+MAX_SPANS = 50000  # Au-delà, seuls les histogrammes sont mis à jour
+# Bornes des seaux des histogrammes (millisecondes)
+BUCKETS_MS = [0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000]
+
+_enabled = os.environ.get("GRAPHRAG_TRACE", "").lower() in ("1", "true", "yes", "on")
+_current = contextvars.ContextVar("graphrag_span", default=None)
+_spans = []
+_histograms = {}
+_dropped = 0
+
+
+class Histogram:
+    """ Histogramme à seaux fixes (échelle logarithmique) d'une étape """
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS_MS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.min = float("inf")
+        self.max = 0.0
+        self.errors = 0
+
+    def record(self, ms, error=False):
+        self.counts[bisect.bisect_left(BUCKETS_MS, ms)] += 1
+        self.count += 1
+        self.total += ms
+        self.min = min(self.min, ms)
+        self.max = max(self.max, ms)
+        self.errors += error
+
+    def percentile(self, p):
+        """ Borne supérieure du seau qui contient le p-ième percentile (bornée par le max observé) """
+        if not self.count:
+            return 0.0
+        rank = p / 100 * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if seen >= rank and n:
+                return min(BUCKETS_MS[i], self.max) if i < len(BUCKETS_MS) else self.max
+        return self.max
+
+
+class Span:
+    """ Étape chronométrée ; le parent est le span courant au moment de l'entrée """
+
+    __slots__ = ("name", "attributes", "trace_id", "span_id", "parent_id", "start_ns", "end_ns",
+                 "error", "_token", "_perf_ns")
+
+    def __init__(self, name, attributes):
+        self.name = name
+        self.attributes = attributes
+        self.error = None
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def __enter__(self):
+        parent = _current.get()
+        self.span_id = os.urandom(8).hex()
+        self.trace_id = parent.trace_id if parent else os.urandom(16).hex()
+        self.parent_id = parent.span_id if parent else None
+        self._token = _current.set(self)
+        self.start_ns = time.time_ns()
+        self._perf_ns = time.perf_counter_ns()  # Durée mesurée sur une horloge monotone
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        global _dropped
+        elapsed_ns = time.perf_counter_ns() - self._perf_ns
+        self.end_ns = self.start_ns + elapsed_ns
+        _current.reset(self._token)
+        if exc is not None:
+            self.error = f"{exc_type.__name__}: {exc}"
+        ms = elapsed_ns / 1e6
+        _histograms.setdefault(self.name, Histogram()).record(ms, error=exc is not None)
+        if len(_spans) < MAX_SPANS:
+            _spans.append(self)
+        else:
+            _dropped += 1
+        return False
+
+
+class _NoopSpan:
+    """ Span partagé quand le traçage est désactivé """
+
+    __slots__ = ()
+
+    def set(self, **attributes):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NOOP = _NoopSpan()
+
+
+def enable(flag=True):
+    global _enabled
+    _enabled = flag
+
+
+def is_enabled():
+    return _enabled
+
+
+def span(name, **attributes):
+    """ `with span("llm.invoke", model=...):` ; quasi gratuit si le traçage est désactivé """
+    if not _enabled:
+        return _NOOP
+    return Span(name, attributes)
+
+
+def traced(name=None):
+    """ Décorateur : un span par appel (fonctions synchrones ou coroutines) """
+    def decorator(fn):
+        span_name = name or fn.__qualname__
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                if not _enabled:
+                    return await fn(*args, **kwargs)
+                with Span(span_name, {}):
+                    return await fn(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return fn(*args, **kwargs)
+            with Span(span_name, {}):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def reset():
+    global _dropped
+    _spans.clear()
+    _histograms.clear()
+    _dropped = 0
+
+
+# ==========================================
+# 👇 EXPORT 👇
+# ==========================================
+def summary():
+    """ [{name, count, total_ms, mean_ms, p50_ms, p95_ms, p99_ms, max_ms, errors}] par temps total """
+    rows = []
+    for name, h in _histograms.items():
+        rows.append({
+            "name": name, "count": h.count, "total_ms": h.total, "mean_ms": h.total / h.count,
+            "p50_ms": h.percentile(50), "p95_ms": h.percentile(95), "p99_ms": h.percentile(99),
+            "max_ms": h.max, "errors": h.errors,
+        })
+    return sorted(rows, key=lambda r: -r["total_ms"])
+
+
+def print_summary():
+    rows = summary()
+    if not rows:
+        return
+    print(f"\n⏱️ Traçage : {sum(r['count'] for r in rows)} spans"
+          + (f" ({_dropped} non conservés, histogrammes complets)" if _dropped else ""))
+    print(f"{'étape':<34}{'n':>7}{'total ms':>12}{'moy ms':>10}{'p50':>9}{'p95':>9}{'p99':>9}"
+          f"{'max ms':>10}{'err':>5}")
+    for r in rows:
+        print(f"{r['name'][:33]:<34}{r['count']:>7}{r['total_ms']:>12.1f}{r['mean_ms']:>10.2f}"
+              f"{r['p50_ms']:>9.1f}{r['p95_ms']:>9.1f}{r['p99_ms']:>9.1f}{r['max_ms']:>10.1f}"
+              f"{r['errors']:>5}")
+
+
+def _attribute(key, value):
+    if isinstance(value, bool):
+        return {"key": key, "value": {"boolValue": value}}
+    if isinstance(value, int):
+        return {"key": key, "value": {"intValue": str(value)}}
+    if isinstance(value, float):
+        return {"key": key, "value": {"doubleValue": value}}
+    return {"key": key, "value": {"stringValue": str(value)}}
+
+
+def to_otlp():
+    """ Spans au format OTLP/JSON (ExportTraceServiceRequest), lisible par un collecteur OpenTelemetry """
+    spans = []
+    for s in _spans:
+        item = {
+            "traceId": s.trace_id,
+            "spanId": s.span_id,
+            "name": s.name,
+            "kind": 1,  # SPAN_KIND_INTERNAL
+            "startTimeUnixNano": str(s.start_ns),
+            "endTimeUnixNano": str(s.end_ns),
+            "attributes": [_attribute(k, v) for k, v in s.attributes.items()],
+            "status": {"code": 2, "message": s.error} if s.error else {"code": 1},
+        }
+        if s.parent_id:
+            item["parentSpanId"] = s.parent_id
+        spans.append(item)
+    return {"resourceSpans": [{
+        "resource": {"attributes": [_attribute("service.name", SERVICE_NAME)]},
+        "scopeSpans": [{"scope": {"name": "tracing"}, "spans": spans}],
+    }]}
+
+
+def export(path=None):
+    """ Écrit l'export OTLP/JSON (défaut : GRAPHRAG_TRACE_FILE ou .cache/traces/) """
+    path = path or os.environ.get("GRAPHRAG_TRACE_FILE") or os.path.join(
+        TRACE_DIR, time.strftime("trace-%Y%m%d-%H%M%S.json"))
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(to_otlp(), f, ensure_ascii=False)
+    return path
+
+
+def report(path=None):
+    """ Fin d'exécution : tableau récapitulatif + export JSON (ne fait rien si désactivé) """
+    if not _enabled or not _histograms:
+        return None
+    print_summary()
+    path = export(path)
+    print(f"💾 Traces OpenTelemetry écrites dans {path}")
+    reset()
+    return path
+
+
+# Les scripts interactifs peuvent se terminer par Ctrl+C / Ctrl+D : rapport en sortie
+atexit.register(report)
@@ -0,0 +1,361 @@
+import os
+import json
+import time
+
+import numpy as np
+
+from chunking import chunk_owner
+
+# ==========================================
+# 👇 INDEX VECTORIEL LOCAL (MEMMAP NUMPY) 👇
+# ==========================================
+# Copie locale des embeddings des Consultations :
+#   - vectors.f32 : matrice float32 (n, dim) normalisée, ouverte en memory-map,
+#   - ids.json    : table filename <-> ligne + métadonnées,
+#   - ivf.npz     : (optionnel) centroïdes + listes inversées pour le mode approché,
+#   - vectors.i8.npy + scales.f32.npy / vectors.bin.npy : (optionnel) copie quantifiée.
+# La recherche top-k se fait en NumPy, sans aller-retour vers AuraDB.
+# Ingestion incrémentale : seuls les vecteurs des consultations modifiées ou
+# supprimées sont relus (refresh_from_neo4j), les autres sont repris de la copie locale.
+# Quantification (int8 : 4x plus petit, binaire : 32x) : les candidats sont classés
+# sur la copie quantifiée, puis seule la présélection (k * RERANK_FACTOR lignes) est
+# relue en float32 pour le score final. La matrice float32 reste sur disque (memmap),
+# seules les lignes présélectionnées sont chargées.
+
+INDEX_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "vector_index")
+CHUNK_INDEX_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "chunk_index")
+IVF_MIN_SIZE = 5000  # En dessous, la recherche exacte est déjà sous la milliseconde
+QUANTIZATIONS = ("int8", "binary")
+KEEP_QUANTIZATION = "keep"  # Ingestion : quantification de l'index existant (float32 s'il n'y en a pas)
+# Présélection quantifiée = k * RERANK_FACTOR candidats (au moins RERANK_MIN) : le
+# binaire perd plus d'information que l'int8, il lui faut une présélection plus large
+RERANK_FACTOR = {"int8": 4, "binary": 25}
+RERANK_MIN = 32
+BLOCK_ROWS = 8192     # Lignes quantifiées converties à la fois (le bloc reste dans le cache CPU)
+POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def popcount(codes):
+    """ Bits à 1 par ligne (np.bitwise_count depuis NumPy 2.0, sinon table de 256 entrées) """
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(codes).sum(axis=1, dtype=np.int32)
+    return POPCOUNT[codes].sum(axis=1, dtype=np.int32)
+
+# Clé locale : filename pour les Consultations, id pour les Chunks
+SYNC_QUERIES = {
+    "Consultation": """
+        MATCH (c:Consultation)
+        WHERE c.embedding IS NOT NULL
+        RETURN c.filename AS id, c.embedding AS embedding
+        ORDER BY c.filename
+        SKIP $skip LIMIT $limit
+    """,
+    "Chunk": """
+        MATCH (k:Chunk)
+        WHERE k.embedding IS NOT NULL
+        RETURN k.id AS id, k.embedding AS embedding
+        ORDER BY k.id
+        SKIP $skip LIMIT $limit
+    """,
+}
+
+# Mise à jour incrémentale : vecteurs des consultations modifiées (absentes = supprimées)
+SYNC_FOR_QUERIES = {
+    "Consultation": """
+        UNWIND $filenames AS f
+        MATCH (c:Consultation {filename: f})
+        WHERE c.embedding IS NOT NULL
+        RETURN c.filename AS id, c.embedding AS embedding
+    """,
+    "Chunk": """
+        UNWIND $filenames AS f
+        MATCH (k:Chunk)-[:PARTIE_DE]->(:Consultation {filename: f})
+        WHERE k.embedding IS NOT NULL
+        RETURN k.id AS id, k.embedding AS embedding
+    """,
+}
+OWNERS = {"Consultation": lambda identifier: identifier, "Chunk": chunk_owner}
+
+
+def normalize(matrix):
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def quantize_int8(matrix):
+    """ int8 symétrique, une échelle par vecteur : v ≈ q * scale """
+    scales = np.abs(matrix).max(axis=1) / 127.0 if len(matrix) else np.zeros(0, dtype=np.float32)
+    scales[scales == 0] = 1.0
+    return np.round(matrix / scales[:, None]).astype(np.int8), scales.astype(np.float32)
+
+
+def binarize(matrix):
+    """ Un bit par dimension (signe), 8 dimensions par octet """
+    return np.packbits(matrix > 0, axis=-1)
+
+
+def kmeans(vectors, n_clusters, iterations=20, seed=0):
+    """ K-means (Lloyd) sur vecteurs normalisés, similarité cosinus """
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(len(vectors), n_clusters, replace=False)].copy()
+    for _ in range(iterations):
+        assign = np.argmax(vectors @ centroids.T, axis=1)
+        for c in range(n_clusters):
+            members = vectors[assign == c]
+            if len(members):
+                centroids[c] = members.mean(axis=0)
+        centroids = normalize(centroids)
+    return centroids, np.argmax(vectors @ centroids.T, axis=1)
+
+
+class LocalVectorIndex:
+    """ Index cosinus en mémoire partagée : exact (produit matriciel) ou IVF approché """
+
+    def __init__(self, path=INDEX_DIR):
+        self.path = path
+        self.ids = []
+        self.matrix = None
+        self.centroids = None
+        self.lists = None
+        self.meta = {}
+        self.rows = None  # id -> ligne (construit au premier appel de scores)
+        self.quantization = None
+        self.quantized = None
+        self.scales = None
+
+    # ---------- Construction ----------
+    def _write(self, name, array):
+        # Écriture dans un fichier temporaire puis remplacement atomique :
+        # un lecteur qui a déjà ouvert l'ancien memmap n'est pas perturbé.
+        target = os.path.join(self.path, name)
+        mm = np.lib.format.open_memmap(target + ".tmp", mode="w+", dtype=array.dtype, shape=array.shape)
+        mm[:] = array
+        mm.flush()
+        del mm
+        os.replace(target + ".tmp", target)
+
+    def build(self, ids, vectors, ivf_clusters=None, meta=None, quantization=None):
+        if quantization is not None and quantization not in QUANTIZATIONS:
+            raise ValueError(f"Quantification inconnue : {quantization} (attendu : {', '.join(QUANTIZATIONS)})")
+        os.makedirs(self.path, exist_ok=True)
+        matrix = normalize(np.asarray(vectors, dtype=np.float32))
+        self._write("vectors.f32.npy", matrix)
+
+        for name in ("vectors.i8.npy", "scales.f32.npy", "vectors.bin.npy"):
+            stale = os.path.join(self.path, name)
+            if os.path.exists(stale):
+                os.remove(stale)
+        if quantization == "int8":
+            quantized, scales = quantize_int8(matrix)
+            self._write("vectors.i8.npy", quantized)
+            self._write("scales.f32.npy", scales)
+        elif quantization == "binary":
+            self._write("vectors.bin.npy", binarize(matrix))
+
+        ivf_path = os.path.join(self.path, "ivf.npz")
+        if ivf_clusters is None and len(ids) >= IVF_MIN_SIZE:
+            ivf_clusters = int(np.sqrt(len(ids)))
+        if ivf_clusters:
+            centroids, assign = kmeans(matrix, ivf_clusters)
+            np.savez(ivf_path, centroids=centroids, assign=assign)
+        elif os.path.exists(ivf_path):
+            os.remove(ivf_path)
+
+        ids_path = os.path.join(self.path, "ids.json")
+        with open(ids_path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump({"ids": list(ids), "dim": int(matrix.shape[1]) if len(ids) else 0,
+                       "quantization": quantization, "built_at": time.time(), **(meta or {})},
+                      f, ensure_ascii=False)
+        os.replace(ids_path + ".tmp", ids_path)
+        return self.load()
+
+    def load(self):
+        with open(os.path.join(self.path, "ids.json"), encoding="utf-8") as f:
+            self.meta = json.load(f)
+        self.ids = self.meta.pop("ids")
+        self.rows = None
+        self.matrix = np.load(os.path.join(self.path, "vectors.f32.npy"), mmap_mode="r")
+        self.quantization = self.meta.get("quantization")
+        if self.quantization == "int8":
+            self.quantized = np.load(os.path.join(self.path, "vectors.i8.npy"), mmap_mode="r")
+            self.scales = np.load(os.path.join(self.path, "scales.f32.npy"))
+        elif self.quantization == "binary":
+            self.quantized = np.load(os.path.join(self.path, "vectors.bin.npy"), mmap_mode="r")
+            self.scales = None
+        else:
+            self.quantized, self.scales = None, None
+        ivf_path = os.path.join(self.path, "ivf.npz")
+        if os.path.exists(ivf_path):
+            data = np.load(ivf_path)
+            self.centroids = data["centroids"]
+            assign = data["assign"]
+            self.lists = [np.flatnonzero(assign == c) for c in range(len(self.centroids))]
+        else:
+            self.centroids, self.lists = None, None
+        return self
+
+    def exists(self):
+        return os.path.exists(os.path.join(self.path, "ids.json"))
+
+    def __len__(self):
+        return len(self.ids)
+
+    def footprint(self):
+        """ Octets lus pour classer tous les candidats : float32 vs copie quantifiée """
+        full = self.matrix.nbytes if self.matrix is not None else 0
+        if self.quantized is None:
+            return {"quantization": None, "float32_bytes": full, "search_bytes": full, "ratio": 1.0}
+        search = self.quantized.nbytes + (self.scales.nbytes if self.scales is not None else 0)
+        return {"quantization": self.quantization, "float32_bytes": full, "search_bytes": search,
+                "ratio": round(full / search, 1) if search else 0.0}
+
+    # ---------- Recherche ----------
+    def _coarse_scores(self, q, rows=None):
+        """ Scores approchés sur la copie quantifiée (plus grand = plus proche), par blocs """
+        n = len(self.ids) if rows is None else len(rows)
+        out = np.empty(n, dtype=np.float32)
+        q_bits = np.packbits(q > 0) if self.quantization == "binary" else None
+        for start in range(0, n, BLOCK_ROWS):
+            block = slice(start, start + BLOCK_ROWS) if rows is None else rows[start:start + BLOCK_ROWS]
+            codes = self.quantized[block]
+            if q_bits is not None:
+                # Moins de bits différents (distance de Hamming) = plus proche
+                out[start:start + len(codes)] = -popcount(codes ^ q_bits)
+            else:
+                out[start:start + len(codes)] = (codes.astype(np.float32) @ q) * self.scales[block]
+        return out
+
+    def search(self, query, k=3, approximate=False, nprobe=8, quantized=True):
+        """
+        Retourne [(id, score cosinus)] triés par score décroissant. `quantized=False`
+        force le parcours float32 complet (référence pour mesurer le rappel).
+        """
+        if not self.ids:
+            return []
+        q = normalize(np.asarray(query, dtype=np.float32))
+        if approximate and self.centroids is not None:
+            probe = np.argsort(-(self.centroids @ q))[:nprobe]
+            candidates = np.concatenate([self.lists[c] for c in probe])
+        else:
+            candidates = None
+        if quantized and self.quantized is not None:
+            coarse = self._coarse_scores(q, candidates)
+            shortlist = min(len(coarse), max(k * RERANK_FACTOR[self.quantization], RERANK_MIN))
+            keep = np.argpartition(-coarse, shortlist - 1)[:shortlist]
+            # Lignes float32 relues dans l'ordre du fichier (accès memmap séquentiel)
+            keep = np.sort(keep if candidates is None else candidates[keep])
+            candidates = keep
+        if candidates is not None:
+            scores = self.matrix[candidates] @ q
+        else:
+            scores = self.matrix @ q
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        rows = candidates[top] if candidates is not None else top
+        # Même échelle que db.index.vector.queryNodes (cosinus) : (1 + cos) / 2
+        return [(self.ids[r], float((1 + s) / 2)) for r, s in zip(rows, scores[top])]
+
+    def scores(self, query, ids):
+        """ {id: score} pour des identifiants précis (même échelle que search) """
+        if self.rows is None:
+            self.rows = {i: r for r, i in enumerate(self.ids)}
+        known = [i for i in ids if i in self.rows]
+        if not known:
+            return {}
+        q = normalize(np.asarray(query, dtype=np.float32))
+        sims = self.matrix[[self.rows[i] for i in known]] @ q
+        return {i: float((1 + s) / 2) for i, s in zip(known, sims)}
+
+
+def measure_recall(index, queries, k=10, **search_options):
+    """ Rappel@k moyen de la recherche (quantifiée) contre le parcours float32 exact """
+    if not len(index) or not len(queries):
+        return 1.0
+    recalls = []
+    for query in queries:
+        expected = {i for i, _ in index.search(query, k=k, quantized=False)}
+        found = {i for i, _ in index.search(query, k=k, **search_options)}
+        recalls.append(len(expected & found) / len(expected))
+    return float(np.mean(recalls))
+
+
+def sync_from_neo4j(graph, path=INDEX_DIR, label="Consultation", page_size=1000, embedding_model_name=None,
+                    quantization=None):
+    """ Recopie les embeddings des Consultations (ou des Chunks) depuis Neo4j vers l'index local """
+    start = time.perf_counter()
+    ids, vectors, skip = [], [], 0
+    while True:
+        rows = graph.query(SYNC_QUERIES[label], params={"skip": skip, "limit": page_size})
+        for row in rows:
+            ids.append(row["id"])
+            vectors.append(row["embedding"])
+        if len(rows) < page_size:
+            break
+        skip += page_size
+    index = LocalVectorIndex(path)
+    if not ids:
+        print(f"⚠️ Index local : aucun nœud {label} avec embedding.")
+        return None
+    index.build(ids, vectors, meta={"embedding_model": embedding_model_name}, quantization=quantization)
+    detail = f", quantification {quantization} ({index.footprint()['ratio']}x)" if quantization else ""
+    print(f"✅ Index vectoriel local ({label}) synchronisé : {len(ids)} vecteurs{detail} "
+          f"en {time.perf_counter() - start:.2f}s.")
+    return index
+
+
+def refresh_from_neo4j(graph, filenames, path=INDEX_DIR, label="Consultation", embedding_model_name=None,
+                       quantization=None):
+    """
+    Mise à jour incrémentale : seuls les vecteurs des consultations `filenames` sont relus
+    (absentes = supprimées). Synchronisation complète si l'index manque, ou s'il a été
+    construit avec un autre modèle ou une autre quantification.
+    """
+    index = open_local_index(path, embedding_model_name)
+    if index is None or index.quantization != quantization:
+        return sync_from_neo4j(graph, path, label, embedding_model_name=embedding_model_name,
+                               quantization=quantization)
+    filenames = sorted(set(filenames))
+    if not filenames:
+        return index
+    start = time.perf_counter()
+    touched, owner = set(filenames), OWNERS[label]
+    kept = [row for row, identifier in enumerate(index.ids) if owner(identifier) not in touched]
+    rows = graph.query(SYNC_FOR_QUERIES[label], params={"filenames": filenames})
+    ids = [index.ids[row] for row in kept] + [row["id"] for row in rows]
+    vectors = [np.asarray(index.matrix[kept], dtype=np.float32)]
+    if rows:
+        vectors.append(np.asarray([row["embedding"] for row in rows], dtype=np.float32))
+    if not ids:
+        print(f"⚠️ Index local : aucun nœud {label} avec embedding.")
+        return None
+    matrix = np.concatenate([v for v in vectors if len(v)])
+    order = sorted(range(len(ids)), key=ids.__getitem__)  # Même ordre que sync_from_neo4j
+    index = LocalVectorIndex(path).build([ids[i] for i in order], matrix[order],
+                                         meta={"embedding_model": embedding_model_name}, quantization=quantization)
+    print(f"✅ Index vectoriel local ({label}) mis à jour : {len(rows)} vecteur(s) relu(s) pour "
+          f"{len(filenames)} consultation(s), {len(ids)} au total en {time.perf_counter() - start:.2f}s.")
+    return index
+
+
+def stored_quantization(path=INDEX_DIR):
+    """ Quantification enregistrée dans l'index existant (None : float32 ou pas d'index) """
+    try:
+        with open(os.path.join(path, "ids.json"), encoding="utf-8") as f:
+            return json.load(f).get("quantization")
+    except (OSError, ValueError):
+        return None
+
+
+def open_local_index(path=INDEX_DIR, embedding_model_name=None):
+    """ Ouvre l'index local s'il a déjà été synchronisé (avec le même modèle), sinon None """
+    index = LocalVectorIndex(path)
+    if not index.exists():
+        return None
+    index.load()
+    built_with = index.meta.get("embedding_model")
+    if embedding_model_name and built_with and built_with != embedding_model_name:
+        print(f"⚠️ Index local construit avec {built_with}, ignoré.")
+        return None
+    return index